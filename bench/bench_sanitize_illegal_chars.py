@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of `data_utils.sanitize_illegal_chars_from_dict()` against the
+implementation it replaced, on a generated manifest.
+
+The outputs of both implementations are asserted to be equal, including
+the order of keys, before the timings are printed.
+
+Usage: python3 bench/bench_sanitize_illegal_chars.py [--entries 20000] [--repeat 5] [--seed 0]
+"""
+
+import argparse
+import collections
+import json
+import os
+import random
+import re
+import sys
+import time
+import unicodedata
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from temporal_src_network.data import data_utils # pylint: disable=wrong-import-position
+
+
+
+def old_remove_escape_characters(string):
+    "Remove 7-bit ansi escape sequence characters from string."
+
+    # https://stackoverflow.com/a/38662876
+    if string is None: return string
+    return re.sub(r'(?:\x1B[@-_]|[\x80-\x9F])[0-?]*[ -/]*[@-~]', '', string)
+
+def old_remove_control_characters(string):
+    "Remove control sequence characters from string except '\n' and '\t'."
+
+    # https://stackoverflow.com/a/19016117
+    if string is None: return string
+    return "".join(ch for ch in string if unicodedata.category(ch)[0] != "C" or ch in ["\n", "\t"])
+
+def old_sanitize_illegal_chars_from_dict(obj, is_value=True):
+    "The implementation of `sanitize_illegal_chars_from_dict()` before the fast path was added."
+
+    if isinstance(obj, dict):
+        new_obj = collections.OrderedDict()
+        for key, value in obj.items():
+            if isinstance(value, dict):
+                new_obj[old_sanitize_illegal_chars_from_dict(key, False)] = \
+                    collections.OrderedDict(old_sanitize_illegal_chars_from_dict(value, True))
+            else:
+                new_obj[old_sanitize_illegal_chars_from_dict(key, False)] = \
+                    old_sanitize_illegal_chars_from_dict(value, True)
+        obj = new_obj
+    elif isinstance(obj, list):
+        obj = [old_sanitize_illegal_chars_from_dict(value, True) for value in obj]
+    elif isinstance(obj, str):
+        obj = old_remove_escape_characters(obj)
+        obj = old_remove_control_characters(obj)
+    else:
+        pass
+
+    return obj
+
+
+
+def get_random_string(rand, prefix):
+    "Get a random string, with illegal or non-ascii characters for some of them."
+
+    string = prefix + "-" + "".join(rand.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(rand.randint(4, 16)))
+    chance = rand.random()
+    if chance < 0.01:
+        string += "\x1b[31m" + string + "\x1b[0m"
+    elif chance < 0.02:
+        string += rand.choice(["\x00", "\x07", "\r", "\x7f", "\u200b", "\x85"])
+    elif chance < 0.05:
+        string += rand.choice(["\u00e9", "\u00fc", "\u4e2d\u6587", "\u00a0"])
+    elif chance < 0.06:
+        string += "\n\tline"
+    return string
+
+def get_manifest(entries, seed):
+    "Get a generated manifest with `entries` modules."
+
+    rand = random.Random(seed)
+    modules = collections.OrderedDict()
+    for i in range(entries):
+        name = get_random_string(rand, "module" + str(i))
+        versions = collections.OrderedDict()
+        for j in range(rand.randint(1, 3)):
+            versions[get_random_string(rand, "v" + str(j))] = collections.OrderedDict([
+                ("commit", "".join(rand.choice("0123456789abcdef") for _ in range(40))),
+                ("dest_path", get_random_string(rand, "path")),
+                ("enabled", rand.random() < 0.9)
+            ])
+        modules[name] = collections.OrderedDict([
+            ("repo_url", "https://github.com/" + get_random_string(rand, "org") + "/" + name + ".git"),
+            ("module_root_dir", get_random_string(rand, "dir")),
+            ("depth", rand.randint(1, 50)),
+            ("labels", [get_random_string(rand, "label") for _ in range(rand.randint(0, 3))]),
+            ("versions", versions)
+        ])
+
+    return collections.OrderedDict([
+        ("project_name", "bench"),
+        ("project_root_dir", "/tmp/bench"),
+        ("modules", modules)
+    ])
+
+
+
+def time_function(function, manifest, repeat):
+    "Get the output of `function` for `manifest` and its best time of `repeat` runs."
+
+    output = None
+    best_time = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        output = function(manifest)
+        duration = time.perf_counter() - start_time
+        if best_time is None or duration < best_time:
+            best_time = duration
+
+    return (output, best_time)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark sanitize_illegal_chars_from_dict()")
+    parser.add_argument("--entries", type=int, default=20000, help="the number of modules in the manifest (default: 20000)")
+    parser.add_argument("--repeat", type=int, default=5, help="the number of runs to take the best time of (default: 5)")
+    parser.add_argument("--seed", type=int, default=0, help="the seed of the generated manifest (default: 0)")
+    args = parser.parse_args(argv)
+
+    manifest = get_manifest(args.entries, args.seed)
+
+    (old_output, old_time) = time_function(old_sanitize_illegal_chars_from_dict, manifest, args.repeat)
+    (new_output, new_time) = time_function(data_utils.sanitize_illegal_chars_from_dict, manifest, args.repeat)
+
+    # The json dump also compares the order of keys
+    assert new_output == old_output, "The outputs of the old and new implementations are not equal"
+    assert json.dumps(new_output) == json.dumps(old_output), \
+        "The outputs of the old and new implementations are not equal or have keys in a different order"
+
+    print("python " + sys.version.split()[0] + ", " + str(args.entries) + " entries, best of " + str(args.repeat) + " runs")
+    print("old implementation: {:.3f}s".format(old_time))
+    print("new implementation: {:.3f}s".format(new_time))
+    print("speedup:            {:.1f}x".format(old_time / new_time if new_time > 0 else float("inf")))
+    print("outputs are equal")
+
+    return 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
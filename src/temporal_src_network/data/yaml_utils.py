@@ -0,0 +1,321 @@
+import collections
+import collections.abc
+import re
+
+from ..logger.logger_core import logger
+
+import importlib.util # pylint: disable=wrong-import-order
+RUAMEL_YAML_SUPPORTED = False
+RUAMEL_YAML_C_SUPPORTED = False
+try:
+    if importlib.util.find_spec("ruamel.yaml") is not None:
+        import ruamel.yaml # type: ignore # pylint: disable=import-error
+        import ruamel.yaml.main # type: ignore # pylint: disable=import-error
+        RUAMEL_YAML_SUPPORTED = True
+        # The `CParser` will be `None` if `ruamel.yaml.clib` is not installed
+        RUAMEL_YAML_C_SUPPORTED = getattr(ruamel.yaml.main, "CParser", None) is not None
+except Exception:
+    pass
+
+PYYAML_C_SUPPORTED = False
+try:
+    if importlib.util.find_spec("yaml") is not None:
+        import yaml as pyyaml # type: ignore # pylint: disable=import-error
+        # The `yaml.cyaml` module will fail to import if PyYAML was not built with libyaml
+        if getattr(pyyaml, "__with_libyaml__", False):
+            from yaml import cyaml as pyyaml_cyaml # type: ignore # pylint: disable=import-error
+            PYYAML_C_SUPPORTED = True
+except Exception:
+    pass
+
+LOG_TAG = "yaml_utils"
+
+YAML_BACKEND_AUTO = "auto"
+"""
+Use the first available backend from `YAML_BACKENDS_PRIORITY_LIST`.
+"""
+
+YAML_BACKEND_RUAMEL_C = "ruamel_c"
+"""
+Use `ruamel.yaml` with the `libyaml` based `CParser` from `ruamel.yaml.clib`.
+"""
+
+YAML_BACKEND_PYYAML_C = "pyyaml_c"
+"""
+Use `PyYAML` with the `libyaml` based `CParser` and a YAML `1.2` resolver
+and constructor that match the ones used by `ruamel.yaml`. Documents with
+a `%YAML` directive for a version other than `1.2` are rejected.
+
+This backend is not in `YAML_BACKENDS_PRIORITY_LIST` and must be
+selected explicitly, as `ruamel.yaml` has quirks for complex keys that
+are not replicated.
+"""
+
+YAML_BACKEND_RUAMEL_PURE = "ruamel_pure"
+"""
+Use `ruamel.yaml` with the pure python parser.
+"""
+
+YAML_BACKENDS = [YAML_BACKEND_AUTO, YAML_BACKEND_RUAMEL_C, YAML_BACKEND_PYYAML_C, YAML_BACKEND_RUAMEL_PURE]
+YAML_BACKENDS_PRIORITY_LIST = [YAML_BACKEND_RUAMEL_C, YAML_BACKEND_RUAMEL_PURE]
+
+YAML_STREAMING_BACKENDS = [YAML_BACKEND_RUAMEL_C, YAML_BACKEND_RUAMEL_PURE]
+"The backends that read the stream incrementally while loading documents."
+
+RUAMEL_YAML_INSTALL_INSTRUCTIONS = \
+"""Install ruamel.yaml by running following commands.
+android/termux: "pip install ruamel.yaml"
+debian/ubuntu: "sudo apt install python3-pip; sudo pip3 install ruamel.yaml"
+For more info, check https://yaml.readthedocs.io/en/latest/install.html."""
+
+PYYAML_12_SAFE_LOADER_CLASS = None
+
+YAML_VERSION_DIRECTIVE_REGEX = re.compile(r"^%YAML[ \t]+([0-9]+\.[0-9]+)", re.MULTILINE)
+
+
+
+def is_yaml_supported():
+    "Check if any yaml backend is available."
+
+    return RUAMEL_YAML_SUPPORTED or PYYAML_C_SUPPORTED
+
+def is_yaml_backend_available(yaml_backend):
+    "Check if `yaml_backend` is available."
+
+    if yaml_backend == YAML_BACKEND_RUAMEL_C:
+        return RUAMEL_YAML_C_SUPPORTED
+    elif yaml_backend == YAML_BACKEND_PYYAML_C:
+        return PYYAML_C_SUPPORTED
+    elif yaml_backend == YAML_BACKEND_RUAMEL_PURE:
+        return RUAMEL_YAML_SUPPORTED
+    else:
+        return False
+
+def get_yaml_backend(yaml_backend):
+    """
+    Get the yaml backend to use for `yaml_backend`.
+
+    If `yaml_backend` is not set or is `auto`, then the first available
+    backend from `YAML_BACKENDS_PRIORITY_LIST` is returned.
+
+    @returns (return_value, yaml_backend)
+    """
+
+    if not yaml_backend:
+        yaml_backend = YAML_BACKEND_AUTO
+
+    if yaml_backend not in YAML_BACKENDS:
+        logger.error(LOG_TAG, "The yaml backend \"" + str(yaml_backend) + "\" must be one of " +
+                     "'" + "', '".join(YAML_BACKENDS) + "'")
+        return (1, None)
+
+    if yaml_backend == YAML_BACKEND_AUTO:
+        for backend in YAML_BACKENDS_PRIORITY_LIST:
+            if is_yaml_backend_available(backend):
+                return (0, backend)
+
+        logger.error(LOG_TAG, "Loading yaml requires ruamel.yaml.\n\n" + RUAMEL_YAML_INSTALL_INSTRUCTIONS + "\n")
+        return (1, None)
+
+    if not is_yaml_backend_available(yaml_backend):
+        if yaml_backend == YAML_BACKEND_RUAMEL_C:
+            logger.error(LOG_TAG, "The '" + yaml_backend + "' yaml backend requires ruamel.yaml with" +
+                         " the ruamel.yaml.clib C extension.")
+        elif yaml_backend == YAML_BACKEND_PYYAML_C:
+            logger.error(LOG_TAG, "The '" + yaml_backend + "' yaml backend requires PyYAML built with libyaml.")
+        else:
+            logger.error(LOG_TAG, "The '" + yaml_backend + "' yaml backend requires ruamel.yaml.\n\n" +
+                         RUAMEL_YAML_INSTALL_INSTRUCTIONS + "\n")
+        return (1, None)
+
+    return (0, yaml_backend)
+
+def load_all(yaml_backend, stream):
+    """
+    Load all yaml documents from `stream` with the `safe` loader of the
+    `yaml_backend`, which must be a backend returned by
+    {@link #get_yaml_backend()}.
+
+    All backends load documents with the YAML `1.2` core schema and
+    disallow duplicate keys. The `pyyaml_c` backend rejects documents
+    with a `%YAML 1.1` directive instead of loading them with the `1.1`
+    rules like `ruamel.yaml` does.
+
+    @returns Returns an iterator of loaded documents.
+    """
+
+    if yaml_backend == YAML_BACKEND_RUAMEL_C:
+        yaml = ruamel.yaml.YAML(typ='safe', pure=False) # type: ignore # pylint: disable=used-before-assignment
+        return yaml.load_all(stream)
+    elif yaml_backend == YAML_BACKEND_PYYAML_C:
+        return pyyaml.load_all(stream, Loader=get_pyyaml_12_safe_loader_class()) # type: ignore # pylint: disable=used-before-assignment
+    elif yaml_backend == YAML_BACKEND_RUAMEL_PURE:
+        yaml = ruamel.yaml.YAML(typ='safe', pure=True) # type: ignore # pylint: disable=used-before-assignment
+        return yaml.load_all(stream)
+    else:
+        raise ValueError("The yaml backend \"" + str(yaml_backend) + "\" is not supported")
+
+
+
+def get_pyyaml_12_safe_loader_class():
+    """
+    Get the `PyYAML` loader class that uses the `libyaml` based `CParser`
+    and resolves scalars as per the YAML `1.2` core schema with the same
+    rules as `ruamel.yaml.resolver.VersionedResolver`, instead of the
+    YAML `1.1` rules used by `PyYAML` by default, under which values
+    like `yes`, `on`, `0755` and `1:20` would not be strings.
+    """
+
+    global PYYAML_12_SAFE_LOADER_CLASS
+
+    if PYYAML_12_SAFE_LOADER_CLASS is not None:
+        return PYYAML_12_SAFE_LOADER_CLASS
+
+    class Yaml12Resolver(pyyaml.resolver.BaseResolver): # type: ignore
+        "YAML 1.2 core schema resolver."
+
+    # - https://yaml.org/spec/1.2.2/#1032-tag-resolution
+    # - https://sourceforge.net/p/ruamel-yaml/code/ci/default/tree/resolver.py
+    for tag, regexp, first in [
+            ("tag:yaml.org,2002:bool",
+             r"^(?:true|True|TRUE|false|False|FALSE)$",
+             list("tTfF")),
+            ("tag:yaml.org,2002:float",
+             r"""^(?:
+             [-+]?(?:[0-9][0-9_]*)\.[0-9_]*(?:[eE][-+]?[0-9]+)?
+            |[-+]?(?:[0-9][0-9_]*)(?:[eE][-+]?[0-9]+)
+            |[-+]?\.[0-9_]+(?:[eE][-+][0-9]+)?
+            |[-+]?\.(?:inf|Inf|INF)
+            |\.(?:nan|NaN|NAN))$""",
+             list("-+0123456789.")),
+            ("tag:yaml.org,2002:int",
+             r"""^(?:[-+]?0b[0-1_]+
+            |[-+]?0o?[0-7_]+
+            |[-+]?[0-9_]+
+            |[-+]?0x[0-9a-fA-F_]+)$""",
+             list("-+0123456789")),
+            ("tag:yaml.org,2002:merge",
+             r"^(?:<<)$",
+             ["<"]),
+            ("tag:yaml.org,2002:null",
+             r"""^(?: ~
+            |null|Null|NULL
+            | )$""",
+             ["~", "n", "N", ""]),
+            ("tag:yaml.org,2002:timestamp",
+             r"""^(?:[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]
+            |[0-9][0-9][0-9][0-9] -[0-9][0-9]? -[0-9][0-9]?
+            (?:[Tt]|[ \t]+)[0-9][0-9]?
+            :[0-9][0-9] :[0-9][0-9] (?:\.[0-9]*)?
+            (?:[ \t]*(?:Z|[-+][0-9][0-9]?(?::[0-9][0-9])?))?)$""",
+             list("0123456789")),
+            ("tag:yaml.org,2002:value",
+             r"^(?:=)$",
+             ["="])]:
+        Yaml12Resolver.add_implicit_resolver(tag, re.compile(regexp, re.X), first)
+
+    class Yaml12SafeConstructor(pyyaml.constructor.SafeConstructor): # type: ignore
+        "YAML 1.2 safe constructor that disallows duplicate keys."
+
+        def construct_yaml_int(self, node):
+            # The YAML 1.1 `0` octal prefix and sexagesimal integers are not supported by 1.2
+            value = self.construct_scalar(node).replace("_", "")
+            sign = +1
+            if value[0] == "-":
+                sign = -1
+            if value[0] in "+-":
+                value = value[1:]
+
+            if value == "0":
+                return 0
+            elif value.startswith("0b"):
+                return sign * int(value[2:], 2)
+            elif value.startswith("0x"):
+                return sign * int(value[2:], 16)
+            elif value.startswith("0o"):
+                return sign * int(value[2:], 8)
+            else:
+                return sign * int(value)
+
+        def construct_mapping(self, node, deep=False):
+            own_keys_count = len(node.value)
+            if isinstance(node, pyyaml.nodes.MappingNode):
+                own_keys_count = len([key_node for key_node, _ in node.value
+                                      if key_node.tag != "tag:yaml.org,2002:merge"])
+                self.flatten_mapping(node)
+
+            # Merged keys are added before the keys of the mapping itself
+            # by flatten_mapping() and are allowed to be overridden.
+            merged_keys_count = len(node.value) - own_keys_count
+
+            mapping = {}
+            own_keys = set()
+            for index, (key_node, value_node) in enumerate(node.value):
+                # Sequence keys are constructed deep and converted to tuples like `ruamel.yaml` does
+                key = self.construct_object(key_node, deep=True)
+                if isinstance(key, list):
+                    key = tuple(key)
+                if not is_hashable(key):
+                    raise pyyaml.constructor.ConstructorError("while constructing a mapping", node.start_mark,
+                        "found unhashable key", key_node.start_mark)
+
+                if index >= merged_keys_count:
+                    if key in own_keys:
+                        raise pyyaml.constructor.ConstructorError("while constructing a mapping", node.start_mark,
+                            "found duplicate key \"" + str(key) + "\"", key_node.start_mark)
+                    own_keys.add(key)
+
+                mapping[key] = self.construct_object(value_node, deep=deep)
+
+            return mapping
+
+        def construct_yaml_omap(self, node):
+            # `PyYAML` returns a `list` of `(key, value)` tuples instead of an ordered dict
+            omap = collections.OrderedDict()
+            yield omap
+            pairs_generator = super().construct_yaml_omap(node)
+            pairs = next(pairs_generator)
+            for _ in pairs_generator:
+                pass
+            for (key, value) in pairs:
+                if not is_hashable(key):
+                    raise pyyaml.constructor.ConstructorError("while constructing an ordered map", node.start_mark,
+                        "found unhashable key", node.start_mark)
+                if key in omap:
+                    raise pyyaml.constructor.ConstructorError("while constructing an ordered map", node.start_mark,
+                        "found duplicate key \"" + str(key) + "\"", node.start_mark)
+                omap[key] = value
+
+    def is_hashable(key):
+        # A tuple is `Hashable` even if its items are not
+        try:
+            hash(key)
+            return True
+        except TypeError:
+            return False
+
+    Yaml12SafeConstructor.add_constructor("tag:yaml.org,2002:int", Yaml12SafeConstructor.construct_yaml_int)
+    Yaml12SafeConstructor.add_constructor("tag:yaml.org,2002:omap", Yaml12SafeConstructor.construct_yaml_omap)
+
+    class Yaml12SafeLoader(pyyaml_cyaml.CParser, Yaml12SafeConstructor, Yaml12Resolver): # type: ignore
+        "YAML 1.2 safe loader that uses the libyaml based CParser."
+
+        def __init__(self, stream):
+            # The `CParser` does not expose the `%YAML` directives of
+            # documents, so the stream is checked for them before parsing.
+            if hasattr(stream, "read"):
+                stream = stream.read()
+            match = YAML_VERSION_DIRECTIVE_REGEX.search(stream if isinstance(stream, str) else
+                                                        stream.decode("utf-8", errors="replace"))
+            if match and match.group(1) != "1.2":
+                raise pyyaml.constructor.ConstructorError(None, None,
+                    "found unsupported \"%YAML " + match.group(1) + "\" directive, only YAML 1.2 documents can" +
+                    " be loaded with the '" + YAML_BACKEND_PYYAML_C + "' yaml backend", None)
+
+            pyyaml_cyaml.CParser.__init__(self, stream)
+            Yaml12SafeConstructor.__init__(self)
+            Yaml12Resolver.__init__(self)
+
+    PYYAML_12_SAFE_LOADER_CLASS = Yaml12SafeLoader
+
+    return PYYAML_12_SAFE_LOADER_CLASS
@@ -0,0 +1,282 @@
+import concurrent.futures
+import errno
+import os
+import shutil
+import threading
+
+from . import file_utils
+from . import file_utils_errno
+from .file_types import FileTypes
+from ..logger.logger_core import logger
+from ..timing.span_timer import span_timer
+
+LOG_TAG = "background_deleter"
+
+TRASH_DIR_PREFIX = "temporal-src-network-trash."
+"""
+The prefix for the names of the trash directories that directories are
+renamed to before being deleted in the background, after the leading dot.
+"""
+
+class TrashDirNode:
+    "Node for a directory under a trash directory that is being deleted."
+
+    __slots__ = ("path", "parent", "depth", "pending")
+
+    def __init__(self, path, parent, depth):
+        self.path = path
+        self.parent = parent
+        self.depth = depth
+        # The listing of the directory itself is pending until done
+        self.pending = 1
+
+class BackgroundDeleter:
+    """
+    Deleter that deletes directories in the background.
+
+    A directory is deleted by atomically renaming it to a hidden trash
+    directory beside it in the same parent directory, which is always
+    on the same filesystem, and then its files are deleted by a thread
+    pool, so that the caller can continue, like to checkout the sources
+    again at the same path, without waiting for the deletion to finish.
+
+    The trash directory is traversed with `os.scandir()` and the
+    directories up to {@link #FANOUT_DEPTH} are listed by separate jobs,
+    while deeper directories are deleted with `shutil.rmtree()`. Symlinks
+    are never followed, and only files under the trash directory are
+    deleted, so a version or module root directory under the project
+    root directory is only ever deleted under the project root directory.
+    Directories without a required parent directory, like the project
+    root directory itself, are deleted in the foreground instead, since
+    their trash directory would be outside of it.
+
+    The trash directories left in a parent directory by an interrupted
+    run are deleted in the background too, when a directory in the same
+    parent directory is deleted for the first time.
+
+    {@link #wait()} must be called before exiting so that all the
+    deletions are finished.
+    """
+
+    FANOUT_DEPTH = 3
+    "The depth up to which the directories under a trash directory are listed by separate jobs."
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.executor = None
+        self.lock = threading.Lock()
+        self.finished_condition = threading.Condition(self.lock)
+        self.pending_trash_dirs = 0
+        self.errors = []
+        # The parent directories checked for stale trash directories
+        self.checked_parent_dir_paths = set()
+
+    def delete_directory_file(self, log_tag, label, file_path, required_parent_dir_path=None):
+        """
+        Delete the directory file at path in the background.
+
+        If the file at path is not a directory, `required_parent_dir_path`
+        is not set, or renaming the directory fails, like if it is a mount
+        point, then it is deleted with {@link file_utils#delete_normal_file()}
+        instead.
+
+        @param label The optional label for the directory to delete. This can optionally be `None`.
+        @param file_path The `path` for directory to delete.
+        @param required_parent_dir_path[`None`] The path to the directory that the directory
+                                        and its trash directory must be under, otherwise
+                                        the directory is deleted in the foreground.
+        @return Returns the error if deletion was not successful, otherwise `None`.
+        """
+
+        label_temp = "" if not label else str(label) + " "
+
+        error = file_utils.is_path_valid(label_temp + "file path", file_path)
+        if error is not None:
+            return error
+
+        file_type = file_utils.get_file_type(log_tag, file_path, False)
+        if file_type == FileTypes.NO_EXIST:
+            return None
+        if file_type != FileTypes.DIRECTORY:
+            return file_utils.delete_normal_file(log_tag, label, file_path)
+
+        # The filesystem root and paths without a parent cannot be renamed.
+        parent_dir_path = os.path.dirname(file_path)
+        if not parent_dir_path or os.path.basename(file_path) in ["", ".", ".."]:
+            return file_utils.delete_normal_file(log_tag, label, file_path)
+
+        trash_dir_path = os.path.join(parent_dir_path, "." + TRASH_DIR_PREFIX + os.urandom(8).hex())
+
+        if required_parent_dir_path is None or \
+                not file_utils.is_path_in_dir_path(trash_dir_path, required_parent_dir_path, True):
+            return file_utils.delete_normal_file(log_tag, label, file_path)
+
+        self.delete_stale_trash_dirs(log_tag, parent_dir_path)
+
+        try:
+            logger.verbose(log_tag, "Moving " + label_temp + "directory at path \"" + file_path + "\"" +
+                           " to trash directory at path \"" + trash_dir_path + "\" to delete it in background")
+            os.rename(file_path, trash_dir_path)
+        except OSError as err:
+            logger.verbose(log_tag, "Deleting " + label_temp + "directory in foreground since moving" +
+                           " it to trash directory failed with err:\n" + str(err))
+            return file_utils.delete_normal_file(log_tag, label, file_path)
+        finally:
+            file_utils.clear_canonical_paths_cache()
+
+        self.submit_trash_dir(trash_dir_path)
+
+        return None
+
+    def delete_stale_trash_dirs(self, log_tag, parent_dir_path):
+        """
+        Delete the trash directories in `parent_dir_path` left by an
+        interrupted run in the background, if it was not already checked.
+        This must be called before any directory in it is moved to trash.
+        """
+
+        with self.lock:
+            if parent_dir_path in self.checked_parent_dir_paths:
+                return
+            self.checked_parent_dir_paths.add(parent_dir_path)
+
+        try:
+            with os.scandir(parent_dir_path) as entries:
+                stale_trash_dir_paths = [entry.path for entry in entries
+                                         if entry.name.startswith("." + TRASH_DIR_PREFIX) and
+                                         entry.is_dir(follow_symlinks=False)]
+        except OSError as err:
+            logger.verbose(log_tag, "Failed to check for stale trash directories in directory at path" +
+                           " \"" + parent_dir_path + "\": " + str(err))
+            return
+
+        for stale_trash_dir_path in stale_trash_dir_paths:
+            logger.verbose(log_tag, "Deleting stale trash directory at path \"" + stale_trash_dir_path + "\"" +
+                           " in background")
+            self.submit_trash_dir(stale_trash_dir_path)
+
+    def submit_trash_dir(self, trash_dir_path):
+        "Submit the job to delete the trash directory at `trash_dir_path`."
+
+        with self.lock:
+            if self.executor is None:
+                self.executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.jobs, thread_name_prefix="background_deleter")
+            self.pending_trash_dirs += 1
+
+        self.submit(self.delete_trash_dir_entries, TrashDirNode(trash_dir_path, None, 0))
+
+    def wait(self):
+        """
+        Wait for all the background deletions to finish.
+
+        @return Returns the `list` of errors for the files that failed to be deleted.
+        """
+
+        with self.lock:
+            if self.pending_trash_dirs > 0:
+                logger.debug(LOG_TAG, "Waiting for " + str(self.pending_trash_dirs) +
+                             " trash directories to be deleted in background")
+            while self.pending_trash_dirs > 0:
+                self.finished_condition.wait()
+            executor = self.executor
+            self.executor = None
+            errors = self.errors
+            self.errors = []
+
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+        return errors
+
+
+
+    def submit(self, function, node):
+        self.executor.submit(self.run_job, function, node)
+
+    def run_job(self, function, node):
+        try:
+            with span_timer.span("background_delete", path=node.path):
+                function(node)
+        except Exception as err: # pylint: disable=broad-except
+            self.add_error(node.path, err)
+            self.complete_node(node)
+
+    def add_error(self, file_path, err):
+        with self.lock:
+            self.errors.append(file_utils_errno.ERRNO_DELETING_FILE_FAILED_WITH_EXCEPTION.format(
+                "trash file", file_path, str(err)))
+
+    def delete_trash_dir_entries(self, node):
+        "Delete the files in the directory of `node` and submit jobs for its sub directories."
+
+        try:
+            with os.scandir(node.path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        child_node = TrashDirNode(entry.path, node, node.depth + 1)
+                        with self.lock:
+                            node.pending += 1
+                        if child_node.depth < BackgroundDeleter.FANOUT_DEPTH:
+                            self.submit(self.delete_trash_dir_entries, child_node)
+                        else:
+                            self.submit(self.delete_trash_dir_tree, child_node)
+                    else:
+                        try:
+                            os.unlink(entry.path)
+                        except FileNotFoundError:
+                            pass
+                        except OSError as err:
+                            self.add_error(entry.path, err)
+        except FileNotFoundError:
+            pass
+        except OSError as err:
+            self.add_error(node.path, err)
+
+        self.complete_node(node)
+
+    def delete_trash_dir_tree(self, node):
+        "Delete the directory of `node` and all files under it."
+
+        def on_error(function, path, exc_info): # pylint: disable=unused-argument
+            err = exc_info[1]
+            if not isinstance(err, FileNotFoundError):
+                self.add_error(path, err)
+
+        # The `shutil.rmtree()` does not follow symlinks and uses fds
+        # to protect against symlink attacks where supported.
+        shutil.rmtree(node.path, onerror=on_error)
+
+        # The directory itself was deleted by rmtree.
+        node.path = None
+        self.complete_node(node)
+
+    def complete_node(self, node):
+        """
+        Mark the listing or a sub directory of `node` as completed, and if
+        nothing is pending for it anymore, then delete its directory and
+        complete its parent.
+        """
+
+        while node is not None:
+            with self.lock:
+                node.pending -= 1
+                if node.pending > 0:
+                    return
+
+            if node.path is not None:
+                try:
+                    os.rmdir(node.path)
+                except FileNotFoundError:
+                    pass
+                except OSError as err:
+                    if err.errno != errno.ENOENT:
+                        self.add_error(node.path, err)
+
+            if node.parent is None:
+                with self.lock:
+                    self.pending_trash_dirs -= 1
+                    self.finished_condition.notify_all()
+                return
+
+            node = node.parent
@@ -0,0 +1,125 @@
+import collections
+import os
+
+class DirFdBatch:
+    """
+    Batch of file operations on files that are done relative to the fds
+    of their parent directories with `dir_fd`, instead of with their
+    absolute paths.
+
+    Each parent directory is only opened once for the batch, so that
+    the kernel does not have to resolve all the components of the
+    directory path again for every file in it. The results of the
+    operations are counted per directory so that a summary can be
+    reported for the batch.
+
+    The batch must be closed with {@link #close()} or used as a context
+    manager so that the directory fds are closed.
+    """
+
+    __slots__ = ("dir_fds", "dir_results", "last_result")
+
+    def __init__(self):
+        self.dir_fds = {}
+        self.dir_results = collections.OrderedDict()
+        self.last_result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def is_supported():
+        "Check if `dir_fd` is supported by the functions required for the batch on current platform."
+
+        return hasattr(os, "O_DIRECTORY") and \
+            os.open in os.supports_dir_fd and \
+            os.stat in os.supports_dir_fd and \
+            os.readlink in os.supports_dir_fd and \
+            os.unlink in os.supports_dir_fd and \
+            os.symlink in os.supports_dir_fd and \
+            os.rename in os.supports_dir_fd
+
+    def get_parent_dir_fd(self, file_path):
+        """
+        Get the fd of the parent directory of `file_path`, opening it if
+        not already open.
+
+        @return Returns `(dir_fd, file_name)` if the parent directory is
+        open, otherwise `(None, file_path)` so that the file can be
+        operated on with its path instead, like if the parent directory
+        does not exist or `dir_fd` is not supported.
+        """
+
+        dir_path = os.path.dirname(file_path)
+        file_name = os.path.basename(file_path)
+        if not dir_path or not file_name or not DirFdBatch.is_supported():
+            return (None, file_path)
+
+        dir_fd = self.dir_fds.get(dir_path)
+        if dir_fd is None:
+            try:
+                dir_fd = os.open(dir_path, os.O_RDONLY | os.O_DIRECTORY | getattr(os, "O_CLOEXEC", 0))
+            except OSError:
+                return (None, file_path)
+            self.dir_fds[dir_path] = dir_fd
+
+        return (dir_fd, file_name)
+
+    def readlink(self, file_path):
+        """
+        Read the target of the symlink at `file_path` relative to the fd
+        of its parent directory.
+
+        @return Returns the target if a symlink exists at `file_path`,
+        otherwise `None`.
+        """
+
+        (dir_fd, file_name) = self.get_parent_dir_fd(file_path)
+        try:
+            return os.readlink(file_name, dir_fd=dir_fd)
+        except OSError:
+            # Not a symlink (EINVAL), or the file or its parent does not exist
+            return None
+
+    def invalidate(self, path):
+        """
+        Close the fds of the directories at or under `path`, since a file
+        at `path` was deleted or replaced, and the directory paths may now
+        refer to different directories.
+        """
+
+        dir_sub_path = path.rstrip(os.sep) + os.sep
+        for dir_path in [dir_path for dir_path in self.dir_fds
+                         if dir_path == path or dir_path.startswith(dir_sub_path)]:
+            os.close(self.dir_fds.pop(dir_path))
+
+    def add_result(self, file_path, result):
+        "Count `result` for the operation on `file_path` for its parent directory."
+
+        dir_path = os.path.dirname(file_path)
+        results = self.dir_results.get(dir_path)
+        if results is None:
+            results = collections.Counter()
+            self.dir_results[dir_path] = results
+        results[result] += 1
+        self.last_result = result
+
+    def get_results_summary(self):
+        "Get the summary of results counted for each directory."
+
+        string = ""
+        for dir_path, results in self.dir_results.items():
+            string += ("\n" if string else "") + "\"" + dir_path + "\": " + \
+                ", ".join([result + ": " + str(count) for result, count in results.items()])
+
+        return string
+
+    def close(self):
+        "Close the fds of all the directories opened for the batch."
+
+        for dir_fd in self.dir_fds.values():
+            os.close(dir_fd)
+        self.dir_fds.clear()
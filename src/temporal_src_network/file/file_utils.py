@@ -4,18 +4,41 @@ import re
 import shutil
 import stat
 import sys
+import tempfile
 
 from . import file_constants
 from . import file_types
 from .file_types import FileTypes
 from . import file_utils_errno
 from ..logger.logger_core import logger
+from ..timing.run_metrics import run_metrics
 
 
 LOG_TAG = "file_utils"
 
 FILESYSTEM_ENCODING = None
 
+TEMP_SYMLINK_FILE_PREFIX = "temporal-src-network-symlink."
+"""
+The prefix for the names of the temp symlink files that are created
+beside a destination file to atomically replace it with a symlink,
+after the leading dot.
+"""
+
+ATOMIC_WRITE_FILE_MODE = 0o644
+"""
+The mode of the files written by {@link #write_file_atomically()}, instead
+of the `0600` mode of the temp files created by `tempfile.mkstemp()`.
+"""
+
+CANONICAL_PATHS_CACHE = {}
+"""
+The run-scoped cache of canonical paths returned by {@link #get_canonical_path()}.
+It is cleared by {@link #clear_canonical_paths_cache()} whenever files are
+created or deleted by the functions in this module, or by other
+components of the tool that create or delete files.
+"""
+
 
 
 def is_path_set(label, path):
@@ -88,13 +111,18 @@ def is_path_valid(label, path,
         if error is not None:
             return error
 
+    # Encode path only once for both length checks.
+    path_bytes = None
+    if ensure_not_too_long or ensure_component_not_too_long:
+        path_bytes = get_path_bytes(path)
+
     if ensure_not_too_long:
-        error = is_path_too_long(label, path)
+        error = is_path_too_long(label, path, path_bytes)
         if error is not None:
             return error
 
     if ensure_component_not_too_long:
-        error = is_path_component_too_long(label, path)
+        error = is_path_component_too_long(label, path, path_bytes)
         if error is not None:
             return error
 
@@ -106,6 +134,38 @@ def is_path_valid(label, path,
 
     return None
 
+def get_invalid_paths_errors(label_paths,
+                             ensure_no_null_bytes=True,
+                             ensure_not_too_long=True,
+                             ensure_component_not_too_long=True,
+                             ensure_absolute=True,
+                             ensure_canonical=False):
+    """
+    Check if all paths in `label_paths` are valid as per {@link #is_path_valid()}.
+
+    Unlike calling {@link #is_path_valid()} for each path, this does not
+    stop at the first invalid path so that errors for all invalid paths
+    can be reported at once, and paths that are repeated are only checked once.
+
+    @param label_paths The `list` of `(label, path)` tuples for the paths to check.
+    @return Returns the `list` of errors for invalid paths, which will be empty if all are valid.
+    """
+
+    errors = []
+    valid_paths = set()
+    for label, path in label_paths:
+        if isinstance(path, str) and path in valid_paths:
+            continue
+
+        error = is_path_valid(label, path, ensure_no_null_bytes, ensure_not_too_long,
+                              ensure_component_not_too_long, ensure_absolute, ensure_canonical)
+        if error is not None:
+            errors.append(error)
+        elif isinstance(path, str):
+            valid_paths.add(path)
+
+    return errors
+
 def path_contains_null_byte(label, path):
     """
     Check if `path` contains null bytes.
@@ -121,17 +181,18 @@ def path_contains_null_byte(label, path):
     elif not path:
         return None
 
-    if str(b'\x00') in path:
+    if "\0" in path:
         return file_utils_errno.ERRNO_NULL_BYTE_CONTAINING_PATH.format(label, path)
     else:
         return None
 
-def is_path_too_long(label, path):
+def is_path_too_long(label, path, path_bytes=None):
     """
     Check if `path` length is `>= 4096` {@link file_constants#PATH_MAX}.
 
     @param label The label for `path`.
     @param path The `path` to check.
+    @param path_bytes[`None`] The `path` already encoded with {@link #get_path_bytes()}.
     @return Returns an error if `path` length is too long, otherwise `None`.
     """
 
@@ -142,19 +203,21 @@ def is_path_too_long(label, path):
     elif not path:
         return None
 
-    path_bytes = bytes(path, get_filesystem_encoding())
+    if path_bytes is None:
+        path_bytes = get_path_bytes(path)
     path_length = len(path_bytes)
     if path_length >= file_constants.PATH_MAX:
         return file_utils_errno.ERRNO_PATH_TOO_LONG.format(label, path_length, path)
     else:
         return None
 
-def is_path_component_too_long(label, path):
+def is_path_component_too_long(label, path, path_bytes=None):
     """
     Check if any `path` component length is `> 255` ({@link file_constants#NAME_MAX}).
 
     @param label The label for `path`.
     @param path The `path` to check.
+    @param path_bytes[`None`] The `path` already encoded with {@link #get_path_bytes()}.
     @return Returns an error if any `path` component length is too long, otherwise `None`.
     """
 
@@ -165,21 +228,36 @@ def is_path_component_too_long(label, path):
     elif not path:
         return None
 
+    # No component can be too long if the whole path is not.
+    if path_bytes is None:
+        path_bytes = get_path_bytes(path)
+    if len(path_bytes) <= file_constants.NAME_MAX:
+        return None
+
     if path.startswith(os.sep):
         i = 0
     else:
         i = 1
-    encoding = get_filesystem_encoding()
-    for component in path.split(os.sep):
-        component_bytes = bytes(component, encoding)
+    components = path.split(os.sep)
+    for j, component_bytes in enumerate(path_bytes.split(os.fsencode(os.sep))):
         component_length = len(component_bytes)
         if component_length > file_constants.NAME_MAX:
             return file_utils_errno.ERRNO_PATH_COMPONENT_TOO_LONG.format(
-                label, component_length, i, component, path)
+                label, component_length, i, components[j], path)
         i += 1
 
     return None
 
+def get_path_bytes(path):
+    "Get `path` encoded with the filesystem encoding."
+
+    # The filesystem encodings are ascii compatible, so ascii paths
+    # are encoded with the faster ascii codec.
+    if path.isascii():
+        return path.encode("ascii")
+    else:
+        return path.encode(get_filesystem_encoding())
+
 def is_path_absolute(label, path):
     """
     Check if `path` is an absolute path as per {@link #isPathAbsolute(String)}.
@@ -277,14 +355,17 @@ def get_filesystem_encoding():
 
 
 
-def get_file_type(log_tag, path, follow_links):
-    "Returns the one of the FileTypes for file at path. Will also return FileTypes.NO_EXIST if failed to find file type."
+def get_file_type(log_tag, path, follow_links, dir_fd=None):
+    """
+    Returns the one of the FileTypes for file at path. Will also return FileTypes.NO_EXIST if failed to find file type.
+    If `dir_fd` is set, then `path` is relative to the directory it refers to.
+    """
 
     try:
         if follow_links:
-            mode = os.stat(path).st_mode
+            mode = os.stat(path, dir_fd=dir_fd).st_mode
         else:
-            mode = os.lstat(path).st_mode
+            mode = os.lstat(path, dir_fd=dir_fd).st_mode
     except OSError as err:
         if err.errno != errno.ENOENT:
             logger.error(log_tag, "Getting file type of file at path \"" + path + "\"" +
@@ -334,6 +415,48 @@ def normalize_path(path):
 
 
 
+def get_canonical_path(path):
+    """
+    Get the canonical path of `path` with `os.path.realpath()`.
+
+    The canonical paths are cached in {@link #CANONICAL_PATHS_CACHE} for
+    the run, since the same paths, like the `project_root_dir` and
+    `module_root_dir`, are canonicalized for every module and version,
+    and each canonicalization requires a `lstat` and `readlink` for
+    every path component.
+
+    @param path The `path` to canonicalize.
+    @return Returns the canonical path.
+    """
+
+    canonical_path = CANONICAL_PATHS_CACHE.get(path)
+    if canonical_path is None:
+        canonical_path = os.path.realpath(path)
+        CANONICAL_PATHS_CACHE[path] = canonical_path
+        if run_metrics.enabled:
+            run_metrics.inc("cache_requests_total", labels={"cache": "canonical_paths", "result": "miss"},
+                            context_labels=False)
+    elif run_metrics.enabled:
+        run_metrics.inc("cache_requests_total", labels={"cache": "canonical_paths", "result": "hit"},
+                        context_labels=False)
+
+    return canonical_path
+
+def clear_canonical_paths_cache():
+    """
+    Clear the {@link #CANONICAL_PATHS_CACHE}.
+
+    This must be called after creating or deleting any directory or
+    symlink file, since canonical paths of paths under them, or of paths
+    that resolve through them, may have changed.
+    """
+
+    CANONICAL_PATHS_CACHE.clear()
+
+
+
+
+
 def is_path_in_dir_paths(path, dir_paths, ensure_under, canonicalize_path=True, canonicalize_dir_path=True):
     """
     Wrapper for {@link #get_if_path_in_dir_path()} that returns
@@ -372,26 +495,27 @@ def get_if_path_in_dir_path(path, dir_path, ensure_under, canonicalize_path=True
     @param ensure_under If set to `True`, then it will be ensured that `path` is under the directory
                         and does not equal it. If set to `False`, it can either equal the directory
                         path or be under it.
-    @param canonicalize_path[`True`] Set to `True` if `path` should be canonicalized, otherwise it will
-                            be used as is.
-    @param canonicalize_dir_path[`True`] Set to `True` if `dir_path` should be canonicalized in case it
-                               may be a symlink, otherwise `dir_path` is just normalized.
+    @param canonicalize_path[`True`] Set to `True` if `path` should be canonicalized with
+                            {@link #get_canonical_path()}, otherwise it will be used as is.
+    @param canonicalize_dir_path[`True`] Set to `True` if `dir_path` should be canonicalized with
+                               {@link #get_canonical_path()} in case it may be a symlink, otherwise
+                               `dir_path` is just normalized.
     @return Returns the canonicalized or normalized `dir_path` if `path` is found in it, otherwise
     returns `None`.
     """
 
-    if is_path_absolute("path", path) is not None or is_path_absolute("directory path", path) is not None:
-        return False
+    if is_path_absolute("path", path) is not None or is_path_absolute("directory path", dir_path) is not None:
+        return None
 
     sep = os.sep
 
     if canonicalize_path:
-        path = os.path.realpath(path)
+        path = get_canonical_path(path)
     else:
         path = normalize_path(path)
 
     if canonicalize_dir_path:
-        dir_path = os.path.realpath(dir_path)
+        dir_path = get_canonical_path(dir_path)
     else:
         dir_path = normalize_path(dir_path)
 
@@ -462,6 +586,8 @@ def create_dir_file(log_tag, label, file_path):
             os.makedirs(file_path)
         except OSError as err:
             return file_utils_errno.ERRNO_CREATING_FILE_FAILED_WITH_EXCEPTION.format(label + "directory file", file_path, str(err))
+        finally:
+            clear_canonical_paths_cache()
 
     file_type = get_file_type(log_tag, file_path, False)
     if file_type != FileTypes.DIRECTORY:
@@ -473,6 +599,44 @@ def create_dir_file(log_tag, label, file_path):
 
 
 
+def write_file_atomically(label, file_path, write_function, binary=False):
+    """
+    Write file at path atomically. The file is written to a hidden temp
+    file in the same directory first, whose mode is then set to
+    {@link #ATOMIC_WRITE_FILE_MODE}, and which is then renamed to the
+    file path, so that a partially written file is never read.
+
+    @param label The label for the file.
+    @param file_path The path for file to write.
+    @param write_function The function called with the open temp file to write to it.
+    @param binary If `True`, then the temp file is opened in binary mode,
+                  otherwise in text mode with `utf-8` encoding.
+    @return Returns the error if writing failed, otherwise `None`.
+    """
+
+    temp_file_path = None
+    try:
+        (temp_file_fd, temp_file_path) = tempfile.mkstemp(
+            dir=os.path.dirname(file_path) or ".", prefix="." + os.path.basename(file_path).lstrip(".") + ".",
+            suffix=".tmp")
+        with (os.fdopen(temp_file_fd, "wb") if binary else os.fdopen(temp_file_fd, "w", encoding="utf-8")) as temp_file:
+            write_function(temp_file)
+        os.chmod(temp_file_path, ATOMIC_WRITE_FILE_MODE)
+        os.replace(temp_file_path, file_path)
+        temp_file_path = None
+    except Exception as err: # pylint: disable=broad-except
+        return "Writing " + label + " file at \"" + file_path + "\" failed with err:\n" + str(err)
+    finally:
+        if temp_file_path:
+            try:
+                os.remove(temp_file_path)
+            except OSError:
+                pass
+
+    return None
+
+
+
 def delete_regular_file(log_tag, label, file_path, ignore_non_existent_file=True):
     """
     Delete regular file at path.
@@ -610,6 +774,8 @@ def delete_file(log_tag, label, file_path, allowed_file_type_flags, ignore_non_e
         if err.errno != errno.ENOENT:
             return file_utils_errno.ERRNO_DELETING_FILE_FAILED_WITH_EXCEPTION.format(
                 label + "file", file_path, str(err))
+    finally:
+        clear_canonical_paths_cache()
 
     # If file still exists after deleting it
     file_type = get_file_type(log_tag, file_path, False)
@@ -624,7 +790,7 @@ def delete_file(log_tag, label, file_path, allowed_file_type_flags, ignore_non_e
 
 
 def create_symlink_file(log_tag, label, target_file_path, dest_file_path, target_is_directory,
-                        target_no_exist_mode, dest_already_exists_mode):
+                        target_no_exist_mode, dest_already_exists_mode, validate_paths=True, dir_fd_batch=None):
     """
     Create a symlink file at path.
 
@@ -677,19 +843,25 @@ def create_symlink_file(log_tag, label, target_file_path, dest_file_path, target
     @param target_is_directory The `target_is_directory` argument value to pass to `os.symlink()`.
     @param target_no_exist_mode The mode for what to do if symlink `target_file_path` does not exist.
     @param dest_already_exists_mode The mode for what to do if symlink `dest_file_path` already exists.
+    @param validate_paths[`True`] Whether `target_file_path` and `dest_file_path` should be
+                          validated, if the caller has not already validated them.
+    @param dir_fd_batch[`None`] The optional {@link DirFdBatch} with which the destination file
+                        is checked, deleted and created relative to the fd of its parent directory,
+                        and to which the result is added.
     @return Returns the `error` if failed to create symlink file, otherwise `null`.
     """
 
     label = "" if not label else str(label) + " "
 
-    error = is_path_valid(label + "symlink destination file path", dest_file_path)
-    if error is not None:
-        return error
+    if validate_paths:
+        error = is_path_valid(label + "symlink destination file path", dest_file_path)
+        if error is not None:
+            return error
 
-    # Allow non absolute paths
-    error = is_path_valid(label + "symlink target file path", target_file_path, ensure_absolute=False)
-    if error is not None:
-        return error
+        # Allow non absolute paths
+        error = is_path_valid(label + "symlink target file path", target_file_path, ensure_absolute=False)
+        if error is not None:
+            return error
 
     symlink_type = "directory" if target_is_directory else "file"
 
@@ -704,8 +876,13 @@ def create_symlink_file(log_tag, label, target_file_path, dest_file_path, target
     # after appending the `../t` target, the `c` directory may not exist.
     target_file_absolute_path = normalize_path(target_file_absolute_path)
 
+    dest_dir_fd = None
+    dest_file_name = dest_file_path
+    if dir_fd_batch is not None:
+        (dest_dir_fd, dest_file_name) = dir_fd_batch.get_parent_dir_fd(dest_file_path)
+
     target_file_type = get_file_type(log_tag, target_file_absolute_path, False)
-    dest_file_type = get_file_type(log_tag, dest_file_path, False)
+    dest_file_type = get_file_type(log_tag, dest_file_name, False, dir_fd=dest_dir_fd)
 
     # If target file does not exist
     if target_file_type == FileTypes.NO_EXIST:
@@ -716,6 +893,8 @@ def create_symlink_file(log_tag, label, target_file_path, dest_file_path, target
             logger.verbose(log_tag, "Ignoring creating " + label + "symlink file at path" +
                            " \"" + dest_file_path + "\" to \"" + target_file_path + "\" " +
                            symlink_type + " since target does not exist")
+            if dir_fd_batch is not None:
+                dir_fd_batch.add_result(dest_file_path, "ignored")
             return None
         # If dangling symlink should be allowed
         elif target_no_exist_mode == "ALLOW":
@@ -739,6 +918,8 @@ def create_symlink_file(log_tag, label, target_file_path, dest_file_path, target
                            " \"" + dest_file_path + "\" to \"" + target_file_path + "\" " +
                            symlink_type + " since a " + dest_file_type.name +
                            " file already exists at destination")
+            if dir_fd_batch is not None:
+                dir_fd_batch.add_result(dest_file_path, "ignored")
             return None
         # If to overwrite destination regardless of file type
         elif dest_already_exists_mode == "OVERWRITE":
@@ -757,8 +938,21 @@ def create_symlink_file(log_tag, label, target_file_path, dest_file_path, target
             return file_utils_errno.ERRNO_INVALID_SYMLINK_DEST_ALREADY_EXISTS_MODE.format(
                 label + "symlink file", dest_already_exists_mode, "create_symlink_file")
 
+        # Replace the destination file atomically if its not a directory,
+        # since directories cannot be replaced by `rename()`.
+        if dest_file_type in [FileTypes.REGULAR, FileTypes.SYMLINK]:
+            error = replace_file_with_symlink_file(log_tag, label, target_file_path, dest_file_path,
+                                                   target_is_directory, dest_dir_fd, dest_file_name)
+            if dir_fd_batch is not None:
+                dir_fd_batch.invalidate(dest_file_path)
+                if error is None:
+                    dir_fd_batch.add_result(dest_file_path, "replaced")
+            return error
+
         # Delete the destination file
         error = delete_normal_file(log_tag, label + "symlink destination", dest_file_path)
+        if dir_fd_batch is not None:
+            dir_fd_batch.invalidate(dest_file_path)
         if error is not None:
             return error
     else:
@@ -772,12 +966,86 @@ def create_symlink_file(log_tag, label, target_file_path, dest_file_path, target
         logger.verbose(log_tag, "Creating " + label + "symlink file at path" +
                        " \"" + dest_file_path + "\" to \"" + target_file_path + "\" " + symlink_type)
 
-        os.symlink(target_file_path, dest_file_path, target_is_directory=target_is_directory)
+        os.symlink(target_file_path, dest_file_name, target_is_directory=target_is_directory, dir_fd=dest_dir_fd)
+
+        if dir_fd_batch is not None:
+            dir_fd_batch.add_result(dest_file_path,
+                "created" if dest_file_type == FileTypes.NO_EXIST else "overwritten")
+
+        return None
+    except Exception as err:
+        return file_utils_errno.ERRNO_CREATING_SYMLINK_FILE_FAILED_WITH_EXCEPTION.format(
+            label + "symlink file", dest_file_path, target_file_path, symlink_type, str(err))
+    finally:
+        clear_canonical_paths_cache()
+
+def replace_file_with_symlink_file(log_tag, label, target_file_path, dest_file_path, target_is_directory,
+                                   dest_dir_fd=None, dest_file_name=None):
+    """
+    Atomically replace the non directory file at `dest_file_path` with a
+    symlink to `target_file_path`.
+
+    A temp symlink is created in the same directory as the destination
+    and then renamed to it with `os.replace()`, so that other processes
+    accessing the destination, like through a `current` symlink of a
+    module, always find either the old file or the new symlink, instead
+    of it not existing between deleting the old file and creating the
+    new symlink.
+
+    @param label The optional label for the symlink file. This can optionally be `None`.
+    @param target_file_path The `path` TO which the symlink file will be created.
+    @param dest_file_path The `path` AT which the symlink file will be created.
+    @param target_is_directory The `target_is_directory` argument value to pass to `os.symlink()`.
+    @param dest_dir_fd[`None`] The optional fd of the parent directory of `dest_file_path`.
+    @param dest_file_name[`None`] The name of the destination file in `dest_dir_fd`. This must be set if
+                          `dest_dir_fd` is set.
+    @return Returns the `error` if failed to replace the destination file, otherwise `None`.
+    """
+
+    label = "" if not label else str(label) + " "
+
+    symlink_type = "directory" if target_is_directory else "file"
+
+    if dest_dir_fd is None:
+        dest_file_name = dest_file_path
+        temp_file_dir = get_dirname(dest_file_path)
+    else:
+        temp_file_dir = None
+
+    temp_file_name = None
+    try:
+        logger.verbose(log_tag, "Replacing " + label + "symlink file at path" +
+                       " \"" + dest_file_path + "\" to \"" + target_file_path + "\" " + symlink_type)
+
+        # Create the temp symlink with a random name, retrying if the
+        # name already exists, like if left behind by a killed process.
+        for _ in range(100):
+            temp_file_name = "." + TEMP_SYMLINK_FILE_PREFIX + os.urandom(8).hex()
+            if temp_file_dir is not None:
+                temp_file_name = os.path.join(temp_file_dir, temp_file_name)
+            try:
+                os.symlink(target_file_path, temp_file_name, target_is_directory=target_is_directory,
+                           dir_fd=dest_dir_fd)
+                break
+            except FileExistsError:
+                temp_file_name = None
+        else:
+            raise FileExistsError(errno.EEXIST, "Failed to find a unique temp symlink file name")
+
+        os.replace(temp_file_name, dest_file_name, src_dir_fd=dest_dir_fd, dst_dir_fd=dest_dir_fd)
+        temp_file_name = None
 
         return None
     except Exception as err:
         return file_utils_errno.ERRNO_CREATING_SYMLINK_FILE_FAILED_WITH_EXCEPTION.format(
             label + "symlink file", dest_file_path, target_file_path, symlink_type, str(err))
+    finally:
+        if temp_file_name is not None:
+            try:
+                os.unlink(temp_file_name, dir_fd=dest_dir_fd)
+            except OSError:
+                pass
+        clear_canonical_paths_cache()
 
 
 
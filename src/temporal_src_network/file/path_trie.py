@@ -0,0 +1,86 @@
+import os
+
+class PathTrieNode:
+    "Node of a `PathTrie` for a path component."
+
+    __slots__ = ("children", "values")
+
+    def __init__(self):
+        self.children = {}
+        self.values = []
+
+class PathTrie:
+    """
+    Prefix trie of absolute paths split on path components, so that
+    finding the values added for the paths that equal, contain or are
+    under a path costs `O(depth)` of the path instead of comparing it
+    against every path added.
+
+    Paths must be normalized or canonicalized by the caller, and are
+    compared as is.
+    """
+
+    __slots__ = ("root",)
+
+    def __init__(self):
+        self.root = PathTrieNode()
+
+    @staticmethod
+    def get_path_components(path):
+        "Get the `list` of non-empty path components of `path`."
+
+        return [component for component in str(path).split(os.sep) if component]
+
+    def add(self, path, value):
+        "Add `value` for `path`."
+
+        node = self.root
+        for component in PathTrie.get_path_components(path):
+            child = node.children.get(component)
+            if child is None:
+                child = PathTrieNode()
+                node.children[component] = child
+            node = child
+
+        node.values.append(value)
+
+    def get_values_at_or_above(self, path):
+        """
+        Get the values added for `path` and its parent paths.
+
+        @return Returns the `list` of values, in order of the shortest path first.
+        """
+
+        values = []
+
+        node = self.root
+        values.extend(node.values)
+        for component in PathTrie.get_path_components(path):
+            node = node.children.get(component)
+            if node is None:
+                break
+            values.extend(node.values)
+
+        return values
+
+    def get_values_under(self, path):
+        """
+        Get the values added for the paths under `path`, excluding `path` itself.
+
+        @return Returns the `list` of values.
+        """
+
+        node = self.root
+        for component in PathTrie.get_path_components(path):
+            node = node.children.get(component)
+            if node is None:
+                return []
+
+        values = []
+        nodes = list(node.children.values())
+        while nodes:
+            node = nodes.pop()
+            values.extend(node.values)
+            nodes.extend(node.children.values())
+
+        return values
@@ -1,10 +1,31 @@
 # pyright: reportOptionalMemberAccess=false, reportGeneralTypeIssues=false
 
+import atexit
+import contextlib
+import datetime
+import json
 import logging
+import logging.handlers
+import queue
+import re
 import sys
+import threading
+
+from ..data.data_utils import log_private_value, redact_url_user_info
+from ..timing.span_timer import span_timer
 
 class Logger():
-    "Logger core class"
+    """
+    Logger core class
+
+    Records are passed through a queue to a single writer thread that
+    writes them to the stdout and stderr handlers, so that logging from
+    multiple threads does not contend on the handlers and their streams.
+    The records logged by a thread while `buffered()` is active are
+    held in a buffer local to the thread, and are written together as
+    a single block when it exits, so that the logs of a job run in
+    parallel with other jobs are not interleaved with theirs.
+    """
 
     LOG_LEVEL_OFF = -1
     """
@@ -34,12 +55,37 @@ class Logger():
     LOG_LEVELS = [LOG_LEVEL_OFF, LOG_LEVEL_NORMAL, LOG_LEVEL_DEBUG, LOG_LEVEL_VERBOSE, LOG_LEVEL_VVERBOSE]
     DEFAULT_LOG_LEVEL = LOG_LEVEL_NORMAL
 
+    LOG_FORMAT_TEXT = "text"
+    """
+    The log format to log each record as a line with its level, tag and
+    message.
+    """
+
+    LOG_FORMAT_JSON = "json"
+    """
+    The log format to log each record as a json object on a single line.
+    """
+
+    LOG_FORMATS = [LOG_FORMAT_TEXT, LOG_FORMAT_JSON]
+    DEFAULT_LOG_FORMAT = LOG_FORMAT_TEXT
+
     def __init__(self):
         self.logger_impl = None
         self.logger_log_formatter = None
+        self.logger_queue_handler = None
+        self.logger_queue_listener = None
+
+    def setup_logger(self, logger_name=None, logger_log_level=None, logger_log_formatter=None,
+                     logger_log_format=None, logger_private_fields_list=None):
+        """
+        Setup the logger with optionally the logger name, log level and format passed.
 
-    def setup_logger(self, logger_name=None, logger_log_level=None, logger_log_formatter=None):
-        "Setup the logger with optionally the logger name, log level and format passed."
+        @param logger_log_format One of `LOG_FORMATS`, used if
+                                 logger_log_formatter is not passed.
+        @param logger_private_fields_list The `list` of names of private
+                                          fields whose values are redacted
+                                          in the `json` log format.
+        """
 
         if self.logger_impl:
             return
@@ -54,11 +100,34 @@ class Logger():
         # Must be called before handlers as it reads logger_impl.level
         self.set_log_level(logger_log_level)
 
+        if logger_log_formatter is None and logger_log_format == Logger.LOG_FORMAT_JSON:
+            logger_log_formatter = LoggerJsonFormatter(logger_private_fields_list)
+
         self.set_log_handlers(logger_log_formatter)
 
+        if isinstance(logger_log_formatter, LoggerJsonFormatter):
+            self.logger_queue_handler.addFilter(LoggerJsonFilter())
+
+        # Write the records still in the queue at exit
+        atexit.register(self.shutdown)
+
     def get_log_level(self):
         return self.logger_impl.level
 
+    def is_log_level_enabled(self, logger_log_level):
+        """
+        Check if messages for `logger_log_level` will be logged.
+
+        This should be used to skip building messages that are expensive
+        to create, like dumps of objects, if they will not be logged.
+        """
+
+        logger_impl = self.logger_impl
+        if not logger_impl or logger_impl.disabled:
+            return False
+
+        return logger_impl.level <= logger_log_level
+
     def set_log_level(self, logger_log_level):
         logger_impl = self.logger_impl
         if not logger_impl or not isinstance(logger_impl, logging.Logger):
@@ -96,13 +165,20 @@ class Logger():
         console_handler_stdout.setLevel(logger_log_level)
         console_handler_stdout.addFilter(LoggerLessThanFilter(logging.WARNING))
         console_handler_stdout.setFormatter(logger_log_formatter)
-        logger_impl.addHandler(console_handler_stdout)
 
         # Redirect WARNING and above messages to stderr
         console_handler_stderr = logging.StreamHandler(sys.stderr)
         console_handler_stderr.setLevel(logging.WARNING)
         console_handler_stderr.setFormatter(logger_log_formatter)
-        logger_impl.addHandler(console_handler_stderr)
+
+        # The console handlers are only called by the writer thread of
+        # the listener
+        log_queue = queue.SimpleQueue()
+        self.logger_queue_handler = LoggerQueueHandler(log_queue)
+        logger_impl.addHandler(self.logger_queue_handler)
+        self.logger_queue_listener = LoggerQueueListener(
+            log_queue, console_handler_stdout, console_handler_stderr, respect_handler_level=True)
+        self.logger_queue_listener.start()
 
         self.logger_log_formatter = logger_log_formatter
 
@@ -113,98 +189,277 @@ class Logger():
     def get_tag_prefix(self, tag):
         return "{:22s}".format(tag) # pylint: disable=consider-using-f-string
 
+    def get_tagged_kwargs(self, tag, kwargs):
+        """
+        Get the kwargs for logging a message with `tag`, with the tag
+        and its prefix added to the `extra` attributes of the record, so
+        that the formatter can format the tag as per the log format.
+        """
+
+        extra = {LoggerFormatter.TAG: tag, LoggerFormatter.TAG_PREFIX: self.get_tag_prefix(tag)}
+        if kwargs.get("extra"):
+            extra.update(kwargs["extra"])
+        kwargs["extra"] = extra
+        return kwargs
+
     def vverbose(self, tag, msg, *args, **kwargs):
-        self.logger_impl.vverbose(self.get_tag_prefix(tag) + msg, *args, **kwargs)
+        self.logger_impl.vverbose(msg, *args, **self.get_tagged_kwargs(tag, kwargs))
 
     def verbose(self, tag, msg, *args, **kwargs):
-        self.logger_impl.verbose(self.get_tag_prefix(tag) + msg, *args, **kwargs)
+        self.logger_impl.verbose(msg, *args, **self.get_tagged_kwargs(tag, kwargs))
 
     def debug(self, tag, msg, *args, **kwargs):
-        self.logger_impl.debug(self.get_tag_prefix(tag) + msg, *args, **kwargs)
+        self.logger_impl.debug(msg, *args, **self.get_tagged_kwargs(tag, kwargs))
 
     def info(self, tag, msg, *args, **kwargs):
-        self.logger_impl.info(self.get_tag_prefix(tag) + msg, *args, **kwargs)
+        self.logger_impl.info(msg, *args, **self.get_tagged_kwargs(tag, kwargs))
 
     def warn(self, tag, msg, *args, **kwargs):
-        self.logger_impl.warning(self.get_tag_prefix(tag) + msg, *args, **kwargs)
+        self.logger_impl.warning(msg, *args, **self.get_tagged_kwargs(tag, kwargs))
 
     def error(self, tag, msg, *args, **kwargs):
-        self.logger_impl.error(self.get_tag_prefix(tag) + msg, *args, **kwargs)
+        self.logger_impl.error(msg, *args, **self.get_tagged_kwargs(tag, kwargs))
 
     def error_debug(self, tag, msg, *args, **kwargs):
         if self.get_log_level() <= Logger.LOG_LEVEL_DEBUG:
-            self.logger_impl.error(self.get_tag_prefix(tag) + msg, *args, **kwargs)
+            self.logger_impl.error(msg, *args, **self.get_tagged_kwargs(tag, kwargs))
 
     def error_verbose(self, tag, msg, *args, **kwargs):
         if self.get_log_level() <= Logger.LOG_LEVEL_VERBOSE:
-            self.logger_impl.error(self.get_tag_prefix(tag) + msg, *args, **kwargs)
+            self.logger_impl.error(msg, *args, **self.get_tagged_kwargs(tag, kwargs))
 
     def error_vverbose(self, tag, msg, *args, **kwargs):
         if self.get_log_level() <= Logger.LOG_LEVEL_VVERBOSE:
-            self.logger_impl.error(self.get_tag_prefix(tag) + msg, *args, **kwargs)
+            self.logger_impl.error(msg, *args, **self.get_tagged_kwargs(tag, kwargs))
 
     def critical(self, tag, msg, *args, **kwargs):
-        self.logger_impl.critical(self.get_tag_prefix(tag) + msg, *args, **kwargs)
+        self.logger_impl.critical(msg, *args, **self.get_tagged_kwargs(tag, kwargs))
 
     def exception(self, tag, msg, *args, **kwargs):
-        self.logger_impl.exception(self.get_tag_prefix(tag) + msg, *args, **kwargs)
+        self.logger_impl.exception(msg, *args, **self.get_tagged_kwargs(tag, kwargs))
 
     def log(self, priority, msg, *args, **kwargs):
         self.logger_impl.log(priority, msg, *args, **kwargs)
 
     def shutdown(self):
-        self.logger_impl.shutdown()
+        "Write the records in the queue and stop the writer thread."
+
+        if self.logger_queue_listener:
+            self.logger_queue_listener.stop()
+            self.logger_queue_listener = None
+
+    def buffered(self):
+        """
+        Get a context manager that buffers the records logged by the
+        current thread while its context is active, and writes them as a
+        single block when it exits. Nested contexts write their records
+        with the block of the outermost context.
+        """
+
+        if not self.logger_queue_handler:
+            return contextlib.nullcontext()
+
+        return self.logger_queue_handler.buffered()
 
     def log_debug_no_format(self, msg, *args, **kwargs):
         "Log the message at 'DEBUG' level directly without any format."
 
-        self.logger_log_formatter.set_no_logger_format(True)
-        self.logger_impl.debug(msg, *args, **kwargs)
-        self.logger_log_formatter.set_no_logger_format(False)
+        self.logger_impl.debug(msg, *args, extra={LoggerFormatter.NO_LOGGER_FORMAT: True}, **kwargs)
 
     def log_verbose_no_format(self, msg, *args, **kwargs):
         "Log the message at 'VERBOSE' level directly without any format."
 
-        self.logger_log_formatter.set_no_logger_format(True)
-        self.logger_impl.verbose(msg, *args, **kwargs)
-        self.logger_log_formatter.set_no_logger_format(False)
+        self.logger_impl.verbose(msg, *args, extra={LoggerFormatter.NO_LOGGER_FORMAT: True}, **kwargs)
 
 logger = Logger()
 
 class LoggerFormatter(logging.Formatter):
-    "Logger format class"
+    """
+    Logger format class
+
+    The format is selected for each record from its own attributes, and
+    the formatters for each format are never modified after they are
+    set, so that records can be formatted by multiple threads.
+    """
 
-    root_logger_format = "[%(levelname).1s] %(message)s"
-    # root_logger_format = "[%(levelname).1s] %(funcName)s: %(message)s"
+    root_logger_format = "[%(levelname).1s] %(tag_prefix)s%(message)s"
+    # root_logger_format = "[%(levelname).1s] %(tag_prefix)s%(funcName)s: %(message)s"
 
-    named_logger_format = "[%(levelname).1s] %(name)s: %(message)s"
-    # named_logger_format = "[%(levelname).1s] %(name)s: %(funcName)s: %(message)s"
+    named_logger_format = "[%(levelname).1s] %(name)s: %(tag_prefix)s%(message)s"
+    # named_logger_format = "[%(levelname).1s] %(name)s: %(tag_prefix)s%(funcName)s: %(message)s"
+
+    NO_LOGGER_FORMAT = "no_logger_format"
+    "The record attribute that if `True`, then the record is logged without any format."
+
+    TAG = "tag"
+    "The record attribute for the tag of the record."
+
+    TAG_PREFIX = "tag_prefix"
+    "The record attribute for the padded prefix of the tag of the record."
 
     def __init__(self):
         super().__init__()
-        self.no_logger_format = False
-        self.custom_logger_format = None
-
-    def set_no_logger_format(self, state):
-        self.no_logger_format = state
-        self.custom_logger_format = None
+        self.no_formatter = logging.Formatter("%(message)s")
+        self.root_formatter = logging.Formatter(self.root_logger_format)
+        self.named_formatter = logging.Formatter(self.named_logger_format)
+        self.custom_formatter = None
 
     def set_custom_logger_format(self, custom_logger_format):
-        self.no_logger_format = False
-        self.custom_logger_format = custom_logger_format
+        self.custom_formatter = logging.Formatter(custom_logger_format) if custom_logger_format else None
 
     def format(self, record):
-        # pylint: disable=protected-access
-
-        if self.no_logger_format:
-            self._style._fmt = "%(message)s"
-        elif self.custom_logger_format:
-            self._style._fmt = self.custom_logger_format
+        if not hasattr(record, LoggerFormatter.TAG_PREFIX):
+            # Records not logged with a tag, like with `Logger.log()`
+            setattr(record, LoggerFormatter.TAG_PREFIX, "")
+
+        if getattr(record, LoggerFormatter.NO_LOGGER_FORMAT, False):
+            formatter = self.no_formatter
+        elif self.custom_formatter:
+            formatter = self.custom_formatter
         elif record.name == "root":
-            self._style._fmt = self.root_logger_format
+            formatter = self.root_formatter
+        else:
+            formatter = self.named_formatter
+        return formatter.format(record)
+
+
+class LoggerJsonFormatter(logging.Formatter):
+    """
+    Logger json format class
+
+    Each record is formatted as a json object on a single line with its
+    timestamp, level, tag, message, thread, and the `project`, `module`
+    and `version` tags and the name of the current span of the
+    `span_timer` as the `phase` when the record was logged, if the
+    timer is enabled. The `exit_code` and `duration_ms` of command
+    records are added from the `extra` attributes of the record.
+
+    The values of the private fields in the `extra` attributes and
+    the values of the `field: value` and `"field": "value"` pairs for
+    private fields and the user info of urls in the message are redacted
+    as `***`.
+    """
+
+    CONTEXT_TAGS = ["project", "module", "version"]
+    "The span tags added to records."
+
+    COMMAND_FIELDS = ["exit_code", "duration_ms"]
+    "The `extra` attributes of command records added to records."
+
+    def __init__(self, private_fields_list=None):
+        super().__init__()
+        self.private_fields_list = list(private_fields_list) if private_fields_list else []
+        self.regex_private_fields = re.compile(
+            r'("?(?:' + "|".join([re.escape(field) for field in self.private_fields_list]) + r')"?\s*[:=]\s*)' +
+            r'("[^"]*"|\S+)') if self.private_fields_list else None
+
+    def format(self, record):
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            message += "\n" + record.exc_text
+
+        json_record = {
+            "timestamp": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                .isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "tag": getattr(record, LoggerFormatter.TAG, record.name),
+            "message": self.redact_message(message),
+            "thread": record.threadName
+        }
+
+        context = getattr(record, LoggerJsonFilter.CONTEXT, None)
+        if context:
+            for key in LoggerJsonFormatter.CONTEXT_TAGS:
+                if context[1].get(key) is not None:
+                    json_record[key] = context[1][key]
+            if context[0] is not None:
+                json_record["phase"] = context[0]
+
+        for field in LoggerJsonFormatter.COMMAND_FIELDS + self.private_fields_list:
+            if hasattr(record, field):
+                json_record[field] = getattr(record, field) if field not in self.private_fields_list \
+                    else log_private_value(getattr(record, field))
+
+        return json.dumps(json_record)
+
+    def redact_message(self, message):
+        if self.regex_private_fields:
+            message = self.regex_private_fields.sub(lambda match: match.group(1) + log_private_value(match.group(2)), message)
+        return redact_url_user_info(message)
+
+
+class LoggerJsonFilter(logging.Filter):
+    """
+    Logger filter class for the json log format, that adds the name and
+    tags of the current span of the logging thread to records, and drops
+    blank records logged without any format, like empty lines.
+    """
+
+    CONTEXT = "log_context"
+    "The record attribute for the `(span_name, span_tags)` of the current span."
+
+    def filter(self, record):
+        if getattr(record, LoggerFormatter.NO_LOGGER_FORMAT, False) and not str(record.msg).strip():
+            return 0
+
+        if span_timer.enabled:
+            setattr(record, LoggerJsonFilter.CONTEXT, (span_timer.get_current_span_name(), span_timer.get_current_tags()))
+        return 1
+
+
+class LoggerQueueHandler(logging.handlers.QueueHandler):
+    """
+    Logger handler class that puts records in the queue of the writer
+    thread, or in the buffer of the current thread if it is buffering.
+
+    The handler lock is not acquired, since the queue and the buffers
+    are safe to use from multiple threads.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.local = threading.local()
+
+    def handle(self, record):
+        rv = self.filter(record)
+        if rv:
+            self.emit(record)
+        return rv
+
+    def enqueue(self, record):
+        buffer = getattr(self.local, "buffer", None)
+        if buffer is not None:
+            buffer.append(record)
+        else:
+            self.queue.put_nowait(record)
+
+    @contextlib.contextmanager
+    def buffered(self):
+        if getattr(self.local, "buffer", None) is not None:
+            yield
+            return
+
+        buffer = self.local.buffer = []
+        try:
+            yield
+        finally:
+            self.local.buffer = None
+            if buffer:
+                # The block is put in the queue as a single item
+                self.queue.put_nowait(buffer)
+
+
+class LoggerQueueListener(logging.handlers.QueueListener):
+    "Logger queue listener class that writes records and blocks of records from the queue."
+
+    def handle(self, record):
+        if isinstance(record, list):
+            for block_record in record:
+                super().handle(block_record)
         else:
-            self._style._fmt = self.named_logger_format
-        return super().format(record)
+            super().handle(record)
 
 
 class LoggerLessThanFilter(logging.Filter):
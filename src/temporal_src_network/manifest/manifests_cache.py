@@ -0,0 +1,126 @@
+import hashlib
+import marshal
+import os
+import sys
+
+from ..file import file_utils
+from ..logger.logger_core import logger
+
+LOG_TAG = "manifests_cache"
+
+MANIFESTS_CACHE_FORMAT_VERSION = 1
+"""
+The version of the format of manifests cache files. This must be
+incremented if the format of cache files or the pre-processing done
+on manifests before they are cached is changed.
+"""
+
+MANIFESTS_CACHE_FILE_EXTENSION = ".marshal"
+
+
+
+def get_cache_key(key_parts, manifest_bytes):
+    """
+    Get the cache key for the manifests in `manifest_bytes`.
+
+    The key is the `sha256` hash of the `key_parts`, like the tool
+    version, manifests format and yaml backend, the cache format version, the
+    `marshal` format version of the python interpreter and the
+    `manifest_bytes`.
+
+    @param key_parts The `list` of values that should invalidate the cache if changed.
+    @param manifest_bytes The `bytes` of the manifest file.
+    @return Returns the cache key `str`.
+    """
+
+    sha256 = hashlib.sha256()
+    for key_part in [MANIFESTS_CACHE_FORMAT_VERSION, marshal.version,
+                     sys.version_info.major, sys.version_info.minor] + list(key_parts or []):
+        sha256.update(bytes(str(key_part), "utf-8") + b"\0")
+    sha256.update(manifest_bytes)
+    return sha256.hexdigest()
+
+def get_cache_file_path(manifests_cache_dir, cache_key):
+    "Get the path to the cache file for `cache_key` under `manifests_cache_dir`."
+
+    return os.path.join(manifests_cache_dir, cache_key + MANIFESTS_CACHE_FILE_EXTENSION)
+
+
+
+def read_manifests_from_cache(manifests_cache_dir, cache_key):
+    """
+    Read manifests for `cache_key` from `manifests_cache_dir`.
+
+    @return Returns the `list` of manifests if cache file exists and is
+    valid, otherwise `None`.
+    """
+
+    cache_file_path = get_cache_file_path(manifests_cache_dir, cache_key)
+
+    try:
+        with open(cache_file_path, "rb") as cache_file:
+            manifests = marshal.load(cache_file)
+    except FileNotFoundError:
+        logger.vverbose(LOG_TAG, "Manifests cache file not found at \"" + cache_file_path + "\"")
+        return None
+    except Exception as err:
+        logger.warn(LOG_TAG, "Reading manifests cache file at \"" + cache_file_path + "\"" +
+                    " failed with err:\n" + str(err))
+        return None
+
+    if not isinstance(manifests, list):
+        logger.warn(LOG_TAG, "Ignoring invalid manifests cache file at \"" + cache_file_path + "\"")
+        return None
+
+    return manifests
+
+def write_manifests_to_cache(manifests_cache_dir, cache_key, manifests):
+    """
+    Write `manifests` for `cache_key` to `manifests_cache_dir`.
+
+    The cache file is written to a temp file under `manifests_cache_dir`
+    first and then atomically renamed so that concurrent runs do not
+    read partially written cache files.
+
+    Failure to write the cache file is not considered an error since
+    manifests will just be parsed again on next run.
+    """
+
+    try:
+        manifests_bytes = marshal.dumps(get_marshallable_object(manifests))
+    except ValueError as err:
+        logger.verbose(LOG_TAG, "Not caching manifests since they cannot be marshalled: " + str(err))
+        return
+
+    error = file_utils.create_dir_file(LOG_TAG, "manifests cache", manifests_cache_dir)
+    if error is not None:
+        logger.warn(LOG_TAG, error)
+        return
+
+    cache_file_path = get_cache_file_path(manifests_cache_dir, cache_key)
+
+    error = file_utils.write_file_atomically("manifests cache", cache_file_path,
+                                             lambda cache_file: cache_file.write(manifests_bytes), binary=True)
+    if error is not None:
+        logger.warn(LOG_TAG, error)
+        return
+
+    logger.vverbose(LOG_TAG, "Wrote manifests cache file at \"" + cache_file_path + "\"")
+
+def get_marshallable_object(obj):
+    """
+    Get a copy of `obj` that can be passed to `marshal.dumps()`, which
+    only supports the exact `dict` type and not its subclasses like
+    `OrderedDict`. Insertion order of `dict` keys is preserved by `marshal`.
+
+    @raises ValueError If `obj` contains values of types not supported by `marshal`.
+    """
+
+    if isinstance(obj, dict):
+        return {key: get_marshallable_object(value) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [get_marshallable_object(value) for value in obj]
+    elif obj is None or isinstance(obj, (str, bool, int, float)):
+        return obj
+    else:
+        raise ValueError("Unsupported value type \"" + type(obj).__name__ + "\"")
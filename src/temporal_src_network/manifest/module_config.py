@@ -1,5 +1,5 @@
-import collections
 import os
+import sys
 
 from . import version_config
 
@@ -14,11 +14,13 @@ LOG_TAG = "module_config"
 class ModuleConfig:
     "Module config."
 
+    __slots__ = ("module_config_dict", "module_name", "module_root_sub_dir", "module_root_dir", "remove_module_root_dir_for_commands", "src_checkout_dict", "symlinks_dict", "single_version", "versions_dict", "version_configs")
+
     def __init__(self, module_config_dict, *, _not_called_from_create=True):
         if _not_called_from_create:
             raise RuntimeError("Object must be created with ModuleConfig.create()")
 
-        self.module_config_dict = module_config_dict if module_config_dict else collections.OrderedDict()
+        self.module_config_dict = module_config_dict if module_config_dict else data_utils.EMPTY_DICT_VIEW
 
         self.module_name = None
 
@@ -27,24 +29,24 @@ class ModuleConfig:
 
         self.remove_module_root_dir_for_commands = set()
 
-        self.src_checkout_dict = collections.OrderedDict()
+        self.src_checkout_dict = data_utils.EMPTY_DICT_VIEW
 
-        self.symlinks_dict = collections.OrderedDict()
+        self.symlinks_dict = data_utils.EMPTY_DICT_VIEW
 
         self.single_version = True
-        self.versions_dict = collections.OrderedDict()
+        self.versions_dict = data_utils.EMPTY_DICT_VIEW
 
         self.version_configs = []
 
     @classmethod
-    def create(cls, project_config, module_name, module_config_dict, existing_module_configs):
+    def create(cls, project_config, module_name, module_config_dict):
         module_config = cls(module_config_dict, _not_called_from_create=False)
 
         if not module_name:
             logger.error(LOG_TAG, "The module_name \"" + module_name + "\"  must be set")
             return (1, None)
 
-        module_config.module_name = module_name
+        module_config.module_name = sys.intern(module_name)
 
 
 
@@ -79,7 +81,7 @@ class ModuleConfig:
         # the project_root_dir so that important directories outside it
         # are not accidentally deleted, especially if project_root_dir
         # is set to the filesystem_root `/`.
-        if not file_utils.is_path_in_dir_path(module_config.module_root_dir, project_config.project_root_dir, True):
+        if not project_config.paths_index.is_path_in_project_root_dir(module_config.module_root_dir, True):
             logger.error(LOG_TAG, "The module \"" + module_name + "\"" +
                          " root_dir \"" + module_config.module_root_dir + "\"" +
                          " must be under project_root_dir \"" + project_config.project_root_dir + "\"")
@@ -94,14 +96,14 @@ class ModuleConfig:
 
 
 
-        module_config.src_checkout_dict = data_utils.get_ordered_dict_from_dict(
+        module_config.src_checkout_dict = data_utils.get_dict_view_from_dict(
             module_config_dict, "version_src_checkout", module_config.src_checkout_dict)
-        module_config.symlinks_dict = data_utils.get_ordered_dict_from_dict(
+        module_config.symlinks_dict = data_utils.get_dict_view_from_dict(
             module_config_dict, "version_symlinks", module_config.symlinks_dict)
 
 
 
-        module_config.versions_dict = data_utils.get_ordered_dict_from_dict(
+        module_config.versions_dict = data_utils.get_dict_view_from_dict(
             module_config_dict, "versions", module_config.versions_dict)
         if not module_config.versions_dict:
             logger.error(LOG_TAG, "The 'module.versions' value not set or not a dict for module \"" + module_config.module_name + "\"")
@@ -114,30 +116,34 @@ class ModuleConfig:
 
 
 
-        for existing_module_config in existing_module_configs:
-            # If module root_dir is the same or under another module's root_dir and either of them have single_version disabled
-            # If `git` checkout is to be used, then two module versions shouldn't be allowed to shared directories either,
-            # unless one uses `git` checkout and another a different compatible checkout like extracting a `zip` file.
-            # These checks wouldn't work if bind mounts are used to point different paths to the same directory.
-            if not module_config.single_version or not existing_module_config.single_version:
-                if file_utils.is_path_in_dir_path(module_config.module_root_dir, existing_module_config.module_root_dir, False):
-                    logger.error(LOG_TAG, "The module \"" + module_config.module_name + "\"" +
-                                 " root_dir \"" + module_config.module_root_dir + "\"" +
-                                 " is the same or under root_dir of another module \"" + existing_module_config.module_name + "\"." +
-                                 " with root_dir \"" + existing_module_config.module_root_dir + "\"" +
-                                 " Sharing same module root_dir is not allowed if either module has single_version disabled")
-                    return (1, None)
-                elif file_utils.is_path_in_dir_path(existing_module_config.module_root_dir, module_config.module_root_dir, False):
-                    logger.error(LOG_TAG, "The module \"" + existing_module_config.module_name + "\"" +
-                                 " root_dir \"" + existing_module_config.module_root_dir + "\"" +
-                                 " is the same or under root_dir of current module \"" + module_config.module_name + "\"." +
-                                 " with root_dir \"" + module_config.module_root_dir + "\"" +
-                                 " Sharing same module root_dir is not allowed if either module has single_version disabled")
-                    return (1, None)
+        # If module root_dir is the same or under another module's root_dir and either of them have single_version disabled
+        # If `git` checkout is to be used, then two module versions shouldn't be allowed to shared directories either,
+        # unless one uses `git` checkout and another a different compatible checkout like extracting a `zip` file.
+        # These checks wouldn't work if bind mounts are used to point different paths to the same directory.
+        # All the conflicting modules are reported before failing.
+        module_root_conflicts = project_config.paths_index.get_module_root_conflicts(module_config)
+        for existing_module_config, is_under_existing_module in module_root_conflicts:
+            if is_under_existing_module:
+                logger.error(LOG_TAG, "The module \"" + module_config.module_name + "\"" +
+                             " root_dir \"" + module_config.module_root_dir + "\"" +
+                             " is the same or under root_dir of another module \"" + existing_module_config.module_name + "\"." +
+                             " with root_dir \"" + existing_module_config.module_root_dir + "\"" +
+                             " Sharing same module root_dir is not allowed if either module has single_version disabled")
+            else:
+                logger.error(LOG_TAG, "The module \"" + existing_module_config.module_name + "\"" +
+                             " root_dir \"" + existing_module_config.module_root_dir + "\"" +
+                             " is the same or under root_dir of current module \"" + module_config.module_name + "\"." +
+                             " with root_dir \"" + module_config.module_root_dir + "\"" +
+                             " Sharing same module root_dir is not allowed if either module has single_version disabled")
+        if module_root_conflicts:
+            return (1, None)
+
+        project_config.paths_index.add_module_root(module_config)
 
 
 
-        logger.vverbose(LOG_TAG, "module_config:\n" + module_config.to_string() + "\n")
+        if logger.is_log_level_enabled(logger.LOG_LEVEL_VVERBOSE):
+            logger.vverbose(LOG_TAG, "module_config:\n" + module_config.to_string() + "\n")
 
 
 
@@ -152,6 +158,11 @@ class ModuleConfig:
 
         module_config.version_configs = version_configs
 
+        # Release the raw module and versions dicts since they are not
+        # needed anymore after all the version_configs have been created.
+        module_config.module_config_dict = data_utils.EMPTY_DICT_VIEW
+        module_config.versions_dict = data_utils.EMPTY_DICT_VIEW
+
 
 
         return (0, module_config)
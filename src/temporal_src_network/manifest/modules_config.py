@@ -1,5 +1,3 @@
-import collections
-
 from ..data import data_utils
 from ..logger.logger_core import logger
 
@@ -8,21 +6,23 @@ LOG_TAG = "modules_config"
 class ModulesConfig:
     "Modules config."
 
+    __slots__ = ("src_checkout_dict", "module_list")
+
     def __init__(self, *, _not_called_from_create=True):
         if _not_called_from_create:
             raise RuntimeError("Object must be created with ModulesConfig.create()")
 
-        self.src_checkout_dict = collections.OrderedDict()
-        self.module_list = collections.OrderedDict()
+        self.src_checkout_dict = data_utils.EMPTY_DICT_VIEW
+        self.module_list = data_utils.EMPTY_DICT_VIEW
 
     @classmethod
     def create(cls, modules_dict):
         modules_config = cls(_not_called_from_create=False)
 
-        modules_config.src_checkout_dict = data_utils.get_ordered_dict_from_dict(
+        modules_config.src_checkout_dict = data_utils.get_dict_view_from_dict(
             modules_dict, "version_src_checkout", modules_config.src_checkout_dict)
 
-        modules_config.module_list = data_utils.get_ordered_dict_from_dict(modules_dict, "list", None)
+        modules_config.module_list = data_utils.get_dict_view_from_dict(modules_dict, "list", None)
         if not modules_config.module_list:
             logger.error(LOG_TAG, "The 'project.modules.list' value is not set or not a dict")
             return (1, None)
@@ -1,4 +1,3 @@
-import collections
 import os
 
 from ..data import data_utils
@@ -6,12 +5,15 @@ from ..data.data_utils import log_value
 from ..file import file_utils
 from ..logger.logger_core import logger
 from ..shell import shell_utils
+from .project_paths_index import ProjectPathsIndex
 
 LOG_TAG = "project_config"
 
 class ProjectConfig:
     "Project config."
 
+    __slots__ = ("manifest_label", "project_root_dir", "remove_project_root_dir_for_commands", "paths_index", "state_index", "src_checkout_dict", "symlinks_dict", "modules_dict")
+
     def __init__(self, manifest_label, *, _not_called_from_create=True):
         if _not_called_from_create:
             raise RuntimeError("Object must be created with ProjectConfig.create()")
@@ -21,10 +23,13 @@ class ProjectConfig:
         self.project_root_dir = str("")
         self.remove_project_root_dir_for_commands = set()
 
-        self.src_checkout_dict = collections.OrderedDict()
-        self.symlinks_dict = collections.OrderedDict()
+        self.paths_index = None
+        self.state_index = None
+
+        self.src_checkout_dict = data_utils.EMPTY_DICT_VIEW
+        self.symlinks_dict = data_utils.EMPTY_DICT_VIEW
 
-        self.modules_dict = collections.OrderedDict()
+        self.modules_dict = data_utils.EMPTY_DICT_VIEW
 
     @classmethod
     def create(cls, project_config_dict, manifest_label):
@@ -45,7 +50,7 @@ class ProjectConfig:
                 logger.error(LOG_TAG, error)
                 return (1, None)
 
-            project_root_dir = os.path.realpath(project_root_dir)
+            project_root_dir = file_utils.get_canonical_path(project_root_dir)
         # If project_root_dir key is not set
         elif original_project_root_dir is None:
             if os.environ.get("GITHUB_ACTIONS") == "true":
@@ -55,7 +60,7 @@ class ProjectConfig:
                     return (1, None)
             else:
                 # Default to current working directory
-                project_root_dir = os.path.realpath(".")
+                project_root_dir = file_utils.get_canonical_path(os.getcwd())
         else:
             logger.error(LOG_TAG, "The project_root_dir must be set." +
                 " original_project_root_dir: \"" + str(original_project_root_dir) + "\"")
@@ -67,6 +72,7 @@ class ProjectConfig:
             return (1, None)
 
         project_config.project_root_dir = project_root_dir
+        project_config.paths_index = ProjectPathsIndex(project_root_dir)
 
 
 
@@ -87,18 +93,19 @@ class ProjectConfig:
 
 
 
-        project_config.src_checkout_dict = data_utils.get_ordered_dict_from_dict(
+        project_config.src_checkout_dict = data_utils.get_dict_view_from_dict(
             project_config_dict, "project_src_checkout", project_config.src_checkout_dict)
 
-        project_config.symlinks_dict = data_utils.get_ordered_dict_from_dict(
+        project_config.symlinks_dict = data_utils.get_dict_view_from_dict(
             project_config_dict, "project_symlinks", project_config.symlinks_dict)
 
-        project_config.modules_dict = data_utils.get_ordered_dict_from_dict(
+        project_config.modules_dict = data_utils.get_dict_view_from_dict(
             project_config_dict, "modules", project_config.modules_dict)
 
 
 
-        logger.vverbose(LOG_TAG, "project_config:\n" + project_config.to_string() + "\n")
+        if logger.is_log_level_enabled(logger.LOG_LEVEL_VVERBOSE):
+            logger.vverbose(LOG_TAG, "project_config:\n" + project_config.to_string() + "\n")
 
         return (0, project_config)
 
@@ -0,0 +1,72 @@
+from ..file import file_utils
+from ..file.path_trie import PathTrie
+
+class ProjectPathsIndex:
+    """
+    Index of the canonical module root paths of a project.
+
+    The canonical path of each module and version root is resolved with
+    {@link file_utils#get_canonical_path()} so that they are only resolved
+    once until files are created or deleted, and the module roots are
+    added to a `PathTrie` so that the
+    modules whose root paths overlap with another module can be found in
+    `O(depth)` of the path instead of comparing each module against all
+    the existing modules.
+    """
+
+    __slots__ = ("project_root_dir", "module_roots_trie")
+
+    def __init__(self, project_root_dir):
+        self.project_root_dir = project_root_dir
+        self.module_roots_trie = PathTrie()
+
+    @staticmethod
+    def get_canonical_path(path):
+        "Get the canonical path for `path` with {@link file_utils#get_canonical_path()}."
+
+        return file_utils.get_canonical_path(path)
+
+    def is_path_in_dir_path(self, path, dir_path, ensure_under):
+        """
+        Wrapper for {@link file_utils#is_path_in_dir_path()} that uses
+        the canonical paths of `path` and `dir_path`.
+        """
+
+        return file_utils.is_path_in_dir_path(self.get_canonical_path(path), self.get_canonical_path(dir_path),
+                                              ensure_under, canonicalize_path=False, canonicalize_dir_path=False)
+
+    def is_path_in_project_root_dir(self, path, ensure_under):
+        "Check if `path` is in the project root_dir."
+
+        return file_utils.is_path_in_dir_path(self.get_canonical_path(path), self.get_canonical_path(self.project_root_dir),
+                                              ensure_under, canonicalize_path=False, canonicalize_dir_path=False)
+
+
+
+    def add_module_root(self, module_config):
+        "Add the module root_dir of `module_config`."
+
+        self.module_roots_trie.add(self.get_canonical_path(module_config.module_root_dir), module_config)
+
+    def get_module_root_conflicts(self, module_config):
+        """
+        Get the modules already added whose root_dir is the same as,
+        contains or is under the root_dir of `module_config`, and either
+        of them have single_version disabled.
+
+        @return Returns the `list` of `(module_config, is_under_existing_module)`
+        tuples for the conflicting modules.
+        """
+
+        module_root_dir = self.get_canonical_path(module_config.module_root_dir)
+
+        conflicts = []
+        for existing_module_config in self.module_roots_trie.get_values_at_or_above(module_root_dir):
+            if not module_config.single_version or not existing_module_config.single_version:
+                conflicts.append((existing_module_config, True))
+
+        for existing_module_config in self.module_roots_trie.get_values_under(module_root_dir):
+            if not module_config.single_version or not existing_module_config.single_version:
+                conflicts.append((existing_module_config, False))
+
+        return conflicts
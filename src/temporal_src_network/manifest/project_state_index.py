@@ -0,0 +1,310 @@
+import json
+import os
+
+from ..file import file_utils
+from ..logger.logger_core import logger
+
+LOG_TAG = "project_state_index"
+
+class ProjectStateIndex:
+    """
+    Index of the state of the artifacts applied for a project by the
+    `setup` command, that is persisted in a state file under the
+    `project_root_dir`.
+
+    The index records the root directory and checkout state of each
+    version that was checked out, like its `src_url`, resolved commit
+    and sparse checkout patterns, and the exact `[dest, target]` of the
+    symlinks that were created for the project and each version, so
+    that the `remove` command and later `setup` commands can find the
+    artifacts directly, even if the manifest changed since the `setup`.
+
+    A snapshot of the `stat` data of the key paths of each checkout,
+    like its root directory and git `HEAD` files, is also recorded, so
+    that the `status` command can detect that a checkout changed without
+    reading it if the `stat` data did not change.
+
+    The state file is written to a temp file first and then atomically
+    renamed, so that a partially written state file is never read.
+    """
+
+    __slots__ = ("state_file_path", "project_state", "modules_state", "modified")
+
+    STATE_FILE_NAME = ".temporal-src-network-state.json"
+    "The name of the state file under the `project_root_dir`."
+
+    FORMAT_VERSION = 1
+    """
+    The version of the format of the state file. The state file is
+    ignored if its version is different.
+    """
+
+    def __init__(self, state_file_path, *, _not_called_from_create=True):
+        if _not_called_from_create:
+            raise RuntimeError("Object must be created with ProjectStateIndex.load()")
+
+        self.state_file_path = state_file_path
+        self.project_state = None
+        self.modules_state = {}
+        self.modified = False
+
+    @classmethod
+    def load(cls, project_root_dir):
+        """
+        Load the state index of the project at `project_root_dir`. If the
+        state file does not exist or is invalid, then an empty index is
+        returned.
+
+        @returns (return_value, project_state_index)
+        """
+
+        state_index = cls(os.path.join(project_root_dir, cls.STATE_FILE_NAME), _not_called_from_create=False)
+
+        try:
+            with open(state_index.state_file_path, "r", encoding="utf-8") as state_file:
+                state = json.load(state_file)
+        except FileNotFoundError:
+            logger.vverbose(LOG_TAG, "Project state file not found at \"" + state_index.state_file_path + "\"")
+            return (0, state_index)
+        except Exception as err: # pylint: disable=broad-except
+            logger.warn(LOG_TAG, "Ignoring project state file at \"" + state_index.state_file_path + "\"" +
+                        " that failed to be read with err:\n" + str(err))
+            return (0, state_index)
+
+        if not isinstance(state, dict) or state.get("format_version") != cls.FORMAT_VERSION or \
+                not isinstance(state.get("modules"), dict):
+            logger.warn(LOG_TAG, "Ignoring invalid project state file at \"" + state_index.state_file_path + "\"")
+            return (0, state_index)
+
+        project_state = state.get("project")
+        state_index.project_state = project_state if isinstance(project_state, dict) else None
+        state_index.modules_state = state["modules"]
+
+        logger.debug(LOG_TAG, "Loaded project state file with " + str(len(state_index.get_version_states())) +
+                     " version(s) from \"" + state_index.state_file_path + "\"")
+
+        return (0, state_index)
+
+
+
+    def get_project_state(self):
+        "Get the state `dict` of the project, otherwise `None`."
+
+        return self.project_state
+
+    def set_project_state(self, checkout_state, symlinks, stat_snapshot=None):
+        """
+        Set the state of the project.
+
+        @param checkout_state The checkout state `dict` returned by
+                              `SrcProvider.get_checkout_state()`. If `None`,
+                              then the existing checkout state and
+                              stat_snapshot are kept.
+        @param symlinks The `list` of `[dest, target]` of the symlinks created.
+        @param stat_snapshot The stat snapshot `dict` returned by
+                             `get_stat_snapshot()` for the checkout.
+        """
+
+        if checkout_state is None and self.project_state:
+            checkout_state = self.project_state.get("checkout")
+            stat_snapshot = self.project_state.get("stat_snapshot")
+
+        self.project_state = {"checkout": checkout_state, "stat_snapshot": stat_snapshot, "symlinks": symlinks}
+        self.modified = True
+
+    def remove_project_state(self):
+        "Remove the state of the project."
+
+        if self.project_state is not None:
+            self.project_state = None
+            self.modified = True
+
+    def get_module_state(self, module_name):
+        "Get the state `dict` of the module with `module_name`, otherwise `None`."
+
+        module_state = self.modules_state.get(module_name)
+        return module_state if isinstance(module_state, dict) else None
+
+    def get_version_state(self, module_name, version_name):
+        "Get the state `dict` of the version of the module, otherwise `None`."
+
+        module_state = self.get_module_state(module_name)
+        if not module_state or not isinstance(module_state.get("versions"), dict):
+            return None
+
+        version_state = module_state["versions"].get(version_name)
+        return version_state if isinstance(version_state, dict) else None
+
+    def get_version_states(self):
+        "Get the `list` of `(module_name, version_name, version_state)` of all the versions."
+
+        version_states = []
+        for module_name in list(self.modules_state):
+            module_state = self.get_module_state(module_name)
+            if not module_state or not isinstance(module_state.get("versions"), dict):
+                continue
+            for version_name in list(module_state["versions"]):
+                version_state = self.get_version_state(module_name, version_name)
+                if version_state is not None:
+                    version_states.append((module_name, version_name, version_state))
+
+        return version_states
+
+    def set_version_state(self, module_config, version_config, checkout_state, symlinks, stat_snapshot=None):
+        """
+        Set the state of the version of `version_config`.
+
+        @param checkout_state The checkout state `dict` returned by
+                              `SrcProvider.get_checkout_state()`. If `None`,
+                              then the existing checkout state and
+                              stat_snapshot are kept.
+        @param symlinks The `list` of `[dest, target]` of the symlinks created.
+        @param stat_snapshot The stat snapshot `dict` returned by
+                             `get_stat_snapshot()` for the checkout.
+        """
+
+        module_state = self.get_module_state(module_config.module_name)
+        if module_state is None or not isinstance(module_state.get("versions"), dict):
+            module_state = {"versions": {}}
+            self.modules_state[module_config.module_name] = module_state
+
+        module_state["module_root_dir"] = module_config.module_root_dir
+        module_state["remove_module_root_dir_for_commands"] = sorted(module_config.remove_module_root_dir_for_commands)
+
+        if checkout_state is None:
+            version_state = self.get_version_state(module_config.module_name, version_config.version_name)
+            checkout_state = version_state.get("checkout") if version_state else None
+            stat_snapshot = version_state.get("stat_snapshot") if version_state else None
+
+        module_state["versions"][version_config.version_name] = {
+            "version_root_dir": version_config.version_root_dir,
+            "remove_version_root_dir_for_commands": sorted(version_config.remove_version_root_dir_for_commands),
+            "checkout": checkout_state,
+            "stat_snapshot": stat_snapshot,
+            "symlinks": symlinks
+        }
+        self.modified = True
+
+    def remove_version_state(self, module_name, version_name):
+        "Remove the state of the version of the module."
+
+        module_state = self.get_module_state(module_name)
+        if module_state and isinstance(module_state.get("versions"), dict) and \
+                module_state["versions"].pop(version_name, None) is not None:
+            self.modified = True
+
+    def remove_module_state(self, module_name):
+        "Remove the state of the module and all its versions."
+
+        if self.modules_state.pop(module_name, None) is not None:
+            self.modified = True
+
+
+
+    @staticmethod
+    def get_symlinks(state):
+        """
+        Get the `list` of valid `[dest, target]` of the symlinks recorded
+        in the state `dict` of the project or a version.
+        """
+
+        symlinks = state.get("symlinks") if state else None
+        if not isinstance(symlinks, list):
+            return []
+
+        return [symlink for symlink in symlinks if isinstance(symlink, list) and len(symlink) == 2 and
+                isinstance(symlink[0], str) and isinstance(symlink[1], str)]
+
+
+
+    @staticmethod
+    def get_stat_snapshot(paths):
+        """
+        Get the snapshot of the `stat` data of `paths`, without following
+        symlinks. The paths that do not exist are recorded as `None`, so
+        that their creation is detected too.
+
+        @returns Returns the `dict` of path to `[st_ino, st_size, st_mtime_ns]`.
+        """
+
+        stat_snapshot = {}
+        for path in paths:
+            try:
+                path_stat = os.lstat(path)
+                stat_snapshot[path] = [path_stat.st_ino, path_stat.st_size, path_stat.st_mtime_ns]
+            except OSError:
+                stat_snapshot[path] = None
+
+        return stat_snapshot
+
+    @staticmethod
+    def get_changed_stat_paths(stat_snapshot):
+        """
+        Get the paths in the `stat_snapshot` whose current `stat` data is
+        different from the snapshot.
+
+        @returns Returns the `list` of changed paths. If the `stat_snapshot`
+        is not valid, then `None` is returned.
+        """
+
+        if not isinstance(stat_snapshot, dict) or not stat_snapshot:
+            return None
+
+        current_stat_snapshot = ProjectStateIndex.get_stat_snapshot(list(stat_snapshot))
+        return [path for path in stat_snapshot if current_stat_snapshot[path] != stat_snapshot[path]]
+
+
+
+    def clear(self):
+        "Remove the state of the project and all modules, like if the project_root_dir was deleted."
+
+        if self.project_state is not None or self.modules_state:
+            self.project_state = None
+            self.modules_state = {}
+            self.modified = True
+
+
+
+    def write(self):
+        """
+        Write the state index to the state file if it was modified. If the
+        index is empty, then the state file is deleted instead. Nothing is
+        written if the `project_root_dir` does not exist anymore, like if
+        it was removed.
+
+        @returns Returns the error if writing failed, otherwise `None`.
+        """
+
+        if not self.modified:
+            return None
+
+        project_root_dir = os.path.dirname(self.state_file_path)
+        if not os.path.isdir(project_root_dir):
+            return None
+
+        if self.project_state is None and not self.modules_state:
+            try:
+                os.remove(self.state_file_path)
+                logger.vverbose(LOG_TAG, "Deleted empty project state file at \"" + self.state_file_path + "\"")
+            except FileNotFoundError:
+                pass
+            except OSError as err:
+                return "Deleting project state file at \"" + self.state_file_path + "\" failed with err:\n" + str(err)
+            self.modified = False
+            return None
+
+        state = {
+            "format_version": ProjectStateIndex.FORMAT_VERSION,
+            "project": self.project_state,
+            "modules": self.modules_state
+        }
+
+        error = file_utils.write_file_atomically("project state", self.state_file_path,
+                                                 lambda state_file: json.dump(state, state_file, separators=(",", ":")))
+        if error is not None:
+            return error
+
+        logger.vverbose(LOG_TAG, "Wrote project state file at \"" + self.state_file_path + "\"")
+
+        self.modified = False
+        return None
@@ -1,6 +1,6 @@
-import collections
 import os
 import re
+import sys
 
 from ..data import data_utils
 from ..data.data_utils import log_value
@@ -12,6 +12,8 @@ LOG_TAG = "version_config"
 class VersionConfig:
     "Module version config."
 
+    __slots__ = ("module_config", "version_name", "version_root_sub_dir", "version_root_dir", "remove_version_root_dir_for_commands", "src_checkout_dict", "symlinks_dict")
+
     def __init__(self, module_config, *, _not_called_from_create=True):
         if _not_called_from_create:
             raise RuntimeError("Object must be created with VersionConfig.create()")
@@ -25,8 +27,8 @@ class VersionConfig:
 
         self.remove_version_root_dir_for_commands = set()
 
-        self.src_checkout_dict = collections.OrderedDict()
-        self.symlinks_dict = collections.OrderedDict()
+        self.src_checkout_dict = data_utils.EMPTY_DICT_VIEW
+        self.symlinks_dict = data_utils.EMPTY_DICT_VIEW
 
     @classmethod
     def create(cls, project_config, module_config, version_name, version_config_dict):
@@ -40,7 +42,7 @@ class VersionConfig:
                          " or null bytes or equal '.' or '..'")
             return (1, None)
 
-        version_config.version_name = version_name
+        version_config.version_name = sys.intern(version_name)
 
 
 
@@ -49,16 +51,13 @@ class VersionConfig:
 
 
 
-        version_config.src_checkout_dict = data_utils.get_ordered_dict_from_dict(
-            version_config_dict, "version_src_checkout", version_config.src_checkout_dict)
-
         # The src_checkout dict may not be set if user wants default branch
         # to be used and hasn't set src_checkout.ref
-        if not version_config.src_checkout_dict:
-            version_config.src_checkout_dict = collections.OrderedDict()
+        version_config.src_checkout_dict = data_utils.get_dict_view_from_dict(
+            version_config_dict, "version_src_checkout", version_config.src_checkout_dict)
 
 
-        version_config.symlinks_dict = data_utils.get_ordered_dict_from_dict(
+        version_config.symlinks_dict = data_utils.get_dict_view_from_dict(
             version_config_dict, "version_symlinks", version_config.symlinks_dict)
 
         module_root_dir = module_config.module_root_dir
@@ -90,7 +89,7 @@ class VersionConfig:
         # module_root_dir so that important directories outside them
         # are not accidentally deleted, especially if project_root_dir
         # is set to the filesystem_root `/`.
-        if not file_utils.is_path_in_dir_path(version_config.version_root_dir, required_parent_dir_path, True):
+        if not project_config.paths_index.is_path_in_dir_path(version_config.version_root_dir, required_parent_dir_path, True):
             logger.error(LOG_TAG, "The module \"" + module_config.module_name + "\"" +
                          " version \"" + version_name + "\" root_dir" +
                          " \"" + version_config.version_root_dir + "\" must be" +
@@ -100,8 +99,9 @@ class VersionConfig:
 
 
 
-        logger.vverbose(LOG_TAG, "The module \"" + module_config.module_name + "\"" +
-            " version_config:\n" + version_config.to_string() + "\n")
+        if logger.is_log_level_enabled(logger.LOG_LEVEL_VVERBOSE):
+            logger.vverbose(LOG_TAG, "The module \"" + module_config.module_name + "\"" +
+                " version_config:\n" + version_config.to_string() + "\n")
 
         return (0, version_config)
 
@@ -121,7 +121,7 @@ class VersionConfig:
 def create_module_version_configs(project_config, module_config):
     versions_dict = module_config.versions_dict
 
-    versions_list = data_utils.get_ordered_dict_from_dict(versions_dict, "list", None)
+    versions_list = data_utils.get_dict_view_from_dict(versions_dict, "list", None)
     if not versions_list:
         logger.error(LOG_TAG, "The 'versions.list' value not set or not a dict for module \"" + module_config.module_name + "\"")
         return (1, None)
@@ -1,9 +1,12 @@
 # pyright: reportInvalidStringEscapeSequence=false
 
 import os
+import re
 import subprocess
+import time
 
 from ..logger.logger_core import logger
+from ..timing.subprocess_stats import SubprocessStats, subprocess_stats
 
 LOG_TAG = "shell_utils"
 
@@ -24,17 +27,30 @@ def run_shell_command(log_tag, command_array, capture, stdout=None, stderr=None,
             if not stderr:
                 stderr = subprocess.PIPE
 
-            process = subprocess.Popen(
+            record_stats = subprocess_stats.enabled
+            popen_class = RusagePopen if record_stats and hasattr(os, "wait4") else subprocess.Popen
+            start_time = time.perf_counter()
+            process = popen_class(
                 command_array, cwd=cwd, env=env, stdout=stdout, stderr=stderr, universal_newlines=True
             )
             stdout, stderr = process.communicate(timeout=timeout)
             return_value = process.returncode
+            wall_time = time.perf_counter() - start_time
+            if record_stats:
+                subprocess_stats.record(command_array, wall_time, getattr(process, "rusage", None), return_value)
+            if logger.is_log_level_enabled(logger.LOG_LEVEL_VERBOSE):
+                duration_ms = round(wall_time * 1000, 3)
+                logger.verbose(log_tag, "The \"" + SubprocessStats.get_argv_class(command_array) + "\" command" +
+                               " exited with exit code " + str(return_value) + " in " + str(duration_ms) + "ms",
+                               extra={"exit_code": return_value, "duration_ms": duration_ms})
             return (return_value, stdout, stderr)
         else:
             raise NotImplementedError("capture=False not supported")
 
 
     except subprocess.TimeoutExpired as err:
+        if record_stats:
+            subprocess_stats.record(command_array, time.perf_counter() - start_time, None, None)
         logger.error(log_tag, "The " + str(command_array or [""]) + " shell command failed to complete even after " +
             str(timeout or "") + "s")
         return (1, err.stdout, err.stderr)
@@ -46,55 +62,108 @@ def run_shell_command(log_tag, command_array, capture, stdout=None, stderr=None,
             close(stdout)
             close(stderr)
 
-def close(obj):
-    if obj and not isinstance(obj, int) and hasattr(obj, 'close') and callable(obj.close):
-        obj.close()
-
-class EnvironProxy:
-    "Get str key value from dict_obj if it exists, otherwise default."
-
-    __slots__ = ('_original_environ',)
+class RusagePopen(subprocess.Popen):
+    """
+    A `subprocess.Popen` that waits for the process with `os.wait4()`
+    instead of `os.waitpid()`, so that the resource usage of the process
+    and its waited for children is stored in `rusage`.
+    """
 
-    def __init__(self):
-        self._original_environ = os.environ
+    def __init__(self, *args, **kwargs):
+        self.rusage = None
+        super().__init__(*args, **kwargs)
 
-    def __enter__(self):
-        self._original_environ = os.environ
-        os.environ = self
-        return self
+    def _try_wait(self, wait_flags):
+        try:
+            (pid, sts, rusage) = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            # The process was already reaped, like if SIGCHLD is ignored
+            return (self.pid, 0)
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        os.environ = self._original_environ
+        if pid == self.pid:
+            self.rusage = rusage
+        return (pid, sts)
 
-    def __getitem__(self, item):
-        try:
-            return self._original_environ[item]
-        except KeyError:
-            return ''
+def close(obj):
+    if obj and not isinstance(obj, int) and hasattr(obj, 'close') and callable(obj.close):
+        obj.close()
 
-def expand_env_vars(path):
+class Expander:
     # pylint: disable=anomalous-backslash-in-string
     """
-    Expand environmental variables in path like bash does.
+    Expander for environmental variable references and `@KEY@`
+    placeholders in strings.
+
+    All the references in a string are expanded in a single pass of one
+    compiled regex, so the substituted values are never expanded again,
+    and the environment is only read and never modified, so that the
+    expander can be used by multiple threads.
 
     - Substrings of the form `$NAME` or `${NAME}` are replaced by the value
-      of the environmental variable name.
+      of the environmental variable name, if `expand_env` is `True`.
     - Substrings of the form `\$NAME` that have escaped `$` character
-      are replaced with the literal value `$NAME` without expansion.
+      are replaced with the literal value `$NAME` without expansion, if
+      `expand_env` is `True`.
     - References to non-existing environmental variables are replaced
       with an empty string.
+    - Substrings of the form `@KEY@` are replaced by the value of the
+      `KEY` in `placeholders`, and other substrings between `@` are
+      left as is.
 
-    Credit: https://stackoverflow.com/a/46879930
+    The expanded strings are cached for the lifetime of the expander,
+    since the environment is not modified during a run.
     """
 
-    if not path:
-        return path
+    __slots__ = ("expand_env", "placeholders", "regex", "cache")
 
-    replacer = '\0'  # NUL shouldn't be in a file path anyways.
-    while replacer in path:
-        replacer *= 2
+    # The `\w` only matches ascii characters like for `os.path.expandvars()`
+    # and bash, with a scoped flag so that placeholder keys are not affected.
+    ENV_VAR_REGEX = r'(?a:\\\$|\$(?:(?P<name>\w+)|\{(?P<braced_name>[^}]*)\}))'
 
-    path = path.replace('\\$', replacer)
+    def __init__(self, expand_env, placeholders=None):
+        self.expand_env = expand_env
+        self.placeholders = placeholders if placeholders else {}
+        self.cache = {}
+
+        patterns = []
+        if expand_env:
+            patterns.append(Expander.ENV_VAR_REGEX)
+        if self.placeholders:
+            patterns.append("@(?P<key>" + "|".join([re.escape(key) for key in self.placeholders]) + ")@")
+
+        self.regex = re.compile("|".join(patterns)) if patterns else None
+
+    def expand(self, string):
+        "Expand the references in `string`."
+
+        if not string or self.regex is None:
+            return string
+
+        expanded = self.cache.get(string)
+        if expanded is None:
+            expanded = self.regex.sub(self.get_replacement, string)
+            self.cache[string] = expanded
+
+        return expanded
+
+    def get_replacement(self, match):
+        group = match.lastgroup
+        if group == "key":
+            return self.placeholders[match.group(group)]
+        elif group is not None:
+            return os.environ.get(match.group(group), "")
+        else:
+            # Escaped `\$`
+            return "$"
+
+ENV_VARS_EXPANDER = Expander(True)
+"The `Expander` for environmental variables used by {@link #expand_env_vars()}."
+
+def expand_env_vars(path):
+    """
+    Expand environmental variables in path like bash does.
+
+    See {@link Expander} for the supported references.
+    """
 
-    with EnvironProxy():
-        return os.path.expandvars(path).replace(replacer, '$')
+    return ENV_VARS_EXPANDER.expand(path)
@@ -5,6 +5,8 @@ from ..data.data_utils import log_value
 class CheckoutConfig(metaclass=abc.ABCMeta):
     "Config for checking out a source."
 
+    __slots__ = ("checkout_type",)
+
     def __init__(self, checkout_type):
         self.checkout_type = checkout_type
 
@@ -0,0 +1,209 @@
+import types
+
+from ..data import data_utils
+from ..data.data_utils import log_value
+from ..data.data_utils import log_private_value
+from ..logger.logger_core import logger
+
+LOG_TAG = "effective_src_checkout_config"
+
+class EffectiveSrcCheckoutConfig:
+    """
+    Effective src_checkout config of the project or a version.
+
+    The `project_src_checkout` dict of the project, or the
+    `version_src_checkout` dicts of the `modules`, `module` and
+    `version` layers of a version, are resolved once into a flat and
+    immutable dict of values, and the layer that each value came from
+    is recorded.
+    """
+
+    __slots__ = ("label", "values", "value_layers")
+
+    LAYER_PROJECT = "project"
+    LAYER_MODULES = "modules"
+    LAYER_MODULE = "module"
+    LAYER_VERSION = "version"
+
+    ALL_LAYERS_KEYS = frozenset(["git_auth_token", "git_auth_token_var"])
+    "The keys that are resolved from all layers, including the `modules` layer."
+
+    VERSION_LAYER_KEYS = frozenset(["ref", "sparse_checkout", "sparse_checkout_level_mode"])
+    """
+    The keys that are only resolved from the `version` layer for versions.
+    The `sparse_checkout` of the `module` layer is resolved separately as per
+    the `sparse_checkout_level_mode`.
+    """
+
+    def __init__(self, label, values, value_layers, *, _not_called_from_create=True):
+        if _not_called_from_create:
+            raise RuntimeError("Object must be created with EffectiveSrcCheckoutConfig.create_*()")
+
+        self.label = label
+        self.values = types.MappingProxyType(values)
+        self.value_layers = types.MappingProxyType(value_layers)
+
+    @classmethod
+    def create_for_project(cls, project_config):
+        return cls.create("project", [(cls.LAYER_PROJECT, project_config.src_checkout_dict)])
+
+    @classmethod
+    def create_for_version(cls, modules_config, version_config):
+        module_config = version_config.module_config
+
+        label = "module \"" + module_config.module_name + "\"" + \
+                " version \"" + version_config.version_name + "\""
+
+        return cls.create(label, [(cls.LAYER_VERSION, version_config.src_checkout_dict),
+                                  (cls.LAYER_MODULE, module_config.src_checkout_dict),
+                                  (cls.LAYER_MODULES, modules_config.src_checkout_dict)])
+
+    @classmethod
+    def create(cls, label, layers):
+        """
+        Create the effective src_checkout config from `layers`.
+
+        @param label The label for the project or version.
+        @param layers The `list` of `(layer_name, src_checkout_dict)` tuples
+                      in order of highest priority first.
+        @returns (return_value, effective_src_checkout_config)
+        """
+
+        values = {}
+        value_layers = {}
+
+        for layer_name, layer_dict in layers:
+            if not layer_dict or not isinstance(layer_dict, data_utils.DICT_TYPES):
+                continue
+
+            for key, value in layer_dict.items():
+                if key not in values and cls.is_key_in_layer(key, layer_name):
+                    values[key] = value
+                    value_layers[key] = layer_name
+
+
+
+        # The git_auth_token is resolved from the first layer in which
+        # either the env variable set in git_auth_token_var is exported
+        # or the git_auth_token is set, so both keys must be checked
+        # for each layer together.
+        values.pop("git_auth_token_var", None)
+        value_layers.pop("git_auth_token_var", None)
+        values.pop("git_auth_token", None)
+        value_layers.pop("git_auth_token", None)
+        for layer_name, layer_dict in layers:
+            (found, git_auth_token) = data_utils.get_str_from_env_or_dict(
+                layer_dict, "git_auth_token_var", "git_auth_token")
+            if found and isinstance(git_auth_token, str):
+                values["git_auth_token"] = git_auth_token
+                value_layers["git_auth_token"] = layer_name
+                break
+
+
+
+        (main_layer_name, main_layer_dict) = layers[0]
+        values.pop("sparse_checkout", None)
+        value_layers.pop("sparse_checkout", None)
+        if main_layer_name == cls.LAYER_PROJECT:
+            project_sparse_checkout = data_utils.get_str_from_dict(main_layer_dict, "sparse_checkout", None)
+            if project_sparse_checkout:
+                values["sparse_checkout"] = tuple(project_sparse_checkout.strip().splitlines())
+                value_layers["sparse_checkout"] = main_layer_name
+        else:
+            module_layer_dict = dict(layers).get(cls.LAYER_MODULE)
+            sparse_checkout_level_mode = data_utils.get_str_from_dict(main_layer_dict, "sparse_checkout_level_mode", None)
+            module_sparse_checkout = data_utils.get_str_from_dict(module_layer_dict, "sparse_checkout", None)
+            version_sparse_checkout = data_utils.get_str_from_dict(main_layer_dict, "sparse_checkout", None)
+            if not sparse_checkout_level_mode or sparse_checkout_level_mode == "add":
+                sparse_checkout = []
+                sparse_checkout_layers = []
+                if module_sparse_checkout:
+                    sparse_checkout.extend(module_sparse_checkout.strip().splitlines())
+                    sparse_checkout_layers.append(cls.LAYER_MODULE)
+                if version_sparse_checkout:
+                    sparse_checkout.extend(version_sparse_checkout.strip().splitlines())
+                    sparse_checkout_layers.append(cls.LAYER_VERSION)
+                if sparse_checkout:
+                    values["sparse_checkout"] = tuple(sparse_checkout)
+                    value_layers["sparse_checkout"] = "+".join(sparse_checkout_layers)
+            elif sparse_checkout_level_mode == "override":
+                if version_sparse_checkout:
+                    values["sparse_checkout"] = tuple(version_sparse_checkout.strip().splitlines())
+                    value_layers["sparse_checkout"] = cls.LAYER_VERSION
+            else:
+                logger.error(LOG_TAG, "The " + label + " sparse_checkout_level_mode" +
+                             " \"" + sparse_checkout_level_mode + "\" must be 'add' or 'override'")
+                return (1, None)
+
+        return (0, cls(label, values, value_layers, _not_called_from_create=False))
+
+    @classmethod
+    def is_key_in_layer(cls, key, layer_name):
+        "Check if `key` should be resolved from the layer with `layer_name`."
+
+        if layer_name in [cls.LAYER_PROJECT, cls.LAYER_VERSION]:
+            return True
+        elif layer_name == cls.LAYER_MODULE:
+            return key not in cls.VERSION_LAYER_KEYS
+        elif layer_name == cls.LAYER_MODULES:
+            return key in cls.ALL_LAYERS_KEYS
+        else:
+            return False
+
+
+
+    def get_layer(self, key):
+        "Get the name of the layer that the value for `key` came from, otherwise `None`."
+
+        return self.value_layers.get(key)
+
+    def get_bool(self, key, default):
+        "Get bool value for `key` if it exists, otherwise default."
+
+        value = self.values.get(key)
+        if value is not None and isinstance(value, bool):
+            return value
+        else:
+            return default
+
+    def get_str(self, key, default):
+        "Get str value for `key` if it exists, otherwise default."
+
+        value = self.values.get(key)
+        if value is not None and isinstance(value, str):
+            return value
+        else:
+            return default
+
+    def get_int(self, key, default):
+        "Get int value for `key` if it exists, otherwise default."
+
+        value = self.values.get(key)
+        if value is not None and isinstance(value, int):
+            return value
+        else:
+            return default
+
+    def get_list(self, key, default):
+        "Get list value for `key` if it exists, otherwise default."
+
+        value = self.values.get(key)
+        if value is not None and isinstance(value, tuple):
+            return list(value)
+        else:
+            return default
+
+
+
+    def to_string(self):
+        string = ""
+        for key, value in self.values.items():
+            if key == "git_auth_token":
+                value_string = log_private_value(value)
+            else:
+                value_string = log_value(value)
+
+            string += ("\n" if string else "") + key + ": " + value_string + \
+                " (" + str(self.value_layers.get(key)) + ")"
+
+        return string
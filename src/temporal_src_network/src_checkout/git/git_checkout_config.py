@@ -3,20 +3,21 @@ import re
 from .git_version import GitVersion
 
 from ..checkout_config import CheckoutConfig
+from ..effective_src_checkout_config import EffectiveSrcCheckoutConfig
 
-from ...data import data_utils
+from ...data.data_utils import intern_str
 from ...data.data_utils import log_value
 from ...data.data_utils import log_private_value
 from ...logger.logger_core import logger
-from ...manifest.modules_config import ModulesConfig
-from ...manifest.project_config import ProjectConfig
-from ...manifest.version_config import VersionConfig
+from ...timing.span_timer import span_timer
 
 LOG_TAG = "git_checkout_config"
 
 class GitCheckoutConfig(CheckoutConfig):
     "Git Checkout config."
 
+    __slots__ = ("src_url", "ref", "commit", "sparse_checkout", "sparse_checkout_cone_mode", "sparse_checkout_skip_checks", "sparse_checkout_level_mode", "fetch_depth", "fetch_tags", "show_progress", "lfs", "submodules", "recursive_submodules", "git_auth_token", "ssh_strict", "persist_credentials", "set_safe_directory")
+
     CHECKOUT_TYPE = "git"
 
     REGEX_SSH_GIT_REPO_URL = r'^git@([^:]+):(.*)$'
@@ -113,58 +114,32 @@ class GitCheckoutConfig(CheckoutConfig):
         self.set_safe_directory = "ignore" # add|add_and_remove|ignore
 
     @classmethod
-    def create(cls, git, command_type, project_config=None, modules_config=None, version_config=None):
+    def create(cls, git, command_type, src_checkout_config):
         checkout_config = cls(_not_called_from_create=False)
 
-        if project_config and isinstance(project_config, ProjectConfig):
-            is_project_checkout = True
-
-            label = "project"
-
-            modules_src_checkout = None
-            module_src_checkout = None
-            main_src_checkout = project_config.src_checkout_dict
-        elif modules_config and isinstance(modules_config, ModulesConfig) and \
-            version_config and isinstance(version_config, VersionConfig):
-            is_project_checkout = False
-
-            module_config = version_config.module_config
-
-            label = "module \"" + module_config.module_name + "\"" + \
-            " version \"" + version_config.version_name + "\""
-
-            modules_src_checkout = modules_config.src_checkout_dict
-            module_src_checkout = module_config.src_checkout_dict
-            main_src_checkout = version_config.src_checkout_dict
-        else:
-            logger.error(LOG_TAG, "Either (project_config) or (modules_config and version_config)" +
-                         " must be passed to CheckoutConfig.create()")
+        if not src_checkout_config or not isinstance(src_checkout_config, EffectiveSrcCheckoutConfig):
+            logger.error(LOG_TAG, "The src_checkout_config must be passed to GitCheckoutConfig.create()")
             return (1, None)
 
-        checkout_config.src_url = data_utils.get_str_from_dict(
-            [main_src_checkout, module_src_checkout],
-            "src_url", checkout_config.src_url)
+        label = src_checkout_config.label
+
+        checkout_config.src_url = src_checkout_config.get_str("src_url", checkout_config.src_url)
 
 
 
-        checkout_config.fetch_depth = max(data_utils.get_int_from_dict(
-            [main_src_checkout, module_src_checkout],
+        checkout_config.fetch_depth = max(src_checkout_config.get_int(
             "fetch_depth", checkout_config.fetch_depth), 0)
 
-        checkout_config.fetch_tags = data_utils.get_bool_from_dict(
-            [main_src_checkout, module_src_checkout],
+        checkout_config.fetch_tags = src_checkout_config.get_bool(
             "fetch_tags", checkout_config.fetch_tags)
 
-        checkout_config.show_progress = data_utils.get_bool_from_dict(
-            [main_src_checkout, module_src_checkout],
+        checkout_config.show_progress = src_checkout_config.get_bool(
             "show_progress", checkout_config.show_progress)
 
-        checkout_config.lfs = data_utils.get_bool_from_dict(
-            [main_src_checkout, module_src_checkout],
+        checkout_config.lfs = src_checkout_config.get_bool(
             "lfs", checkout_config.lfs)
 
-        submodules_string = data_utils.get_str_from_dict(
-            [main_src_checkout, module_src_checkout],
+        submodules_string = src_checkout_config.get_str(
             "submodules", "DISABLE").upper()
         if submodules_string == "ENABLE":
             checkout_config.submodules = True
@@ -175,7 +150,7 @@ class GitCheckoutConfig(CheckoutConfig):
 
 
 
-        ref = data_utils.get_str_from_dict(main_src_checkout, "ref", None)
+        ref = src_checkout_config.get_str("ref", None)
         # If commit hash
         if ref and re.match('^[a-zA-Z0-9]{40}$', ref):
             checkout_config.commit = ref
@@ -184,65 +159,22 @@ class GitCheckoutConfig(CheckoutConfig):
             checkout_config.ref = ref
 
 
-        checkout_config.sparse_checkout_cone_mode = data_utils.get_bool_from_dict(
-            [main_src_checkout, module_src_checkout],
+        checkout_config.sparse_checkout_cone_mode = src_checkout_config.get_bool(
             "sparse_checkout_cone_mode", checkout_config.sparse_checkout_cone_mode)
 
-        checkout_config.sparse_checkout_skip_checks = data_utils.get_bool_from_dict(
-            [main_src_checkout, module_src_checkout],
+        checkout_config.sparse_checkout_skip_checks = src_checkout_config.get_bool(
             "sparse_checkout_skip_checks", checkout_config.sparse_checkout_skip_checks)
 
-        if is_project_checkout:
-            project_sparse_checkout = data_utils.get_str_from_dict(main_src_checkout, "sparse_checkout", None)
-            if project_sparse_checkout:
-                checkout_config.sparse_checkout = project_sparse_checkout.strip().splitlines()
-
+        checkout_config.sparse_checkout_level_mode = src_checkout_config.get_str(
+            "sparse_checkout_level_mode", checkout_config.sparse_checkout_level_mode)
 
+        # The sparse_checkout of the module and version layers is
+        # already combined as per sparse_checkout_level_mode
+        checkout_config.sparse_checkout = src_checkout_config.get_list(
+            "sparse_checkout", checkout_config.sparse_checkout)
 
-            # Get git_auth_token from env var or key of main_src_checkout
-            (found, git_auth_token) = data_utils.get_str_from_env_or_dict(
-                main_src_checkout, "git_auth_token_var", "git_auth_token")
-            if found and isinstance(git_auth_token, str):
-                checkout_config.git_auth_token = git_auth_token
-        else:
-            sparse_checkout_level_mode = data_utils.get_str_from_dict(main_src_checkout, "sparse_checkout_level_mode", None)
-            module_sparse_checkout = data_utils.get_str_from_dict(module_src_checkout, "sparse_checkout", None)
-            version_sparse_checkout = data_utils.get_str_from_dict(main_src_checkout, "sparse_checkout", None)
-            if not sparse_checkout_level_mode or sparse_checkout_level_mode == "add":
-                sparse_checkout = []
-                if module_sparse_checkout:
-                    sparse_checkout.extend(module_sparse_checkout.strip().splitlines())
-                if version_sparse_checkout:
-                    sparse_checkout.extend(version_sparse_checkout.strip().splitlines())
-                checkout_config.sparse_checkout = sparse_checkout
-            elif sparse_checkout_level_mode == "override":
-                if version_sparse_checkout:
-                    checkout_config.sparse_checkout = version_sparse_checkout.strip().splitlines()
-            else:
-                logger.error(LOG_TAG, "The " + label + " sparse_checkout_level_mode" +
-                             " \"" + sparse_checkout_level_mode + "\" must be 'add' or 'override'")
-                return (1, None)
-
-
-
-
-            # Get git_auth_token from env var or key of main_src_checkout
-            (found, git_auth_token) = data_utils.get_str_from_env_or_dict(
-                main_src_checkout, "git_auth_token_var", "git_auth_token")
-            if found and isinstance(git_auth_token, str):
-                checkout_config.git_auth_token = git_auth_token
-            else:
-                # Else get git_auth_token from env var or key of module_src_checkout
-                (found, git_auth_token) = data_utils.get_str_from_env_or_dict(
-                    module_src_checkout, "git_auth_token_var", "git_auth_token")
-                if found and isinstance(git_auth_token, str):
-                    checkout_config.git_auth_token = git_auth_token
-                else:
-                    # Else get git_auth_token from env var or key of modules_src_checkout
-                    (found, git_auth_token) = data_utils.get_str_from_env_or_dict(
-                        modules_src_checkout, "git_auth_token_var", "git_auth_token")
-                    if found and isinstance(git_auth_token, str):
-                        checkout_config.git_auth_token = git_auth_token
+        checkout_config.git_auth_token = src_checkout_config.get_str(
+            "git_auth_token", checkout_config.git_auth_token)
 
 
 
@@ -262,21 +194,21 @@ class GitCheckoutConfig(CheckoutConfig):
                                               repl='https://\\1/\\2',
                                               string=checkout_config.src_url)
 
+        # The same src_url is normally used for all versions of a module
+        checkout_config.src_url = intern_str(checkout_config.src_url)
+
 
 
-        checkout_config.ssh_strict = data_utils.get_bool_from_dict(
-            [main_src_checkout, module_src_checkout],
+        checkout_config.ssh_strict = src_checkout_config.get_bool(
             "ssh_strict", checkout_config.ssh_strict)
         git.set_ssh_strict(checkout_config.ssh_strict)
 
-        checkout_config.persist_credentials = data_utils.get_bool_from_dict(
-            [main_src_checkout, module_src_checkout],
+        checkout_config.persist_credentials = src_checkout_config.get_bool(
             "persist_credentials", checkout_config.persist_credentials)
 
 
 
-        checkout_config.set_safe_directory = data_utils.get_str_from_dict(
-            [main_src_checkout, module_src_checkout],
+        checkout_config.set_safe_directory = src_checkout_config.get_str(
             "set_safe_directory", checkout_config.set_safe_directory)
         if checkout_config.set_safe_directory not in ["add", "add_and_remove", "ignore"]:
             logger.error(LOG_TAG, "The " + label + " set_safe_directory" +
@@ -286,7 +218,8 @@ class GitCheckoutConfig(CheckoutConfig):
 
 
 
-        logger.vverbose(LOG_TAG, label + " git_checkout_config:\n" + checkout_config.to_string() + "\n")
+        if logger.is_log_level_enabled(logger.LOG_LEVEL_VVERBOSE):
+            logger.vverbose(LOG_TAG, label + " git_checkout_config:\n" + checkout_config.to_string() + "\n")
 
 
 
@@ -298,8 +231,12 @@ class GitCheckoutConfig(CheckoutConfig):
 
 
 
-        # Ensure src_url is valid and exists
-        if not checkout_config.src_url or not git.is_valid_repo_url(checkout_config.src_url):
+        # Ensure src_url is valid and exists.
+        # The check and status commands do not connect to the src_url
+        # since they must not have network side effects, and remotes are
+        # instead checked concurrently for the check command if required.
+        if not checkout_config.src_url or \
+            (command_type not in ["check", "status"] and not cls.is_valid_repo_url(git, checkout_config.src_url)):
             logger.error(LOG_TAG, "The " + label +
                          " src_url \"" + str(checkout_config.src_url) + "\"" +
                          " is not valid, does not exist or failed to connect to it")
@@ -307,6 +244,11 @@ class GitCheckoutConfig(CheckoutConfig):
 
         return (0, checkout_config)
 
+    @staticmethod
+    def is_valid_repo_url(git, src_url):
+        with span_timer.span("git_ls_remote"):
+            return git.is_valid_repo_url(src_url)
+
     @classmethod
     def ensure_required_git_versions(cls, git, checkout_config):
          # Ensure minimum required git version is installed
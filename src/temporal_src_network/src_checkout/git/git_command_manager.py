@@ -9,14 +9,26 @@ from .git_checkout_config import GitCheckoutConfig
 from .git_version import GitVersion
 
 from ...data import data_utils
+from ...file import file_utils
 from ...logger.logger_core import logger
 from ...shell import shell_utils
+from ...timing.run_metrics import run_metrics
+from ...timing.span_timer import span_timer
 
 LOG_TAG = "git_command_manager"
 
 class GitCommandManager:
     "The git command manager."
 
+    ARGV_SUMMARY_MAX_ARGS = 8
+    "The maximum number of args in the argv summary of a git command."
+
+    ARGV_SUMMARY_MAX_ARG_LENGTH = 100
+    "The maximum length of each arg in the argv summary of a git command."
+
+    REGEX_AUTHORIZATION_HEADER = re.compile(r'(AUTHORIZATION:\s*\S+\s+)\S.*', re.IGNORECASE)
+    "The regex for the value of authorization headers, like passed with `http.extraheader` config."
+
     def __init__(self, repo_root_dir, *, _not_called_from_create=True):
         if _not_called_from_create:
             raise RuntimeError("Object must be created with GitCommandManager.create()")
@@ -102,16 +114,22 @@ class GitCommandManager:
         stdout = None
         stderr = None
 
-        (return_value, stdout, stderr) = shell_utils.run_shell_command(
-            LOG_TAG,
-            git_command_array,
-            capture,
-            stdout=stdout,
-            stderr=stderr,
-            cwd=cwd,
-            env=git_env,
-            # timeout=timeout,
-            redirect_stderrr_to_stdout=redirect_stderrr_to_stdout)
+        with span_timer.span("git_exec",
+                             argv=GitCommandManager.get_argv_summary(args) if span_timer.enabled else None):
+            (return_value, stdout, stderr) = shell_utils.run_shell_command(
+                LOG_TAG,
+                git_command_array,
+                capture,
+                stdout=stdout,
+                stderr=stderr,
+                cwd=cwd,
+                env=git_env,
+                # timeout=timeout,
+                redirect_stderrr_to_stdout=redirect_stderrr_to_stdout)
+
+        # The git command may have created or deleted directories or
+        # symlinks in the repo, like for clone, checkout or clean.
+        file_utils.clear_canonical_paths_cache()
 
         force_log = not allow_all_exit_codes and str(return_value) != "0"
 
@@ -133,6 +151,27 @@ class GitCommandManager:
 
 
 
+    @staticmethod
+    def get_argv_summary(args):
+        """
+        Get the summary of the args of a git command, with the credentials
+        in urls and the values of authorization headers redacted, and
+        long and extra args truncated.
+        """
+
+        summary_args = []
+        for arg in args[:GitCommandManager.ARGV_SUMMARY_MAX_ARGS]:
+            arg = data_utils.redact_url_user_info(str(arg))
+            arg = GitCommandManager.REGEX_AUTHORIZATION_HEADER.sub("\\1***", arg)
+            if len(arg) > GitCommandManager.ARGV_SUMMARY_MAX_ARG_LENGTH:
+                arg = arg[:GitCommandManager.ARGV_SUMMARY_MAX_ARG_LENGTH] + "..."
+            summary_args.append(arg)
+
+        if len(args) > GitCommandManager.ARGV_SUMMARY_MAX_ARGS:
+            summary_args.append("(" + str(len(args) - GitCommandManager.ARGV_SUMMARY_MAX_ARGS) + " more)")
+
+        return "git " + " ".join(summary_args)
+
     def get_git_version(self):
         (return_value, stdout, stderr) = self.exec(["--version"], True,
             cwd=".", # repo_root_dir may not exist
@@ -240,9 +279,31 @@ class GitCommandManager:
         if ref_spec:
             args.extend(ref_spec)
 
+        packs_size = self.get_packs_size() if run_metrics.enabled else None
+
         (return_value, stdout, stderr) = self.exec(args, False)
+
+        # Objects of small fetches that are unpacked to loose objects,
+        # as per `fetch.unpackLimit`, are not counted.
+        if packs_size is not None and str(return_value) == "0":
+            run_metrics.inc("fetched_bytes_total", max(0, self.get_packs_size() - packs_size))
+
         return return_value
 
+    def get_packs_size(self):
+        "Get the total size in bytes of the pack files of the repository."
+
+        packs_size = 0
+        try:
+            with os.scandir(os.path.join(self.repo_root_dir, ".git", "objects", "pack")) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".pack"):
+                        packs_size += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            pass
+
+        return packs_size
+
 
 
     def checkout(self, ref, start_point, show_progress=False):
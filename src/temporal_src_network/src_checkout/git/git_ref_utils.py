@@ -1,3 +1,5 @@
+import os
+
 from ...logger.logger_core import logger
 
 LOG_TAG = "git_ref_utils"
@@ -143,3 +145,58 @@ def test_ref(git, ref, commit):
     else:
         logger.debug(LOG_TAG, "Unexpected ref format '" + ref + "' when testing ref info")
         return (0, True)
+
+
+
+def read_head_commit(repo_root_dir):
+    """
+    Read the commit that `HEAD` of the git repo at `repo_root_dir`
+    points to directly from the files under the git directory, without
+    running `git`, so that it can be checked cheaply for many repos.
+
+    @returns (commit, key_paths) where commit is `None` if it could not
+    be resolved, and key_paths is the `list` of paths of the files that
+    were read and whose changes would change the commit.
+    """
+
+    git_dir = os.path.join(repo_root_dir, ".git")
+    key_paths = [git_dir]
+
+    try:
+        # The `.git` may be a file containing the path to the git
+        # directory, like for worktrees and submodules.
+        if os.path.isfile(git_dir):
+            with open(git_dir, "r", encoding="utf-8") as git_file:
+                line = git_file.readline().strip()
+            if not line.startswith("gitdir: "):
+                return (None, key_paths)
+            git_dir = os.path.normpath(os.path.join(repo_root_dir, line[len("gitdir: "):]))
+
+        head_path = os.path.join(git_dir, "HEAD")
+        key_paths.append(head_path)
+        with open(head_path, "r", encoding="utf-8") as head_file:
+            head = head_file.readline().strip()
+
+        if not head.startswith("ref: "):
+            return (head or None, key_paths)
+
+        ref = head[len("ref: "):]
+        ref_path = os.path.join(git_dir, ref)
+        key_paths.append(ref_path)
+        try:
+            with open(ref_path, "r", encoding="utf-8") as ref_file:
+                return (ref_file.readline().strip() or None, key_paths)
+        except FileNotFoundError:
+            pass
+
+        packed_refs_path = os.path.join(git_dir, "packed-refs")
+        key_paths.append(packed_refs_path)
+        with open(packed_refs_path, "r", encoding="utf-8") as packed_refs_file:
+            for line in packed_refs_file:
+                parts = line.rstrip("\n").split(" ", 1)
+                if len(parts) == 2 and parts[1] == ref:
+                    return (parts[0], key_paths)
+    except OSError as err:
+        logger.vverbose(LOG_TAG, "Failed to read HEAD commit of git repo at \"" + repo_root_dir + "\": " + str(err))
+
+    return (None, key_paths)
@@ -1,4 +1,5 @@
 import os
+import re
 
 from . import git_auth_manager
 from . import git_checkout_config
@@ -9,12 +10,16 @@ from .. import src_provider
 
 from ...file import file_utils
 from ...logger.logger_core import logger
+from ...timing.span_timer import span_timer
 
 LOG_TAG = "git_src_provider"
 
 class GitSrcProvider(src_provider.SrcProvider):
     "Provider for checking out a git source."
 
+    REGEX_URL_USER_INFO = r'^([a-zA-Z][a-zA-Z0-9+.-]*://)[^/@]*@'
+    "The regex for the user info, like credentials, in a url that must not be recorded."
+
     def __init__(self, git, auth_manager, repo_root_dir, checkout_config, *, _not_called_from_create=True):
         if _not_called_from_create:
             raise RuntimeError("Object must be created with GitSrcProvider.create_*()")
@@ -23,9 +28,10 @@ class GitSrcProvider(src_provider.SrcProvider):
         self.auth_manager = auth_manager
         self.repo_root_dir = repo_root_dir
         self.checkout_config = checkout_config
+        self.resolved_commit = None
 
     @classmethod
-    def create_for_project(cls, command_type, project_config):
+    def create_for_project(cls, command_type, project_config, src_checkout_config):
         (return_value, git) = git_command_manager.GitCommandManager.create(
             command_type, project_config.project_root_dir)
         if str(return_value) != "0":
@@ -35,7 +41,7 @@ class GitSrcProvider(src_provider.SrcProvider):
             return (1, None)
 
         (return_value, checkout_config) = git_checkout_config.GitCheckoutConfig.create(
-            git, command_type, project_config=project_config)
+            git, command_type, src_checkout_config)
         if str(return_value) != "0":
             return (return_value, None)
         if not checkout_config or not isinstance(checkout_config, git_checkout_config.GitCheckoutConfig):
@@ -52,7 +58,7 @@ class GitSrcProvider(src_provider.SrcProvider):
         return (0, cls(git, auth_manager, project_config.project_root_dir, checkout_config, _not_called_from_create=False))
 
     @classmethod
-    def create_for_version(cls, command_type, modules_config, version_config):
+    def create_for_version(cls, command_type, version_config, src_checkout_config):
         label = "module" + " \"" + version_config.module_config.module_name + "\"" + \
                 " version \"" + version_config.version_name + "\""
 
@@ -65,7 +71,7 @@ class GitSrcProvider(src_provider.SrcProvider):
             return (1, None)
 
         (return_value, checkout_config) = git_checkout_config.GitCheckoutConfig.create(
-            git, command_type, modules_config=modules_config, version_config=version_config)
+            git, command_type, src_checkout_config)
         if str(return_value) != "0":
             return (return_value, None)
         if not checkout_config or not isinstance(checkout_config, git_checkout_config.GitCheckoutConfig):
@@ -83,6 +89,17 @@ class GitSrcProvider(src_provider.SrcProvider):
 
 
 
+    def get_checkout_state(self):
+        checkout_config = self.checkout_config
+        return {
+            "checkout_type": checkout_config.checkout_type,
+            "src_url": re.sub(GitSrcProvider.REGEX_URL_USER_INFO, "\\1", checkout_config.src_url or ""),
+            "ref": checkout_config.ref,
+            "commit": self.resolved_commit or checkout_config.commit,
+            "sparse_checkout": checkout_config.sparse_checkout,
+            "sparse_checkout_cone_mode": checkout_config.sparse_checkout_cone_mode
+        }
+
     # - https://github.com/actions/checkout/blob/v4.0.0/src/git-source-provider.ts#L15
     def checkout_src(self):
         checkout_config = self.checkout_config
@@ -128,7 +145,8 @@ class GitSrcProvider(src_provider.SrcProvider):
             # We always get default branch so that we can pass it to "git init"
             # to hide the "Using 'master'" branch verbose hint message.
             logger.verbose(LOG_TAG, "Determining the default branch")
-            (return_value, default_branch) = self.git.get_default_branch(checkout_config.src_url)
+            with span_timer.span("git_ls_remote"):
+                (return_value, default_branch) = self.git.get_default_branch(checkout_config.src_url)
             if str(return_value) != "0":
                 return return_value
 
@@ -144,14 +162,15 @@ class GitSrcProvider(src_provider.SrcProvider):
             # Initialize the repository
             if not os.path.isdir(os.path.join(repo_root_dir, ".git")):
                 logger.verbose(LOG_TAG, "Initializing the repository: " + checkout_config.src_url)
-                return_value = self.git.init(default_branch=default_branch)
-                if str(return_value) != "0":
-                    return return_value
+                with span_timer.span("git_init"):
+                    return_value = self.git.init(default_branch=default_branch)
+                    if str(return_value) != "0":
+                        return return_value
 
 
-                return_value = self.git.remote_add("origin", checkout_config.src_url)
-                if str(return_value) != "0":
-                    return return_value
+                    return_value = self.git.remote_add("origin", checkout_config.src_url)
+                    if str(return_value) != "0":
+                        return return_value
 
 
 
@@ -175,7 +194,8 @@ class GitSrcProvider(src_provider.SrcProvider):
             # LFS install
             if checkout_config.lfs:
                 logger.verbose(LOG_TAG, "Installing LFS config")
-                return_value = self.git.lfs_install()
+                with span_timer.span("git_lfs_install"):
+                    return_value = self.git.lfs_install()
                 if str(return_value) != "0":
                     return return_value
 
@@ -189,46 +209,47 @@ class GitSrcProvider(src_provider.SrcProvider):
 
             show_progress = checkout_config.show_progress
 
-            if checkout_config.fetch_depth and checkout_config.fetch_depth <= 0:
-                # Fetch all branches and tags
-                ref_spec = git_ref_utils.get_ref_spec_for_all_history(
-                    checkout_config.ref, checkout_config.commit)
+            with span_timer.span("git_fetch"):
+                if checkout_config.fetch_depth and checkout_config.fetch_depth <= 0:
+                    # Fetch all branches and tags
+                    ref_spec = git_ref_utils.get_ref_spec_for_all_history(
+                        checkout_config.ref, checkout_config.commit)
 
-                return_value = self.git.fetch(ref_spec,
-                                              fetch_filter=fetch_filter,
-                                              show_progress=show_progress)
-                if str(return_value) != "0":
-                    return return_value
+                    return_value = self.git.fetch(ref_spec,
+                                                  fetch_filter=fetch_filter,
+                                                  show_progress=show_progress)
+                    if str(return_value) != "0":
+                        return return_value
 
 
-                # When all history is fetched, the ref we're interested in may have moved to a different
-                # commit (push or force push). If so, fetch again with a targeted refspec.
-                (return_value, ref_exists) = git_ref_utils.test_ref(
-                    self.git, checkout_config.ref, checkout_config.commit)
-                if str(return_value) != "0":
-                    return return_value
-                if not ref_exists:
+                    # When all history is fetched, the ref we're interested in may have moved to a different
+                    # commit (push or force push). If so, fetch again with a targeted refspec.
+                    (return_value, ref_exists) = git_ref_utils.test_ref(
+                        self.git, checkout_config.ref, checkout_config.commit)
+                    if str(return_value) != "0":
+                        return return_value
+                    if not ref_exists:
+                        (return_value, ref_spec) = git_ref_utils.get_ref_spec(
+                                                checkout_config.ref, checkout_config.commit)
+                        if str(return_value) != "0":
+                            return return_value
+
+                        return_value = self.git.fetch(
+                            ref_spec, fetch_filter=fetch_filter, show_progress=show_progress)
+                        if str(return_value) != "0":
+                            return return_value
+                else:
                     (return_value, ref_spec) = git_ref_utils.get_ref_spec(
-                                            checkout_config.ref, checkout_config.commit)
+                        checkout_config.ref, checkout_config.commit)
                     if str(return_value) != "0":
                         return return_value
 
-                    return_value = self.git.fetch(
-                        ref_spec, fetch_filter=fetch_filter, show_progress=show_progress)
+                    return_value = self.git.fetch(ref_spec, fetch_filter=fetch_filter,
+                                                  fetch_depth=checkout_config.fetch_depth,
+                                                  fetch_tags=checkout_config.fetch_tags,
+                                                  show_progress=show_progress)
                     if str(return_value) != "0":
                         return return_value
-            else:
-                (return_value, ref_spec) = git_ref_utils.get_ref_spec(
-                    checkout_config.ref, checkout_config.commit)
-                if str(return_value) != "0":
-                    return return_value
-
-                return_value = self.git.fetch(ref_spec, fetch_filter=fetch_filter,
-                                              fetch_depth=checkout_config.fetch_depth,
-                                              fetch_tags=checkout_config.fetch_tags,
-                                              show_progress=show_progress)
-                if str(return_value) != "0":
-                    return return_value
 
 
 
@@ -247,7 +268,8 @@ class GitSrcProvider(src_provider.SrcProvider):
             # For sparse checkouts, let `checkout` fetch the needed objects lazily.
             if checkout_config.lfs and not checkout_config.sparse_checkout:
                 logger.verbose(LOG_TAG, "Fetching LFS objects")
-                return_value = self.git.lfs_fetch(checkout_start_point if checkout_start_point else checkout_ref)
+                with span_timer.span("git_lfs_fetch"):
+                    return_value = self.git.lfs_fetch(checkout_start_point if checkout_start_point else checkout_ref)
                 if str(return_value) != "0":
                     return return_value
 
@@ -255,13 +277,14 @@ class GitSrcProvider(src_provider.SrcProvider):
 
             # Sparse checkout
             if checkout_config.sparse_checkout:
-                if checkout_config.sparse_checkout_cone_mode:
-                    logger.verbose(LOG_TAG, "Setting up sparse checkout with cone mode")
-                    return_value = self.git.sparse_checkout(checkout_config.sparse_checkout,
-                        checkout_config.sparse_checkout_skip_checks)
-                else:
-                    logger.verbose(LOG_TAG, "Setting up sparse checkout with no-cone mode")
-                    return_value = self.git.sparse_checkout_no_cone_mode(checkout_config.sparse_checkout)
+                with span_timer.span("git_sparse_checkout"):
+                    if checkout_config.sparse_checkout_cone_mode:
+                        logger.verbose(LOG_TAG, "Setting up sparse checkout with cone mode")
+                        return_value = self.git.sparse_checkout(checkout_config.sparse_checkout,
+                            checkout_config.sparse_checkout_skip_checks)
+                    else:
+                        logger.verbose(LOG_TAG, "Setting up sparse checkout with no-cone mode")
+                        return_value = self.git.sparse_checkout_no_cone_mode(checkout_config.sparse_checkout)
                 if str(return_value) != "0":
                     return return_value
 
@@ -269,8 +292,9 @@ class GitSrcProvider(src_provider.SrcProvider):
 
             # Checkout
             logger.verbose(LOG_TAG, "Checking out the ref")
-            return_value = self.git.checkout(checkout_ref, checkout_start_point,
-                                             show_progress=show_progress)
+            with span_timer.span("git_checkout"):
+                return_value = self.git.checkout(checkout_ref, checkout_start_point,
+                                                 show_progress=show_progress)
             if str(return_value) != "0":
                 return return_value
 
@@ -282,22 +306,23 @@ class GitSrcProvider(src_provider.SrcProvider):
 
                 # Checkout submodules
                 logger.verbose(LOG_TAG, "Fetching submodules")
-                return_value = self.git.submodule_sync(
-                    checkout_config.recursive_submodules)
-                if str(return_value) != "0":
-                    return return_value
+                with span_timer.span("git_submodules"):
+                    return_value = self.git.submodule_sync(
+                        checkout_config.recursive_submodules)
+                    if str(return_value) != "0":
+                        return return_value
 
-                return_value = self.git.submodule_update(
-                    checkout_config.fetch_depth,
-                    checkout_config.recursive_submodules)
-                if str(return_value) != "0":
-                    return return_value
+                    return_value = self.git.submodule_update(
+                        checkout_config.fetch_depth,
+                        checkout_config.recursive_submodules)
+                    if str(return_value) != "0":
+                        return return_value
 
-                return_value = self.git.submodule_for_each(
-                    "git config --local gc.auto 0",
-                    checkout_config.recursive_submodules)
-                if str(return_value) != "0":
-                    return return_value
+                    return_value = self.git.submodule_for_each(
+                        "git config --local gc.auto 0",
+                        checkout_config.recursive_submodules)
+                    if str(return_value) != "0":
+                        return return_value
 
                 # TODO: Persist credentials
 
@@ -306,7 +331,9 @@ class GitSrcProvider(src_provider.SrcProvider):
             # TODO: Get commit information
 
             # Log commit sha
-            self.git.log1("--format='%H'")
+            (return_value, stdout) = self.git.log1("--format='%H'")
+            if str(return_value) == "0" and stdout:
+                self.resolved_commit = stdout.strip().strip("'")
 
             # TODO: Check for incorrect pull request merge commit
 
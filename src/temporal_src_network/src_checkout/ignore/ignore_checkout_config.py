@@ -7,6 +7,8 @@ LOG_TAG = "ignore_checkout_config"
 class IgnoreCheckoutConfig(CheckoutConfig):
     "Ignore Checkout config."
 
+    __slots__ = ()
+
     CHECKOUT_TYPE = "ignore"
 
     def __init__(self, *, _not_called_from_create=True):
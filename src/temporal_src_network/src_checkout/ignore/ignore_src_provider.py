@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 
+from .ignore_checkout_config import IgnoreCheckoutConfig
+
 from .. import src_provider
 
 from ...logger.logger_core import logger
@@ -21,3 +23,6 @@ class IgnoreSrcProvider(src_provider.SrcProvider):
         logger.debug(LOG_TAG, "Ignoring checkout source")
 
         return 0
+
+    def get_checkout_state(self):
+        return {"checkout_type": IgnoreCheckoutConfig.CHECKOUT_TYPE}
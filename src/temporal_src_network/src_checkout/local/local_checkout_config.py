@@ -0,0 +1,115 @@
+import os
+
+from ..checkout_config import CheckoutConfig
+from ..effective_src_checkout_config import EffectiveSrcCheckoutConfig
+
+from ...data.data_utils import intern_str
+from ...data.data_utils import log_value
+from ...file import file_utils
+from ...logger.logger_core import logger
+
+LOG_TAG = "local_checkout_config"
+
+class LocalCheckoutConfig(CheckoutConfig):
+    "Local Checkout config."
+
+    __slots__ = ("src_url", "src_dir", "sparse_checkout", "sparse_checkout_cone_mode", "sparse_checkout_level_mode", "local_copy_mode")
+
+    CHECKOUT_TYPE = "local"
+
+    FILE_URL_PREFIX = "file://"
+
+    LOCAL_COPY_MODES = ["auto", "reflink", "hardlink", "copy"]
+
+    def __init__(self, *, _not_called_from_create=True):
+        super().__init__(LocalCheckoutConfig.CHECKOUT_TYPE)
+
+        if _not_called_from_create:
+            raise RuntimeError("Object must be created with LocalCheckoutConfig.create()")
+
+        self.src_url = None
+        self.src_dir = None
+        self.sparse_checkout = None
+        self.sparse_checkout_cone_mode = True
+        self.sparse_checkout_level_mode = "add" # add|override
+        self.local_copy_mode = "auto" # auto|reflink|hardlink|copy
+
+    @classmethod
+    def create(cls, src_checkout_config, repo_root_dir):
+        checkout_config = cls(_not_called_from_create=False)
+
+        if not src_checkout_config or not isinstance(src_checkout_config, EffectiveSrcCheckoutConfig):
+            logger.error(LOG_TAG, "The src_checkout_config must be passed to LocalCheckoutConfig.create()")
+            return (1, None)
+
+        label = src_checkout_config.label
+
+        # The same src_url is normally used for all versions of a module
+        checkout_config.src_url = intern_str(src_checkout_config.get_str("src_url", checkout_config.src_url))
+
+
+
+        checkout_config.sparse_checkout_cone_mode = src_checkout_config.get_bool(
+            "sparse_checkout_cone_mode", checkout_config.sparse_checkout_cone_mode)
+
+        checkout_config.sparse_checkout_level_mode = src_checkout_config.get_str(
+            "sparse_checkout_level_mode", checkout_config.sparse_checkout_level_mode)
+
+        # The sparse_checkout of the module and version layers is
+        # already combined as per sparse_checkout_level_mode
+        checkout_config.sparse_checkout = src_checkout_config.get_list(
+            "sparse_checkout", checkout_config.sparse_checkout)
+
+
+
+        checkout_config.local_copy_mode = src_checkout_config.get_str(
+            "local_copy_mode", checkout_config.local_copy_mode)
+        if checkout_config.local_copy_mode not in LocalCheckoutConfig.LOCAL_COPY_MODES:
+            logger.error(LOG_TAG, "The " + label + " local_copy_mode" +
+                " \"" + checkout_config.local_copy_mode + "\"" +
+                " must be 'auto', 'reflink', 'hardlink' or 'copy'")
+            return (1, None)
+
+
+
+        if logger.is_log_level_enabled(logger.LOG_LEVEL_VVERBOSE):
+            logger.vverbose(LOG_TAG, label + " local_checkout_config:\n" + checkout_config.to_string() + "\n")
+
+
+
+        # Ensure src_url is a valid absolute path to a local directory.
+        # The src_dir may be the root directory of another version that
+        # is only checked out earlier in the same run, so its existence
+        # is only checked when the source is checked out.
+        src_dir = checkout_config.src_url
+        if src_dir and src_dir.startswith(LocalCheckoutConfig.FILE_URL_PREFIX):
+            src_dir = src_dir[len(LocalCheckoutConfig.FILE_URL_PREFIX):]
+
+        error = file_utils.is_path_valid(label + " src_url", src_dir)
+        if error is not None:
+            logger.error(LOG_TAG, error)
+            return (1, None)
+
+        checkout_config.src_dir = os.path.normpath(src_dir)
+
+        # The repo_root_dir is deleted before checkout, so it must not
+        # contain the src_dir, and files cannot be copied into themselves.
+        if file_utils.is_path_in_dir_path(checkout_config.src_dir, repo_root_dir, False) or \
+            file_utils.is_path_in_dir_path(repo_root_dir, checkout_config.src_dir, False):
+            logger.error(LOG_TAG, "The " + label + " src_url \"" + checkout_config.src_url + "\"" +
+                         " must not be the same as, contain or be under the root directory" +
+                         " \"" + repo_root_dir + "\" to checkout to")
+            return (1, None)
+
+        return (0, checkout_config)
+
+
+
+    def to_string(self):
+        return CheckoutConfig.to_string(self) + \
+        "\nsrc_url: " + log_value(self.src_url) + \
+        "\nsrc_dir: " + log_value(self.src_dir) + \
+        "\nsparse_checkout: " + log_value(self.sparse_checkout) + \
+        "\nsparse_checkout_cone_mode: " + log_value(self.sparse_checkout_cone_mode) + \
+        "\nsparse_checkout_level_mode: " + log_value(self.sparse_checkout_level_mode) + \
+        "\nlocal_copy_mode: " + log_value(self.local_copy_mode)
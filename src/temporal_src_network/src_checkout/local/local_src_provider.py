@@ -0,0 +1,308 @@
+import collections
+import concurrent.futures
+import errno
+import os
+import shutil
+import stat
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from . import local_checkout_config
+from .sparse_checkout_matcher import SparseCheckoutMatcher
+
+from .. import src_provider
+
+from ...file import file_utils
+from ...file import file_utils_errno
+from ...logger.logger_core import logger
+
+LOG_TAG = "local_src_provider"
+
+class LocalSrcProvider(src_provider.SrcProvider):
+    """
+    Provider for checking out a source from a local directory, like a
+    prebuilt tree or the root directory of another version.
+
+    Regular files are cloned with copy-on-write reflinks if supported by
+    the filesystem, so that the data blocks are shared until either file
+    is modified, and are otherwise copied by a thread pool. Read-only
+    files are hardlinked instead of copied in `auto` mode, since they
+    are not expected to be modified in place. Symlinks are recreated
+    and are never followed.
+    """
+
+    FICLONE = 0x40049409
+    "The `ioctl` request for cloning a file with a reflink on Linux, from `linux/fs.h`."
+
+    REFLINK_UNSUPPORTED_ERRNOS = frozenset([errno.EOPNOTSUPP, errno.ENOTSUP, errno.EXDEV, errno.EINVAL, errno.ENOTTY])
+    "The errnos for which reflinks are considered not supported between the directories."
+
+    MAX_PENDING_FILES_PER_JOB = 64
+    """
+    The maximum number of files per job that may be waiting to be copied
+    while the source directory is walked, so that the jobs for all the
+    files of large trees are not held in memory at once.
+    """
+
+    def __init__(self, repo_root_dir, checkout_config, jobs, *, _not_called_from_create=True):
+        if _not_called_from_create:
+            raise RuntimeError("Object must be created with LocalSrcProvider.create_*()")
+
+        self.repo_root_dir = repo_root_dir
+        self.checkout_config = checkout_config
+        self.jobs = jobs
+        self.reflink_supported = fcntl is not None
+        self.results = collections.Counter()
+
+    @classmethod
+    def create_for_project(cls, project_config, src_checkout_config, jobs):
+        return cls.create("project", project_config.project_root_dir, src_checkout_config, jobs)
+
+    @classmethod
+    def create_for_version(cls, version_config, src_checkout_config, jobs):
+        label = "module" + " \"" + version_config.module_config.module_name + "\"" + \
+                " version \"" + version_config.version_name + "\""
+
+        return cls.create(label, version_config.version_root_dir, src_checkout_config, jobs)
+
+    @classmethod
+    def create(cls, label, repo_root_dir, src_checkout_config, jobs):
+        """
+        Create the provider.
+
+        @param jobs The number of threads to copy files with.
+        """
+
+        (return_value, checkout_config) = local_checkout_config.LocalCheckoutConfig.create(
+            src_checkout_config, repo_root_dir)
+        if str(return_value) != "0":
+            return (return_value, None)
+        if not checkout_config or not isinstance(checkout_config, local_checkout_config.LocalCheckoutConfig):
+            logger.error(LOG_TAG, "Failed to create checkout_config for " + label)
+            return (1, None)
+
+        return (0, cls(repo_root_dir, checkout_config, jobs, _not_called_from_create=False))
+
+    def checkout_src(self):
+        checkout_config = self.checkout_config
+        src_dir = checkout_config.src_dir
+        repo_root_dir = self.repo_root_dir
+
+        logger.debug(LOG_TAG, "Checkout source at \"" + src_dir + "\"")
+        logger.debug(LOG_TAG, "repo_root_dir: \"" + repo_root_dir + "\"")
+
+        if not os.path.isdir(src_dir):
+            logger.error(LOG_TAG, file_utils_errno.ERRNO_FILE_NOT_FOUND_AT_PATH.format("src directory", src_dir))
+            return 1
+
+        matcher = None
+        if checkout_config.sparse_checkout:
+            (return_value, matcher) = SparseCheckoutMatcher.create(
+                checkout_config.sparse_checkout, checkout_config.sparse_checkout_cone_mode)
+            if str(return_value) != "0":
+                return return_value
+
+        # Create repo_root_dir if it does not already exist
+        error = file_utils.create_dir_file(LOG_TAG, "repo root", repo_root_dir)
+        if error is not None:
+            logger.error(LOG_TAG, error)
+            return 1
+
+        self.results.clear()
+        errors = []
+        # The modes of the directories are set after all the files are
+        # copied, since files cannot be created in read-only directories.
+        # The owner always keeps full access to the directories, so that
+        # the checkout can be deleted by the tool, like for the next setup.
+        dir_modes = []
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="local_src_provider") as executor:
+            futures = {}
+            try:
+                self.walk_src_dir(executor, futures, errors, matcher, src_dir, repo_root_dir, "", dir_modes, True)
+            except OSError as err:
+                errors.append(file_utils_errno.ERRNO_CREATING_FILE_FAILED_WITH_EXCEPTION.format(
+                    "repo root directory", repo_root_dir, str(err)))
+
+            self.collect_copy_results(futures, errors, concurrent.futures.ALL_COMPLETED)
+
+        file_utils.clear_canonical_paths_cache()
+
+        if errors:
+            for error in errors:
+                logger.error(LOG_TAG, error)
+            return 1
+
+        for (dst_dir_path, mode) in reversed(dir_modes):
+            try:
+                os.chmod(dst_dir_path, mode)
+            except OSError as err:
+                logger.error(LOG_TAG, "Failed to set mode of directory at path \"" + dst_dir_path + "\"" +
+                             ": " + str(err))
+                return 1
+
+        logger.debug(LOG_TAG, "Checked out source with local_copy_mode \"" + checkout_config.local_copy_mode + "\": " +
+                     (", ".join([result + ": " + str(count) for result, count in self.results.items()]) or "no files"))
+
+        return 0
+
+
+
+    def get_checkout_state(self):
+        checkout_config = self.checkout_config
+        return {
+            "checkout_type": checkout_config.checkout_type,
+            "src_url": checkout_config.src_url,
+            "sparse_checkout": checkout_config.sparse_checkout,
+            "sparse_checkout_cone_mode": checkout_config.sparse_checkout_cone_mode,
+            "local_copy_mode": checkout_config.local_copy_mode
+        }
+
+
+
+    def walk_src_dir(self, executor, futures, errors, matcher, src_dir_path, dst_dir_path, rel_dir_path, dir_modes,
+                     dst_dir_exists):
+        """
+        Walk the source directory and submit jobs to copy the included
+        files to the destination directory. If the number of pending jobs
+        reaches `MAX_PENDING_FILES_PER_JOB` per job, then the walk waits
+        for at least one of them to complete.
+
+        The destination directory is only created once a file under it
+        is included, so that directories excluded by the sparse checkout
+        are not created.
+        """
+
+        dir_fully_included = matcher is None or (bool(rel_dir_path) and matcher.is_dir_included(rel_dir_path))
+
+        with os.scandir(src_dir_path) as entries:
+            for entry in entries:
+                rel_path = rel_dir_path + "/" + entry.name if rel_dir_path else entry.name
+                dst_path = os.path.join(dst_dir_path, entry.name)
+
+                if entry.is_dir(follow_symlinks=False):
+                    if not dir_fully_included and not matcher.should_walk_dir(rel_path):
+                        continue
+
+                    sub_dst_dir_exists = False
+                    if dir_fully_included or matcher.is_dir_included(rel_path):
+                        if not dst_dir_exists:
+                            os.makedirs(dst_dir_path, exist_ok=True)
+                            dst_dir_exists = True
+                        os.makedirs(dst_path, exist_ok=True)
+                        dir_modes.append((dst_path, stat.S_IMODE(entry.stat(follow_symlinks=False).st_mode) | stat.S_IRWXU))
+                        sub_dst_dir_exists = True
+
+                    self.walk_src_dir(executor, futures, errors, None if dir_fully_included else matcher,
+                                      entry.path, dst_path, rel_path, dir_modes, sub_dst_dir_exists)
+                    continue
+
+                if not dir_fully_included and not matcher.is_path_included(rel_path, False):
+                    continue
+
+                if not dst_dir_exists:
+                    os.makedirs(dst_dir_path, exist_ok=True)
+                    dst_dir_exists = True
+
+                futures[executor.submit(self.copy_file, entry.path, dst_path,
+                                        entry.stat(follow_symlinks=False))] = dst_path
+                if len(futures) >= self.jobs * LocalSrcProvider.MAX_PENDING_FILES_PER_JOB:
+                    self.collect_copy_results(futures, errors, concurrent.futures.FIRST_COMPLETED)
+
+    def collect_copy_results(self, futures, errors, return_when):
+        """
+        Wait for the copy jobs in `futures` as per `return_when`, and
+        remove the completed ones from it after adding their results to
+        `results` or their errors to `errors`.
+        """
+
+        (done, _) = concurrent.futures.wait(futures, return_when=return_when)
+        for future in done:
+            dst_path = futures.pop(future)
+            try:
+                result = future.result()
+            except OSError as err:
+                errors.append(file_utils_errno.ERRNO_CREATING_FILE_FAILED_WITH_EXCEPTION.format(
+                    "file", dst_path, str(err)))
+                continue
+            self.results[result] += 1
+
+    def copy_file(self, src_path, dst_path, src_stat):
+        """
+        Copy the file at `src_path` to `dst_path` as per the
+        `local_copy_mode`.
+
+        @returns Returns the result of how the file was copied.
+        """
+
+        local_copy_mode = self.checkout_config.local_copy_mode
+
+        if stat.S_ISLNK(src_stat.st_mode):
+            self.run_replacing_existing(dst_path, os.symlink, os.readlink(src_path), dst_path)
+            return "symlinked"
+
+        if not stat.S_ISREG(src_stat.st_mode):
+            logger.verbose(LOG_TAG, "Ignoring non-regular file at path \"" + src_path + "\"")
+            return "ignored"
+
+        if local_copy_mode == "hardlink":
+            self.run_replacing_existing(dst_path, os.link, src_path, dst_path, follow_symlinks=False)
+            return "hardlinked"
+
+        if local_copy_mode in ["auto", "reflink"] and (self.reflink_supported or local_copy_mode == "reflink"):
+            try:
+                self.run_replacing_existing(dst_path, self.reflink_file, src_path, dst_path)
+                return "reflinked"
+            except OSError as err:
+                if local_copy_mode == "reflink" or err.errno not in LocalSrcProvider.REFLINK_UNSUPPORTED_ERRNOS:
+                    raise
+                if self.reflink_supported:
+                    logger.verbose(LOG_TAG, "Reflinks not supported, copying files instead: " + str(err))
+                    self.reflink_supported = False
+
+        # Read-only files are hardlinked since they are not expected to
+        # be modified in place.
+        if local_copy_mode == "auto" and not src_stat.st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH):
+            try:
+                self.run_replacing_existing(dst_path, os.link, src_path, dst_path, follow_symlinks=False)
+                return "hardlinked"
+            except OSError as err:
+                if err.errno not in [errno.EXDEV, errno.EPERM, errno.EMLINK]:
+                    raise
+
+        shutil.copy2(src_path, dst_path, follow_symlinks=False)
+        return "copied"
+
+    @staticmethod
+    def reflink_file(src_path, dst_path):
+        "Clone the regular file at `src_path` to `dst_path` with a reflink."
+
+        if fcntl is None:
+            raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported on current platform")
+
+        with open(src_path, "rb") as src_file:
+            with open(dst_path, "xb") as dst_file:
+                try:
+                    fcntl.ioctl(dst_file.fileno(), LocalSrcProvider.FICLONE, src_file.fileno())
+                except OSError:
+                    os.unlink(dst_path)
+                    raise
+
+        shutil.copystat(src_path, dst_path, follow_symlinks=False)
+
+    @staticmethod
+    def run_replacing_existing(dst_path, function, *args, **kwargs):
+        """
+        Run `function` to create the file at `dst_path`, and if a file
+        already exists at it, like if the root directory was not deleted
+        before checkout, then delete it and run `function` again.
+        """
+
+        try:
+            function(*args, **kwargs)
+        except FileExistsError:
+            os.unlink(dst_path)
+            function(*args, **kwargs)
@@ -0,0 +1,176 @@
+import re
+
+class SparseCheckoutMatcher:
+    """
+    Matcher for the paths to include for a `sparse_checkout` of a
+    local checkout, with the same semantics as `git sparse-checkout`.
+
+    In `cone` mode, the patterns are directories, and all paths under
+    them and the files immediately under their leading directories,
+    including the top-level directory, are included.
+
+    In `no-cone` mode, the patterns are `gitignore-style` patterns that
+    select what to include, where a pattern matching a directory
+    includes all paths under it, and the last matching pattern wins
+    so that negated patterns can exclude paths again.
+
+    - https://git-scm.com/docs/git-sparse-checkout#_internalscone_pattern_set
+    - https://git-scm.com/docs/gitignore#_pattern_format
+    """
+
+    __slots__ = ("cone_mode", "cone_dirs", "cone_leading_dirs", "patterns")
+
+    def __init__(self, cone_mode, *, _not_called_from_create=True):
+        if _not_called_from_create:
+            raise RuntimeError("Object must be created with SparseCheckoutMatcher.create()")
+
+        self.cone_mode = cone_mode
+        self.cone_dirs = set()
+        self.cone_leading_dirs = set()
+        # The list of `(regex, negated, dir_only, anchored)` tuples.
+        self.patterns = []
+
+    @classmethod
+    def create(cls, sparse_checkout, cone_mode):
+        matcher = cls(cone_mode, _not_called_from_create=False)
+
+        for line in sparse_checkout:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            if cone_mode:
+                cone_dir = line.strip("/")
+                if not cone_dir:
+                    continue
+                matcher.cone_dirs.add(cone_dir)
+                parts = cone_dir.split("/")
+                for i in range(1, len(parts)):
+                    matcher.cone_leading_dirs.add("/".join(parts[:i]))
+            else:
+                negated = line.startswith("!")
+                if negated:
+                    line = line[1:]
+                elif line.startswith("\\!") or line.startswith("\\#"):
+                    line = line[1:]
+
+                dir_only = line.endswith("/")
+                line = line.rstrip("/")
+                anchored = "/" in line
+                line = line.lstrip("/")
+                if not line:
+                    continue
+
+                matcher.patterns.append((re.compile(cls.convert_pattern_to_regex(line)), negated, dir_only, anchored))
+
+        return (0, matcher)
+
+    @staticmethod
+    def convert_pattern_to_regex(pattern):
+        "Convert a `gitignore-style` pattern without leading and trailing slashes to a regex."
+
+        regex = ""
+        i = 0
+        length = len(pattern)
+        while i < length:
+            char = pattern[i]
+            if pattern.startswith("**/", i):
+                regex += "(?:.*/)?"
+                i += 3
+            elif pattern.startswith("/**", i) and i + 3 == length:
+                regex += "/.*"
+                i += 3
+            elif pattern.startswith("**", i):
+                regex += ".*"
+                i += 2
+            elif char == "*":
+                regex += "[^/]*"
+                i += 1
+            elif char == "?":
+                regex += "[^/]"
+                i += 1
+            elif char == "[":
+                end = pattern.find("]", i + 2)
+                if end == -1:
+                    regex += re.escape(char)
+                    i += 1
+                else:
+                    char_class = pattern[i + 1:end]
+                    if char_class.startswith("!"):
+                        char_class = "^" + char_class[1:]
+                    regex += "[" + char_class.replace("\\", "\\\\") + "]"
+                    i = end + 1
+            elif char == "\\" and i + 1 < length:
+                regex += re.escape(pattern[i + 1])
+                i += 2
+            else:
+                regex += re.escape(char)
+                i += 1
+
+        return regex + r"\Z"
+
+
+
+    def should_walk_dir(self, rel_dir_path):
+        "Check if the directory at the relative path may contain included paths."
+
+        if not self.cone_mode:
+            # A negated pattern may exclude the directory but include
+            # paths under it, so all directories must be walked.
+            return True
+
+        return rel_dir_path in self.cone_leading_dirs or self.is_in_cone_dirs(rel_dir_path)
+
+    def is_dir_included(self, rel_dir_path):
+        """
+        Check if all paths under the directory at the relative path are
+        included, so that the directory can be copied without matching
+        them.
+        """
+
+        if self.cone_mode:
+            return self.is_in_cone_dirs(rel_dir_path)
+
+        # The directory cannot be known to be fully included if any
+        # negated pattern could match paths under it.
+        if any(negated for (_, negated, _, _) in self.patterns):
+            return False
+
+        return self.is_path_included(rel_dir_path, True)
+
+    def is_path_included(self, rel_path, is_dir):
+        "Check if the file at the relative path is included."
+
+        if self.cone_mode:
+            rel_parent_path = rel_path.rpartition("/")[0]
+            return not rel_parent_path or rel_parent_path in self.cone_leading_dirs or \
+                self.is_in_cone_dirs(rel_parent_path) or (is_dir and self.is_in_cone_dirs(rel_path))
+
+        # Check the path and all its parent directories against each
+        # pattern, since a pattern matching a directory includes all
+        # the paths under it.
+        parts = rel_path.split("/")
+        candidates = []
+        for i in range(1, len(parts) + 1):
+            candidates.append(("/".join(parts[:i]), parts[i - 1], i < len(parts) or is_dir))
+
+        included = False
+        for (regex, negated, dir_only, anchored) in self.patterns:
+            for (candidate_path, candidate_name, candidate_is_dir) in candidates:
+                if dir_only and not candidate_is_dir:
+                    continue
+                if regex.match(candidate_path if anchored else candidate_name):
+                    included = not negated
+                    break
+
+        return included
+
+    def is_in_cone_dirs(self, rel_dir_path):
+        "Check if the directory at the relative path is or is under one of the cone directories."
+
+        while rel_dir_path:
+            if rel_dir_path in self.cone_dirs:
+                return True
+            rel_dir_path = rel_dir_path.rpartition("/")[0]
+
+        return False
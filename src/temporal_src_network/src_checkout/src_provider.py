@@ -6,3 +6,11 @@ class SrcProvider(metaclass=abc.ABCMeta):
     @abc.abstractmethod
     def checkout_src(self):
         raise NotImplementedError("Extended class must define 'SrcProvider.checkout_src()' method")
+
+    def get_checkout_state(self):
+        """
+        Get the `dict` of the state of the source checked out by
+        `checkout_src()` that is recorded in the `ProjectStateIndex`.
+        """
+
+        return None
@@ -1,18 +1,19 @@
 import os
 
-from . import symlinks_manager
-
 from ..data import data_utils
 from ..data.data_utils import log_value
 from ..file import file_utils
 from ..logger.logger_core import logger
-from ..shell import shell_utils
 
 LOG_TAG = "symlink_config"
 
 class SymlinkConfig():
     "Symlink config."
 
+    __slots__ = ("symlink_name", "target", "target_expanded", "target_expansions",
+                 "dest", "dest_expanded", "dest_expansions",
+                 "target_is_directory", "target_no_exist_mode", "dest_already_exists_mode")
+
     def __init__(self, symlink_name, *, _not_called_from_create=True):
         if _not_called_from_create:
             raise RuntimeError("Object must be created with SymlinkConfig.create()")
@@ -32,16 +33,16 @@ class SymlinkConfig():
         self.dest_already_exists_mode = "overwrite_only_if_symlink"
 
     @classmethod
-    def create(cls, label, project_config, symlink_name, symlink_config_dict, symlink_placeholder_expansions):
+    def create(cls, label, project_config, symlink_name, symlink_config_dict, symlinks_manager):
         symlink_config = cls(symlink_name, _not_called_from_create=False)
 
         (return_value, symlink_config.target, symlink_config.target_expanded, symlink_config.target_expansions) = \
-            cls.get_symlink_paths(label, symlink_name, symlink_config_dict, symlink_placeholder_expansions, "target")
+            cls.get_symlink_paths(label, symlink_name, symlink_config_dict, symlinks_manager, "target")
         if str(return_value) != "0":
             return (return_value, None)
 
         (return_value, symlink_config.dest, symlink_config.dest_expanded, symlink_config.dest_expansions) = \
-            cls.get_symlink_paths(label, symlink_name, symlink_config_dict, symlink_placeholder_expansions, "dest")
+            cls.get_symlink_paths(label, symlink_name, symlink_config_dict, symlinks_manager, "dest")
         if str(return_value) != "0":
             return (return_value, None)
 
@@ -50,6 +51,10 @@ class SymlinkConfig():
         if file_utils.is_path_absolute("dest symlink", symlink_config.dest_expanded) is not None:
             symlink_config.dest_expanded = os.path.join(project_config.project_root_dir, symlink_config.dest_expanded) # type: ignore
 
+        # The same unexpanded targets and dests are normally used for many
+        # versions, while the expanded ones are normally unique per version.
+        symlink_config.target = data_utils.intern_str(symlink_config.target)
+        symlink_config.dest = data_utils.intern_str(symlink_config.dest)
 
         symlink_config.target_is_directory = data_utils.get_bool_from_dict(
             symlink_config_dict, "target_is_directory", symlink_config.target_is_directory)
@@ -68,25 +73,21 @@ class SymlinkConfig():
 
 
 
-        logger.vverbose(LOG_TAG, label + " symlink_config:\n" + symlink_config.to_string() + "\n")
+        if logger.is_log_level_enabled(logger.LOG_LEVEL_VVERBOSE):
+            logger.vverbose(LOG_TAG, label + " symlink_config:\n" + symlink_config.to_string() + "\n")
 
         return (0, symlink_config)
 
     @classmethod
-    def get_symlink_paths(cls, label, symlink_name, symlink_config_dict, symlink_placeholder_expansions, key):
+    def get_symlink_paths(cls, label, symlink_name, symlink_config_dict, symlinks_manager, key):
         symlink_path = data_utils.get_str_from_dict(symlink_config_dict, key, None)
         symlink_expansions = data_utils.get_comma_separated_list_from_dict(
             symlink_config_dict, key + "_expansions", "env,placeholder", True)
 
         if symlink_path:
-            symlink_path_expanded = symlink_path
-
-            if "env" in symlink_expansions:
-                symlink_path_expanded = shell_utils.expand_env_vars(symlink_path_expanded)
-
-            if "placeholder" in symlink_expansions:
-                symlink_path_expanded = symlinks_manager.SymlinksManager.expand_symlink(
-                symlink_placeholder_expansions, symlink_path_expanded)
+            # The env variables and placeholders are expanded in a single pass
+            symlink_path_expanded = symlinks_manager.get_symlink_expander(
+                "env" in symlink_expansions, "placeholder" in symlink_expansions).expand(symlink_path)
 
             if not symlink_path_expanded:
                 logger.error(LOG_TAG, "The " + label + " symlink \"" + symlink_name + "\"" +
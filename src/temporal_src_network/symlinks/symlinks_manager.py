@@ -7,7 +7,11 @@ from ..symlinks.symlink_config import SymlinkConfig
 
 from ..data import data_utils
 from ..file import file_utils
+from ..file.dir_fd_batch import DirFdBatch
 from ..logger.logger_core import logger
+from ..shell import shell_utils
+from ..timing.run_metrics import run_metrics
+from ..timing.span_timer import span_timer
 
 LOG_TAG = "symlinks_manager"
 
@@ -18,9 +22,12 @@ class SymlinksManager:
         if _not_called_from_create:
             raise RuntimeError("Object must be created with SymlinksManager.create()")
 
+        self.label = None
         self.symlinks_list_level_mode = "add" # add|override
         self.symlink_configs = []
         self.symlink_placeholder_expansions = collections.OrderedDict()
+        self.symlink_expanders = {}
+        self.applied_symlinks = []
 
     @classmethod
     def create(cls, project_config, version_config):
@@ -70,15 +77,16 @@ class SymlinksManager:
                          " must be passed to CheckoutConfig.create()")
             return (1, None)
 
-        if symlinks_list:
+        if symlinks_list and logger.is_log_level_enabled(logger.LOG_LEVEL_VVERBOSE):
             logger.vverbose(LOG_TAG, "symlinks_list:\n" + json.dumps(symlinks_list, sort_keys=False, indent=4, default=str))
 
 
 
         symlinks_manager.symlink_placeholder_expansions = cls.get_symlink_placeholder_expansions_dict(
             project_config, version_config)
-        logger.vverbose(LOG_TAG, "symlink_placeholder_expansions:\n" +
-            json.dumps(symlinks_manager.symlink_placeholder_expansions, sort_keys=False, indent=4, default=str))
+        if logger.is_log_level_enabled(logger.LOG_LEVEL_VVERBOSE):
+            logger.vverbose(LOG_TAG, "symlink_placeholder_expansions:\n" +
+                json.dumps(symlinks_manager.symlink_placeholder_expansions, sort_keys=False, indent=4, default=str))
 
 
 
@@ -93,7 +101,7 @@ class SymlinksManager:
             logger.verbose(LOG_TAG, "Creating symlink_config for symlink " + str(i) + " \"" + symlink_name + "\"")
 
             (return_value, symlink_config) = SymlinkConfig.create(
-                label, project_config, symlink_name, symlink_config_dict, symlinks_manager.symlink_placeholder_expansions)
+                label, project_config, symlink_name, symlink_config_dict, symlinks_manager)
             if str(return_value) != "0":
                 return (return_value, None)
             if not symlink_config:
@@ -104,6 +112,21 @@ class SymlinksManager:
 
             i += 1
 
+        # Validate the paths of all symlinks so that errors for all
+        # invalid paths are reported before any symlink is created.
+        errors = file_utils.get_invalid_paths_errors(
+            [(label + " symlink \"" + symlink_config.symlink_name + "\" dest", symlink_config.dest_expanded)
+             for symlink_config in symlink_configs])
+        # Allow non absolute target paths
+        errors.extend(file_utils.get_invalid_paths_errors(
+            [(label + " symlink \"" + symlink_config.symlink_name + "\" target", symlink_config.target_expanded)
+             for symlink_config in symlink_configs], ensure_absolute=False))
+        if errors:
+            for error in errors:
+                logger.error(LOG_TAG, error)
+            return (1, None)
+
+        symlinks_manager.label = label
         symlinks_manager.symlink_configs = symlink_configs
 
         return (0, symlinks_manager)
@@ -126,57 +149,195 @@ class SymlinksManager:
 
         return expansions
 
-    @staticmethod
-    def expand_symlink(expansions, symlink):
-        # Replace "@KEY_NAME@" placeholders with its real value
-        for key, value in expansions.items():
-            key_placeholder = "@" + key + "@"
-            if key_placeholder in symlink:
-                symlink = symlink.replace(key_placeholder, value)
+    def get_symlink_expander(self, expand_env, expand_placeholders):
+        """
+        Get the `Expander` for the symlink paths that expands env variables
+        if `expand_env` is `True` and the symlink placeholders if
+        `expand_placeholders` is `True`.
+
+        The expanders are cached so that the expansions of the same paths
+        are only done once. The env only expander is shared for the run.
+        """
+
+        if expand_env and not expand_placeholders:
+            return shell_utils.ENV_VARS_EXPANDER
+
+        key = (expand_env, expand_placeholders)
+        expander = self.symlink_expanders.get(key)
+        if expander is None:
+            expander = shell_utils.Expander(
+                expand_env, self.symlink_placeholder_expansions if expand_placeholders else None)
+            self.symlink_expanders[key] = expander
+
+        return expander
+
+
+
+    def create_symlinks(self, reconcile=False):
+        """
+        Create the symlinks.
+
+        If `reconcile` is `True`, then the current target of each symlink
+        destination is read with `readlink()` first, and symlinks that
+        already point to the expected target are left untouched, so that
+        only the symlinks that differ are created or retargeted, and the
+        diff is reported.
+        """
+
+        logger.debug(LOG_TAG, ("Reconcile" if reconcile else "Create") + " symlinks")
+
+        # The symlinks are created in the same order as they are defined
+        # since symlinks may target or be created under earlier symlinks,
+        # but the parent directory of each symlink destination is only
+        # opened once and symlinks are created relative to it.
+        # The paths were already validated when symlink_configs were created.
+        diff = []
+        # The `[dest, target]` of the symlinks that exist after creation
+        self.applied_symlinks = []
+        with span_timer.span("create_symlinks"), DirFdBatch() as dir_fd_batch:
+            i = 1
+            for symlink_config in self.symlink_configs:
+                label = "(" + str(i) + ") " + symlink_config.symlink_name
+                i += 1
+
+                current_target = None
+                if reconcile:
+                    current_target = dir_fd_batch.readlink(symlink_config.dest_expanded)
+                    if current_target == symlink_config.target_expanded:
+                        logger.verbose(LOG_TAG, "Ignoring creation of " + label + " symlink since it" +
+                                       " already points to \"" + current_target + "\"")
+                        dir_fd_batch.add_result(symlink_config.dest_expanded, "unchanged")
+                        self.applied_symlinks.append([symlink_config.dest_expanded, symlink_config.target_expanded])
+                        run_metrics.inc("symlinks_total", labels={"result": "unchanged"})
+                        continue
+
+                logger.verbose(LOG_TAG, "Processing creation of " + label + " symlink")
+                dir_fd_batch.last_result = None
+                error = file_utils.create_symlink_file(
+                    LOG_TAG,
+                    label,
+                    symlink_config.target_expanded, symlink_config.dest_expanded,
+                    symlink_config.target_is_directory, symlink_config.target_no_exist_mode,
+                    symlink_config.dest_already_exists_mode,
+                    validate_paths=False, dir_fd_batch=dir_fd_batch)
+                if error is not None:
+                    logger.error(LOG_TAG, error)
+                    logger.error(LOG_TAG, "symlink_config:\n" + symlink_config.to_string())
+                    return 1
+
+                if dir_fd_batch.last_result not in [None, "ignored"]:
+                    self.applied_symlinks.append([symlink_config.dest_expanded, symlink_config.target_expanded])
+                run_metrics.inc("symlinks_total", labels={"result": dir_fd_batch.last_result or "unchanged"})
+
+                if reconcile and dir_fd_batch.last_result not in [None, "ignored"]:
+                    if current_target is not None:
+                        diff.append("~ \"" + symlink_config.dest_expanded + "\" -> \"" + symlink_config.target_expanded +
+                                    "\" (was \"" + current_target + "\")")
+                    elif dir_fd_batch.last_result == "created":
+                        diff.append("+ \"" + symlink_config.dest_expanded + "\" -> \"" + symlink_config.target_expanded + "\"")
+                    else:
+                        diff.append("~ \"" + symlink_config.dest_expanded + "\" -> \"" + symlink_config.target_expanded +
+                                    "\" (was not a symlink)")
+
+            if dir_fd_batch.dir_results:
+                logger.debug(LOG_TAG, "Symlinks per destination directory:\n" + dir_fd_batch.get_results_summary())
+
+        if reconcile:
+            self.log_symlinks_diff(diff)
 
-        return symlink
+        return 0
 
+    def remove_symlinks(self, reconcile=False):
+        """
+        Remove the symlinks.
 
+        If `reconcile` is `True`, then symlinks are only removed if they
+        still point to the expected target, and symlinks that point
+        elsewhere, like if they were retargeted by another manifest, are
+        left untouched.
+        """
 
-    def create_symlinks(self):
-        logger.debug(LOG_TAG, "Create symlinks")
+        logger.debug(LOG_TAG, "Remove symlinks")
 
-        i = 1
-        for symlink_config in self.symlink_configs:
-            label = "(" + str(i) + ") " + symlink_config.symlink_name
-            logger.verbose(LOG_TAG, "Processing creation of " + label + " symlink")
-            error = file_utils.create_symlink_file(
-                LOG_TAG,
-                label,
-                symlink_config.target_expanded, symlink_config.dest_expanded,
-                symlink_config.target_is_directory, symlink_config.target_no_exist_mode,
-                symlink_config.dest_already_exists_mode)
-            if error is not None:
-                logger.error(LOG_TAG, error)
-                logger.error(LOG_TAG, "symlink_config:\n" + symlink_config.to_string())
-                return 1
-
-            i += 1
+        diff = []
+        with span_timer.span("remove_symlinks"), DirFdBatch() as dir_fd_batch:
+            i = 1
+            for symlink_config in self.symlink_configs:
+                label = "(" + str(i) + ") " + symlink_config.symlink_name
+                i += 1
+
+                if reconcile:
+                    current_target = dir_fd_batch.readlink(symlink_config.dest_expanded)
+                    if current_target is None:
+                        logger.verbose(LOG_TAG, "Ignoring removal of " + label + " symlink since it does not exist")
+                        continue
+                    elif current_target != symlink_config.target_expanded:
+                        logger.verbose(LOG_TAG, "Ignoring removal of " + label + " symlink since it" +
+                                       " points to \"" + current_target + "\" instead of" +
+                                       " \"" + symlink_config.target_expanded + "\"")
+                        continue
+
+                logger.verbose(LOG_TAG, "Processing removal of " + label + " symlink")
+                error = file_utils.delete_symlink_file(
+                    LOG_TAG,
+                    label,
+                    symlink_config.dest_expanded,
+                    ignore_non_existent_file=True)
+                if error is not None:
+                    logger.error(LOG_TAG, error)
+                    logger.error(LOG_TAG, "symlink_config:\n" + symlink_config.to_string())
+                    return 1
+
+                if reconcile:
+                    dir_fd_batch.invalidate(symlink_config.dest_expanded)
+                    diff.append("- \"" + symlink_config.dest_expanded + "\" -> \"" + symlink_config.target_expanded + "\"")
+
+        if reconcile:
+            self.log_symlinks_diff(diff)
 
         return 0
 
-    def remove_symlinks(self):
-        logger.debug(LOG_TAG, "Remove symlinks")
+    @staticmethod
+    def remove_recorded_symlinks(label, symlinks):
+        """
+        Remove the symlinks recorded in a `ProjectStateIndex`, but only if
+        they still point to their recorded target.
+
+        @param label The label for the project or version of the symlinks.
+        @param symlinks The `list` of `[dest, target]` of the symlinks.
+        @returns Returns `0` if successful, otherwise the error code.
+        """
+
+        removed_count = 0
+        with span_timer.span("remove_recorded_symlinks"), DirFdBatch() as dir_fd_batch:
+            for (dest, target) in symlinks:
+                current_target = dir_fd_batch.readlink(dest)
+                if current_target is None:
+                    continue
+                elif current_target != target:
+                    logger.verbose(LOG_TAG, "Ignoring removal of recorded " + label + " symlink at \"" + dest + "\"" +
+                                   " since it points to \"" + current_target + "\" instead of \"" + target + "\"")
+                    continue
+
+                logger.verbose(LOG_TAG, "Removing recorded " + label + " symlink at \"" + dest + "\"")
+                error = file_utils.delete_symlink_file(LOG_TAG, label, dest, ignore_non_existent_file=True)
+                if error is not None:
+                    logger.error(LOG_TAG, error)
+                    return 1
+
+                dir_fd_batch.invalidate(dest)
+                removed_count += 1
+
+        if symlinks:
+            logger.debug(LOG_TAG, "Removed " + str(removed_count) + " of " + str(len(symlinks)) +
+                         " recorded " + label + " symlinks")
 
-        i = 1
-        for symlink_config in self.symlink_configs:
-            label = "(" + str(i) + ") " + symlink_config.symlink_name
-            logger.verbose(LOG_TAG, "Processing removal of " + label + " symlink")
-            error = file_utils.delete_symlink_file(
-                LOG_TAG,
-                label,
-                symlink_config.dest_expanded,
-                ignore_non_existent_file=True)
-            if error is not None:
-                logger.error(LOG_TAG, error)
-                logger.error(LOG_TAG, "symlink_config:\n" + symlink_config.to_string())
-                return 1
+        return 0
 
-            i += 1
+    def log_symlinks_diff(self, diff):
+        "Log the diff of symlinks that were changed while reconciling."
 
-        return 0
+        logger.info(LOG_TAG, "Reconciled " + str(len(self.symlink_configs)) + " " + self.label + " symlinks" +
+                    " with " + str(len(diff)) + " changed")
+        if diff:
+            logger.debug(LOG_TAG, self.label + " symlinks diff:\n" + "\n".join(diff))
@@ -9,45 +9,90 @@ License:         MIT
 
 import argparse
 import collections
+import concurrent.futures
+import contextlib
+import io
+import itertools
 import json
 import os
 import re
 import select
+import shutil
 import sys
+import tempfile
+import time
 
 from .data import data_utils
+from .data import yaml_utils
 from .file import file_utils
+from .file.background_deleter import BackgroundDeleter
 from .logger.logger_core import logger
+from .manifest import manifests_cache
 from .manifest.module_config import ModuleConfig
 from .manifest.modules_config import ModulesConfig
 from .manifest.project_config import ProjectConfig
+from .manifest.project_state_index import ProjectStateIndex
 from .src_checkout import src_provider as src_provider_lib
+from .src_checkout.effective_src_checkout_config import EffectiveSrcCheckoutConfig
+from .src_checkout.git import git_ref_utils
 from .src_checkout.git.git_checkout_config import GitCheckoutConfig
 from .src_checkout.git.git_src_provider import GitSrcProvider
 from .src_checkout.ignore.ignore_checkout_config import IgnoreCheckoutConfig
 from .src_checkout.ignore.ignore_src_provider import IgnoreSrcProvider
+from .src_checkout.local.local_checkout_config import LocalCheckoutConfig
+from .src_checkout.local.local_src_provider import LocalSrcProvider
 from .symlinks.symlinks_manager import SymlinksManager
-
-import importlib.util # pylint: disable=wrong-import-order
-YAML_SUPPORTED = False
-try:
-    if importlib.util.find_spec("ruamel.yaml") is not None:
-        import ruamel.yaml # type: ignore # pylint: disable=import-error
-        YAML_SUPPORTED = True
-except Exception:
-    pass
+from .timing.run_metrics import run_metrics
+from .timing.span_timer import span_timer
+from .timing.subprocess_stats import subprocess_stats
 
 VERSION = "0.1.0"
 
 LOG_TAG = "temporal_src_network"
 
+REGEX_FILE_FD = '^((/proc/self)|(/dev))/fd/[0-9]+$'
+REGEX_IO_FD = '^((/proc/self)|(/dev))/fd/[0-2]$'
+
 PRIVATE_FIELDS_LIST = ["git_auth_token"]
 
-RUAMEL_YAML_INSTALL_INSTRUCTIONS = \
-"""Install ruamel.yaml by running following commands.
-android/termux: "pip install ruamel.yaml"
-debian/ubuntu: "sudo apt install python3-pip; sudo pip3 install ruamel.yaml"
-For more info, check https://yaml.readthedocs.io/en/latest/install.html."""
+STATUS_DRIFTED_EXIT_CODE = 2
+"The exit code of the `status` command if any project or version drifted from the manifest."
+
+BACKGROUND_DELETER = None
+"""
+The `BackgroundDeleter` used to delete root directories in background
+if `--fast-remove` argument is passed, otherwise `None`.
+"""
+
+RECONCILE_SYMLINKS = False
+"""
+Whether symlinks should be reconciled with the symlinks that already
+exist, if `--reconcile-symlinks` or `--symlinks-only` argument is passed.
+"""
+
+SYMLINKS_ONLY = False
+"""
+Whether only symlinks should be processed, without checking out sources
+or deleting root directories, if `--symlinks-only` argument is passed.
+"""
+
+JOBS = 8
+"""
+The number of parallel jobs to run, as per the `--jobs` argument.
+"""
+
+PRUNE_ORPHANS = False
+"""
+Whether the root directories of the versions and modules that are not
+in the manifest anymore should be removed by the `setup` command, if
+`--prune-orphans` argument is passed.
+"""
+
+JSONL_DECODER = json.JSONDecoder()
+"""
+The decoder for the `jsonl` manifests. Each line is decoded into a
+`dict`, which preserves the order of keys, instead of an `OrderedDict`.
+"""
 
 
 
@@ -67,7 +112,7 @@ def process_project(command_type, project_config):
         return 1
 
 
-    if project_config.src_checkout_dict:
+    if command_type == "setup" and project_config.src_checkout_dict and not SYMLINKS_ONLY:
         (return_value, src_provider) = get_project_src_provider(command_type, project_config)
         if str(return_value) != "0":
             return return_value
@@ -78,7 +123,10 @@ def process_project(command_type, project_config):
         src_provider = None
 
 
-    if project_config.symlinks_dict:
+    # The symlinks recorded in the state index are removed instead of
+    # the symlinks in the manifest, so they do not need to be expanded.
+    if project_config.symlinks_dict and \
+            not (command_type == "remove" and project_config.state_index.get_project_state() is not None):
         (return_value, symlinks_manager) = SymlinksManager.create(project_config, None)
         if str(return_value) != "0":
             return return_value
@@ -90,9 +138,11 @@ def process_project(command_type, project_config):
 
 
     if command_type == "setup":
-        return_value = setup_project(project_config, src_provider, symlinks_manager)
+        with span_timer.span("setup_project"):
+            return_value = setup_project(project_config, src_provider, symlinks_manager)
     elif command_type == "remove":
-        return_value = remove_project(project_config, symlinks_manager)
+        with span_timer.span("remove_project"):
+            return_value = remove_project(project_config, symlinks_manager)
     else:
         logger.error(LOG_TAG, "The project command_type \"" + command_type + "\" is not handled")
         return 1
@@ -104,16 +154,19 @@ def setup_project(project_config, src_provider, symlinks_manager):
 
     project_root_dir = project_config.project_root_dir
 
-    if "setup" in project_config.remove_project_root_dir_for_commands:
+    if "setup" in project_config.remove_project_root_dir_for_commands and not SYMLINKS_ONLY:
         # Remove project_root_dir if it already exists
-        error = file_utils.delete_normal_file(LOG_TAG, "project root", project_root_dir)
+        error = delete_root_dir("project root", project_root_dir)
         if error is not None:
             logger.error(LOG_TAG, error)
             return 1
 
+        project_config.state_index.clear()
+
     if src_provider:
         logger.log_verbose_no_format("")
-        return_value = src_provider.checkout_src()
+        with span_timer.span("checkout"):
+            return_value = src_provider.checkout_src()
         if str(return_value) != "0":
             logger.error(LOG_TAG, "Failed to checkout source for project")
             return return_value
@@ -125,29 +178,56 @@ def setup_project(project_config, src_provider, symlinks_manager):
 
     if symlinks_manager and symlinks_manager.symlink_configs:
         logger.log_verbose_no_format("")
-        return_value = symlinks_manager.create_symlinks()
+        return_value = symlinks_manager.create_symlinks(RECONCILE_SYMLINKS)
         if str(return_value) != "0":
             logger.error(LOG_TAG, "Failed to create symlinks for project")
             return return_value
 
+    state_index = project_config.state_index
+    applied_symlinks = symlinks_manager.applied_symlinks if symlinks_manager else []
+    return_value = remove_stale_symlinks("project", state_index.get_project_state(), applied_symlinks)
+    if str(return_value) != "0":
+        logger.error(LOG_TAG, "Failed to remove stale symlinks for project")
+        return return_value
+
+    if src_provider:
+        state_index.set_project_state(src_provider.get_checkout_state(), applied_symlinks,
+                                      get_checkout_stat_snapshot(project_root_dir))
+    else:
+        state_index.set_project_state(None, applied_symlinks)
+
     return 0
 
 def remove_project(project_config, symlinks_manager):
     "Run remove command for the project."
 
     project_root_dir = project_config.project_root_dir
+    state_index = project_config.state_index
 
-    if symlinks_manager and symlinks_manager.symlink_configs:
+    project_state = state_index.get_project_state()
+    if project_state is not None:
+        logger.log_verbose_no_format("")
+        return_value = SymlinksManager.remove_recorded_symlinks("project", ProjectStateIndex.get_symlinks(project_state))
+        if str(return_value) != "0":
+            logger.error(LOG_TAG, "Failed to remove recorded symlinks for the project")
+            return return_value
+    elif symlinks_manager and symlinks_manager.symlink_configs:
         logger.log_verbose_no_format("")
-        return_value = symlinks_manager.remove_symlinks()
+        return_value = symlinks_manager.remove_symlinks(RECONCILE_SYMLINKS)
         if str(return_value) != "0":
             logger.error(LOG_TAG, "Failed to remove symlinks for the project")
             return return_value
 
-    if "remove" in project_config.remove_project_root_dir_for_commands:
+    if SYMLINKS_ONLY:
+        if project_state is not None:
+            state_index.set_project_state(None, [])
+    else:
+        state_index.remove_project_state()
+
+    if "remove" in project_config.remove_project_root_dir_for_commands and not SYMLINKS_ONLY:
         logger.log_verbose_no_format("")
         # Remove project_root_dir if it already exists
-        error = file_utils.delete_normal_file(LOG_TAG, "project root", project_root_dir)
+        error = delete_root_dir("project root", project_root_dir)
         if error is not None:
             logger.error(LOG_TAG, error)
             return 1
@@ -185,7 +265,7 @@ def process_module(module_num, command_type, project_config, modules_config, mod
 
         version_root_dir = version_config.version_root_dir
         if not version_root_dir or not os.path.isabs(version_root_dir) or \
-            not file_utils.is_path_in_dir_path(version_root_dir, project_config.project_root_dir, True):
+            not project_config.paths_index.is_path_in_project_root_dir(version_root_dir, True):
             logger.error(LOG_TAG, "The " + version_label +
                          " root_dir \"" + version_root_dir + "\" must be set and be an" +
                          " absolute path that is under project_root_dir \"" + project_config.project_root_dir + "\"")
@@ -193,132 +273,398 @@ def process_module(module_num, command_type, project_config, modules_config, mod
 
         logger.debug(LOG_TAG, "version_root_dir: \"" + version_root_dir + "\"")
 
-        if command_type == "setup":
-            (return_value, src_provider) = get_version_src_provider(
-                command_type, modules_config, module_config, version_config)
+        with span_timer.span(command_type + "_version", module=module_config.module_name,
+                             version=version_config.version_name):
+            return_value = process_version(version_label, command_type, project_config, modules_config, version_config)
             if str(return_value) != "0":
-                return return_value
-            if not src_provider or not isinstance(src_provider, src_provider_lib.SrcProvider):
-                logger.error(LOG_TAG, "Failed to create src_provider for " + version_label)
-                return 1
-        else:
-            src_provider = None
-
-        (return_value, symlinks_manager) = SymlinksManager.create(project_config, version_config)
+                run_metrics.inc("versions_total", labels={"command": command_type, "result": "failed"})
         if str(return_value) != "0":
             return return_value
-        if not symlinks_manager or not isinstance(symlinks_manager, SymlinksManager):
-            logger.error(LOG_TAG, "Failed to create symlinks_manager for " + version_label)
-            return 1
 
-        if command_type == "setup":
-            return_value = setup_version(version_label, version_config, src_provider, symlinks_manager)
-        elif command_type == "remove":
-            return_value = remove_version(version_label, version_config, symlinks_manager)
-        else:
-            logger.error(LOG_TAG, "The module command_type \"" + command_type + "\" is not handled")
-            return 1
+        version_num += 1
 
+    if command_type == "remove" and not SYMLINKS_ONLY:
+        return_value = remove_module(project_config, module_config)
+    else:
+        return_value = 0
+
+    return return_value
+
+def process_version(version_label, command_type, project_config, modules_config, version_config):
+    "Process version."
+
+    if command_type == "setup" and not SYMLINKS_ONLY:
+        (return_value, src_provider) = get_version_src_provider(
+            command_type, modules_config, version_config)
         if str(return_value) != "0":
             return return_value
+        if not src_provider or not isinstance(src_provider, src_provider_lib.SrcProvider):
+            logger.error(LOG_TAG, "Failed to create src_provider for " + version_label)
+            return 1
+    else:
+        src_provider = None
 
-        version_num += 1
+    # The symlinks recorded in the state index are removed instead of
+    # the symlinks in the manifest, so they do not need to be expanded.
+    if command_type == "remove" and project_config.state_index.get_version_state(
+            version_config.module_config.module_name, version_config.version_name) is not None:
+        symlinks_manager = None
+    else:
+        (return_value, symlinks_manager) = SymlinksManager.create(project_config, version_config)
+        if str(return_value) != "0":
+            return return_value
+        if not symlinks_manager or not isinstance(symlinks_manager, SymlinksManager):
+            logger.error(LOG_TAG, "Failed to create symlinks_manager for " + version_label)
+            return 1
 
-    if command_type == "remove":
-        return_value = remove_module(module_config)
+    if command_type == "setup":
+        return_value = setup_version(version_label, project_config, version_config, src_provider, symlinks_manager)
+        result = "skipped" if src_provider is None or isinstance(src_provider, IgnoreSrcProvider) else "checked_out"
+    elif command_type == "remove":
+        return_value = remove_version(version_label, project_config, version_config, symlinks_manager)
+        result = "removed"
     else:
-        return_value = 0
+        logger.error(LOG_TAG, "The module command_type \"" + command_type + "\" is not handled")
+        return 1
+
+    if str(return_value) == "0":
+        run_metrics.inc("versions_total", labels={"command": command_type, "result": result})
 
     return return_value
 
-def setup_version(version_label, version_config, src_provider, symlinks_manager):
+def setup_version(version_label, project_config, version_config, src_provider, symlinks_manager):
     "Run setup command for a version."
 
-    if "setup" in version_config.remove_version_root_dir_for_commands:
+    if "setup" in version_config.remove_version_root_dir_for_commands and not SYMLINKS_ONLY:
         # Remove version_root_dir if it already exists
-        error = file_utils.delete_normal_file(LOG_TAG, "version root", version_config.version_root_dir)
+        error = delete_root_dir("version root", version_config.version_root_dir, project_config.project_root_dir)
         if error is not None:
             logger.error(LOG_TAG, error)
             return 1
 
-    logger.log_verbose_no_format("")
-    return_value = src_provider.checkout_src()
-    if str(return_value) != "0":
-        logger.error(LOG_TAG, "Failed to checkout source for " + version_label)
-        return return_value
+    if src_provider:
+        logger.log_verbose_no_format("")
+        with span_timer.span("checkout"):
+            return_value = src_provider.checkout_src()
+        if str(return_value) != "0":
+            logger.error(LOG_TAG, "Failed to checkout source for " + version_label)
+            return return_value
 
     if symlinks_manager and symlinks_manager.symlink_configs:
         logger.log_verbose_no_format("")
-        return_value = symlinks_manager.create_symlinks()
+        return_value = symlinks_manager.create_symlinks(RECONCILE_SYMLINKS)
         if str(return_value) != "0":
             logger.error(LOG_TAG, "Failed to create symlinks for " + version_label)
             return return_value
 
+    state_index = project_config.state_index
+    module_config = version_config.module_config
+    applied_symlinks = symlinks_manager.applied_symlinks if symlinks_manager else []
+    return_value = remove_stale_symlinks(version_label, state_index.get_version_state(
+        module_config.module_name, version_config.version_name), applied_symlinks)
+    if str(return_value) != "0":
+        logger.error(LOG_TAG, "Failed to remove stale symlinks for " + version_label)
+        return return_value
+
+    if src_provider:
+        state_index.set_version_state(module_config, version_config, src_provider.get_checkout_state(),
+                                      applied_symlinks, get_checkout_stat_snapshot(version_config.version_root_dir))
+    else:
+        state_index.set_version_state(module_config, version_config, None, applied_symlinks)
+
     return 0
 
-def remove_version(version_label, version_config, symlinks_manager):
+def remove_version(version_label, project_config, version_config, symlinks_manager):
     "Run remove command for a version."
 
-    if symlinks_manager and symlinks_manager.symlink_configs:
+    state_index = project_config.state_index
+    module_config = version_config.module_config
+
+    version_state = state_index.get_version_state(module_config.module_name, version_config.version_name)
+    if version_state is not None:
         logger.log_verbose_no_format("")
-        return_value = symlinks_manager.remove_symlinks()
+        return_value = SymlinksManager.remove_recorded_symlinks(version_label, ProjectStateIndex.get_symlinks(version_state))
+        if str(return_value) != "0":
+            logger.error(LOG_TAG, "Failed to remove recorded symlinks for " + version_label)
+            return return_value
+    elif symlinks_manager and symlinks_manager.symlink_configs:
+        logger.log_verbose_no_format("")
+        return_value = symlinks_manager.remove_symlinks(RECONCILE_SYMLINKS)
         if str(return_value) != "0":
             logger.error(LOG_TAG, "Failed to remove symlinks for " + version_label)
             return return_value
 
-    if "remove" in version_config.remove_version_root_dir_for_commands:
+    if SYMLINKS_ONLY:
+        if version_state is not None:
+            state_index.set_version_state(module_config, version_config, None, [])
+        return 0
+
+    if "remove" in version_config.remove_version_root_dir_for_commands and not SYMLINKS_ONLY:
         logger.log_verbose_no_format("")
 
         # Remove version_root_dir if it already exists
-        error = file_utils.delete_normal_file(LOG_TAG, "version root", version_config.version_root_dir)
+        error = delete_root_dir("version root", version_config.version_root_dir, project_config.project_root_dir)
         if error is not None:
             logger.error(LOG_TAG, error)
             return 1
 
+    state_index.remove_version_state(module_config.module_name, version_config.version_name)
+
     return 0
 
-def remove_module(module_config):
+def remove_module(project_config, module_config):
     "Run remove command for a module."
 
     if "remove" in module_config.remove_module_root_dir_for_commands:
         logger.log_debug_no_format("")
 
         # Remove module_root_dir if it already exists
-        error = file_utils.delete_normal_file(LOG_TAG, "module root", module_config.module_root_dir)
+        error = delete_root_dir("module root", module_config.module_root_dir, project_config.project_root_dir)
         if error is not None:
             logger.error(LOG_TAG, error)
             return 1
 
+        project_config.state_index.remove_module_state(module_config.module_name)
+    else:
+        module_state = project_config.state_index.get_module_state(module_config.module_name)
+        if module_state is not None and not module_state.get("versions"):
+            project_config.state_index.remove_module_state(module_config.module_name)
+
+    return 0
+
+def remove_orphaned_versions(project_config, module_configs, remove_root_dirs=True):
+    """
+    Remove the versions recorded in the state index of the project that
+    are not in the manifest anymore, like if they were deleted or ignored
+    since the setup. Their recorded symlinks are removed, and their root
+    directories are removed if the `remove` command was in their
+    `remove_version_root_dir_for_commands` when they were setup, and
+    the same for the modules that are not in the manifest anymore.
+
+    If remove_root_dirs is `False`, like for the `setup` command if
+    `--prune-orphans` argument is not passed, then only the recorded
+    symlinks are removed, and the root directories and the state of the
+    versions and modules are kept so that `status` still reports them.
+
+    The root directories that are shared with the modules and versions
+    still in the manifest are never removed.
+    """
+
+    state_index = project_config.state_index
+    module_names = set([module_config.module_name for module_config in module_configs])
+    version_names = set([(module_config.module_name, version_config.version_name)
+                         for module_config in module_configs for version_config in module_config.version_configs])
+    module_root_dirs = set([module_config.module_root_dir for module_config in module_configs])
+    version_root_dirs = set([version_config.version_root_dir
+                             for module_config in module_configs for version_config in module_config.version_configs])
+
+    for (module_name, version_name, version_state) in state_index.get_version_states():
+        if (module_name, version_name) in version_names:
+            continue
+
+        version_label = "orphaned module \"" + module_name + "\" version \"" + version_name + "\""
+        logger.info(LOG_TAG, "Removing " + ("" if remove_root_dirs and not SYMLINKS_ONLY else "symlinks of ") +
+                    version_label)
+
+        return_value = SymlinksManager.remove_recorded_symlinks(version_label, ProjectStateIndex.get_symlinks(version_state))
+        if str(return_value) != "0":
+            logger.error(LOG_TAG, "Failed to remove recorded symlinks for " + version_label)
+            return return_value
+
+        if SYMLINKS_ONLY or not remove_root_dirs:
+            version_state["symlinks"] = []
+            state_index.modified = True
+            continue
+
+        version_root_dir = version_state.get("version_root_dir")
+        if is_shared_root_dir(version_root_dir, module_root_dirs, version_root_dirs):
+            logger.verbose(LOG_TAG, "Not removing " + version_label + " root directory \"" + version_root_dir + "\"" +
+                           " since it is shared with a module or version in the manifest")
+        else:
+            error = delete_recorded_root_dir(project_config, version_label + " root", version_root_dir,
+                                             version_state.get("remove_version_root_dir_for_commands"))
+            if error is not None:
+                logger.error(LOG_TAG, error)
+                return 1
+
+        state_index.remove_version_state(module_name, version_name)
+
+    if SYMLINKS_ONLY or not remove_root_dirs:
+        return 0
+
+    for module_name in list(state_index.modules_state):
+        module_state = state_index.get_module_state(module_name)
+        if module_name in module_names or (module_state and module_state.get("versions")):
+            continue
+
+        module_root_dir = module_state.get("module_root_dir") if module_state is not None else None
+        if is_shared_root_dir(module_root_dir, module_root_dirs, version_root_dirs):
+            logger.verbose(LOG_TAG, "Not removing orphaned module \"" + module_name + "\" root directory" +
+                           " \"" + module_root_dir + "\" since it is shared with a module or version in the manifest")
+        elif module_state is not None:
+            error = delete_recorded_root_dir(project_config, "orphaned module \"" + module_name + "\" root",
+                                             module_root_dir, module_state.get("remove_module_root_dir_for_commands"))
+            if error is not None:
+                logger.error(LOG_TAG, error)
+                return 1
+
+        state_index.remove_module_state(module_name)
+
     return 0
 
+def is_shared_root_dir(root_dir, module_root_dirs, version_root_dirs):
+    """
+    Check if the root directory of an orphaned module or version is
+    shared with the modules and versions in the manifest, which is if it
+    is the same as or contains any of their root directories, or if it
+    is under any of their version root directories.
+    """
+
+    if not isinstance(root_dir, str):
+        return False
+
+    for other_root_dir in itertools.chain(module_root_dirs, version_root_dirs):
+        if other_root_dir == root_dir or other_root_dir.startswith(root_dir.rstrip("/") + "/"):
+            return True
+
+    for version_root_dir in version_root_dirs:
+        if root_dir.startswith(version_root_dir.rstrip("/") + "/"):
+            return True
+
+    return False
+
+def delete_recorded_root_dir(project_config, label, root_dir, remove_root_dir_for_commands):
+    """
+    Delete the root directory recorded in the state index if the `remove`
+    command is in its recorded `remove_root_dir_for_commands` and it is
+    under the project_root_dir.
+
+    @returns Returns the error if deletion was not successful, otherwise `None`.
+    """
+
+    if not isinstance(root_dir, str) or not isinstance(remove_root_dir_for_commands, list) or \
+            "remove" not in remove_root_dir_for_commands:
+        return None
+
+    if not os.path.isabs(root_dir) or not project_config.paths_index.is_path_in_project_root_dir(root_dir, True):
+        return "The " + label + " \"" + root_dir + "\" recorded in the state index is not under the" + \
+            " project_root_dir \"" + project_config.project_root_dir + "\""
+
+    return delete_root_dir(label, root_dir, project_config.project_root_dir)
+
+def get_checkout_stat_snapshot(root_dir):
+    """
+    Get the stat snapshot of the key paths of the checkout at root_dir,
+    which are the root directory itself and the git directory, `HEAD`
+    and ref files that the `HEAD` commit is resolved from.
+    """
+
+    (_, key_paths) = git_ref_utils.read_head_commit(root_dir)
+    return ProjectStateIndex.get_stat_snapshot([root_dir] + key_paths)
+
+def remove_stale_symlinks(label, state, applied_symlinks):
+    """
+    Remove the symlinks recorded in the state index for the project or a
+    version that were not created again by the current setup, like if
+    they were deleted from the manifest.
+    """
+
+    if state is None:
+        return 0
+
+    applied_dests = set([dest for (dest, _) in applied_symlinks])
+    stale_symlinks = [symlink for symlink in ProjectStateIndex.get_symlinks(state) if symlink[0] not in applied_dests]
+    if not stale_symlinks:
+        return 0
+
+    logger.debug(LOG_TAG, "Removing " + str(len(stale_symlinks)) + " stale " + label + " symlinks")
+    return SymlinksManager.remove_recorded_symlinks(label, stale_symlinks)
+
+def delete_root_dir(label, root_dir, required_parent_dir_path=None):
+    """
+    Delete the root directory at root_dir. If `--fast-remove` argument
+    was passed and required_parent_dir_path is set, then it is moved to a
+    trash directory beside it that must be under required_parent_dir_path
+    and deleted in background.
+    Otherwise, it is deleted in foreground after waiting for the
+    deletions in background.
+
+    @returns Returns the error if deletion was not successful, otherwise `None`.
+    """
+
+    with span_timer.span("delete_root_dir"):
+        if BACKGROUND_DELETER is not None and required_parent_dir_path is not None:
+            return BACKGROUND_DELETER.delete_directory_file(LOG_TAG, label, root_dir, required_parent_dir_path)
+        else:
+            # The trash directories under the root directory may still
+            # be being deleted in background
+            if str(wait_for_background_deletions()) != "0":
+                return "Failed to delete the trash directories under the " + label + " directory at \"" + root_dir + "\""
+            return file_utils.delete_normal_file(LOG_TAG, label, root_dir)
+
+def wait_for_background_deletions():
+    """
+    Wait for the root directories being deleted in background to be deleted.
+
+    @returns Returns `0` if all were deleted, otherwise `1`.
+    """
+
+    if BACKGROUND_DELETER is None:
+        return 0
+
+    start_time = time.monotonic()
+    with span_timer.span("wait_for_background_deletions"):
+        errors = BACKGROUND_DELETER.wait()
+    for error in errors:
+        logger.error(LOG_TAG, error)
+    logger.debug(LOG_TAG, "Waited for background deletions for " +
+                 str(round((time.monotonic() - start_time) * 1000, 3)) + "ms")
+
+    return 1 if errors else 0
+
 
 
 def get_project_src_provider(command_type, project_config):
-    checkout_type = data_utils.get_str_from_dict(
-        project_config.src_checkout_dict, "checkout_type", None)
+    (return_value, src_checkout_config) = EffectiveSrcCheckoutConfig.create_for_project(project_config)
+    if str(return_value) != "0":
+        return (return_value, None)
+
+    if logger.is_log_level_enabled(logger.LOG_LEVEL_VVERBOSE):
+        logger.vverbose(LOG_TAG, "project src_checkout_config:\n" + src_checkout_config.to_string() + "\n")
+
+    checkout_type = src_checkout_config.get_str("checkout_type", None)
 
     if not checkout_type or checkout_type == GitCheckoutConfig.CHECKOUT_TYPE:
-        return GitSrcProvider.create_for_project(command_type, project_config)
+        return GitSrcProvider.create_for_project(command_type, project_config, src_checkout_config)
     elif checkout_type == IgnoreCheckoutConfig.CHECKOUT_TYPE:
         return IgnoreSrcProvider.create()
+    elif checkout_type == LocalCheckoutConfig.CHECKOUT_TYPE:
+        return LocalSrcProvider.create_for_project(project_config, src_checkout_config, JOBS)
     else:
         logger.error(LOG_TAG, "The project checkout_type \"" + checkout_type + "\"" +
                      " is not supported")
         return (1, None)
 
-def get_version_src_provider(command_type, modules_config, module_config, version_config):
+def get_version_src_provider(command_type, modules_config, version_config):
+    (return_value, src_checkout_config) = EffectiveSrcCheckoutConfig.create_for_version(modules_config, version_config)
+    if str(return_value) != "0":
+        return (return_value, None)
+
+    if logger.is_log_level_enabled(logger.LOG_LEVEL_VVERBOSE):
+        logger.vverbose(LOG_TAG, src_checkout_config.label + " src_checkout_config:\n" +
+                        src_checkout_config.to_string() + "\n")
+
     # Prioritize version_config over module_config
-    checkout_type = data_utils.get_str_from_dict(
-        [version_config.src_checkout_dict, module_config.src_checkout_dict],
-        "checkout_type", None)
+    checkout_type = src_checkout_config.get_str("checkout_type", None)
 
     if not checkout_type or checkout_type == GitCheckoutConfig.CHECKOUT_TYPE:
-        return GitSrcProvider.create_for_version(command_type, modules_config, version_config)
+        return GitSrcProvider.create_for_version(command_type, version_config, src_checkout_config)
     elif checkout_type == IgnoreCheckoutConfig.CHECKOUT_TYPE:
         return IgnoreSrcProvider.create()
+    elif checkout_type == LocalCheckoutConfig.CHECKOUT_TYPE:
+        return LocalSrcProvider.create_for_version(version_config, src_checkout_config, JOBS)
     else:
-        logger.error(LOG_TAG, "The module \"" + version_config.module_config.module_name + "\"" +
-                     " version \"" + version_config.version_name + "\"" +
+        logger.error(LOG_TAG, "The " + src_checkout_config.label +
                      " checkout_type \"" + checkout_type + "\"" +
                      " is not supported")
         return (1, None)
@@ -333,22 +679,24 @@ def pre_process_manifest(manifest_label, manifest):
     # logger.vverbose(LOG_TAG, manifest_label + "=\n\"\n" + json.dumps(manifest, indent=4) + "\n\"")
     return manifest
 
-def read_manifests_from_file(manifest_file_label, manifest_file_path, manifests_format):
-    "Read manifests from file."
+def get_manifests_format(manifest_file_label, manifest_file_path, manifests_format):
+    """
+    Check if manifest file at manifest_file_path can be read and get
+    the format of the manifests in it.
 
-    regex_file_fd = '^((/proc/self)|(/dev))/fd/[0-9]+$'
-    regex_io_fd = '^((/proc/self)|(/dev))/fd/[0-2]$'
+    @returns (return_value, manifests_format)
+    """
 
     # If manifest file does not exist at manifest_file_path and is not
     # path to a file descriptor, like passed via process substitution.
     if not os.path.isfile(manifest_file_path) and \
-            not re.match(regex_file_fd, manifest_file_path):
+            not is_manifest_file_path_fd(manifest_file_path):
         logger.error(LOG_TAG, "Failed to find " + manifest_file_label)
         return (1, None)
 
     try:
-        if re.match(regex_file_fd, manifest_file_path):
-            if re.match(regex_io_fd, manifest_file_path):
+        if is_manifest_file_path_fd(manifest_file_path):
+            if re.match(REGEX_IO_FD, manifest_file_path):
                 logger.error(LOG_TAG, "The " + manifest_file_label + " cannot be for stdout, stderr or stdin fd.")
                 return (1, None)
 
@@ -363,95 +711,353 @@ def read_manifests_from_file(manifest_file_label, manifest_file_path, manifests_
             # Default to yaml format
             if not manifests_format:
                 manifests_format = "yaml"
+    except Exception as err:
+        logger.error(LOG_TAG, "Opening " + manifest_file_label + " failed with err:\n" + str(err))
+        return (1, None)
+
+    if manifests_format == "yaml" or manifests_format == "yml" or \
+            manifest_file_path.endswith(".yml") or \
+            manifest_file_path.endswith(".yaml"):
+        manifests_format = "yaml"
+    elif manifests_format == "json" or \
+            manifest_file_path.endswith(".json"):
+        manifests_format = "json"
+    elif manifests_format == "jsonl" or \
+            manifest_file_path.endswith(".jsonl"):
+        manifests_format = "jsonl"
+    else:
+        logger.error(LOG_TAG, "The --manifests-format arg or " + manifest_file_label +
+            " file format/extension must equal 'yaml', 'yml', 'json' or 'jsonl'.")
+        return (1, None)
+
+    return (0, manifests_format)
+
+def is_manifest_file_path_fd(manifest_file_path):
+    "Check if manifest_file_path is the path to a file descriptor."
+
+    return re.match(REGEX_FILE_FD, manifest_file_path) is not None
+
+def open_manifest_file(manifest_file, mode):
+    """
+    Open manifest_file in mode if its a path, otherwise open the already
+    open binary file object from its start without closing it on exit.
+    """
+
+    if isinstance(manifest_file, str):
+        # The file must not contain non "utf-8" characters, otherwise
+        # an exception will be raised.
+        if mode == "rb":
+            return open(manifest_file, "rb")
+        else:
+            return open(manifest_file, "r", encoding="utf-8", errors="strict")
+
+    manifest_file.seek(0)
+    if mode == "rb":
+        return contextlib.nullcontext(manifest_file)
+    else:
+        return open_text_wrapper_for_binary_file(manifest_file)
+
+@contextlib.contextmanager
+def open_text_wrapper_for_binary_file(binary_file):
+    "Open an utf-8 text wrapper for binary_file that is detached from it on exit instead of closing it."
+
+    text_file = io.TextIOWrapper(binary_file, encoding="utf-8", errors="strict")
+    try:
+        yield text_file
+    finally:
+        text_file.detach()
+
+class LineReader:
+    """
+    Reader whose sized `read()` returns at most a single line of the text
+    file. An unsized `read()` returns the rest of the text file.
+    """
+
+    def __init__(self, text_file):
+        self.text_file = text_file
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return self.text_file.read()
+        return self.text_file.readline(size)
+
+    def readline(self, size=-1):
+        return self.text_file.readline(size)
+
+def read_manifests_from_file(manifest_file_label, manifest_file, manifests_format, yaml_backend=None,
+                             manifests_cache_dir=None):
+    """
+    Read manifests from file.
+
+    The manifests are parsed and pre-processed one at a time as they are
+    read, so that each manifest can be processed before the next one is
+    read and all manifests are not held in memory at once. If
+    manifests_cache_dir is set, then the whole file is read first to find
+    the cache file, and all the manifests are held until the cache is written.
+
+    @param manifest_file The path to the manifest file or an already open
+                         binary file object of it.
+    @param manifests_format The format returned by {@link #get_manifests_format()}.
+    @returns Returns an iterator of (return_value, manifest_label, manifest).
+    Iteration stops after the first failure.
+    """
+
+    try:
+        if not manifests_cache_dir:
+            with open_manifest_file(manifest_file, "r") as manifest_text_file:
+                # Buffered reads of pipes block until the requested size
+                # is read, so read fds line by line for the formats that
+                # are loaded incrementally so that each manifest is loaded
+                # as soon as it is written to the fd.
+                if isinstance(manifest_file, str) and is_manifest_file_path_fd(manifest_file) and \
+                        is_manifests_format_streamed(manifests_format, yaml_backend):
+                    manifest_text_file = LineReader(manifest_text_file)
+
+                yield from load_manifests(manifest_file_label, manifest_text_file, manifests_format, yaml_backend)
+            return
+
+        # Read the manifest file bytes so that they can be hashed to
+        # find the cache file, and then load the manifests from them
+        # if cache file does not exist, since fds can only be read once.
+        with open_manifest_file(manifest_file, "rb") as manifest_binary_file:
+            manifest_bytes = manifest_binary_file.read()
+
+        # The manifests loaded by different yaml backends may differ, like
+        # if a backend rejects a manifest, so they are cached separately.
+        cache_key_parts = [VERSION, manifests_format]
+        if manifests_format == "yaml":
+            (return_value, yaml_backend) = yaml_utils.get_yaml_backend(yaml_backend)
+            if str(return_value) != "0":
+                yield (return_value, manifest_file_label, None)
+                return
+            cache_key_parts.append(yaml_backend)
+
+        manifests_cache_key = manifests_cache.get_cache_key(cache_key_parts, manifest_bytes)
+
+        start_time = time.monotonic()
+        all_manifests = manifests_cache.read_manifests_from_cache(manifests_cache_dir, manifests_cache_key)
+        run_metrics.inc("cache_requests_total", labels={"cache": "manifests",
+                        "result": "hit" if all_manifests is not None else "miss"}, context_labels=False)
+        if all_manifests is not None:
+            logger.verbose(LOG_TAG, "Loaded " + str(len(all_manifests)) + " manifest(s) for " +
+                           manifest_file_label + " from manifests cache" +
+                           " in " + str(round((time.monotonic() - start_time) * 1000, 3)) + "ms")
+            manifest_number = 1
+            for manifest in all_manifests:
+                yield (0, get_manifest_label(manifest_file_label, manifests_format, manifest_number), manifest)
+                manifest_number += 1
+            return
 
-        # Open file at manifest_file_path.
         # The file must not contain non "utf-8" characters, otherwise
         # an exception will be raised.
         all_manifests = []
-        with open(manifest_file_path, "r", encoding="utf-8", errors="strict") as manifest_file:
-            try:
-                if manifests_format == "yaml" or manifests_format == "yml" or \
-                        manifest_file_path.endswith(".yml") or \
-                        manifest_file_path.endswith(".yaml"):
-                    if not YAML_SUPPORTED:
-                        logger.error(LOG_TAG, "Loading yaml from " + manifest_file_label +
-                                     " requires ruamel.yaml.\n\n" +
-                                     RUAMEL_YAML_INSTALL_INSTRUCTIONS + "\n")
-                        return (1, None)
-
-                    yaml = ruamel.yaml.YAML(typ='safe', pure=True) # type: ignore pylint: disable=used-before-assignment
-
-                    # Load multiple manifests in same yaml file if they exist separated by `\n...\n---\n`
-                    # https://yaml.readthedocs.io/en/latest/api/#dumping-a-multi-document-yaml-stream
-                    # https://yaml.org/spec/1.2.2/#912-document-markers
-                    manifests = list(yaml.load_all(manifest_file))
-                    manifest_number = 1
-                    for manifest in manifests:
-                        manifest_label = ("manifest " + (str(manifest_number) + " "
-                            if len(manifests) > 1 else "") + "in ") + manifest_file_label
-
-                        all_manifests.append(pre_process_manifest(manifest_label,
-                            collections.OrderedDict(manifest)))
-                        manifest_number += 1
-
-                elif manifests_format == "json" or \
-                        manifest_file_path.endswith(".json"):
-                    # Load json data from manifest file as a python dict
-                    all_manifests.append(pre_process_manifest(manifest_file_label,
-                        json.load(manifest_file, object_pairs_hook=collections.OrderedDict)))
-                else:
-                    logger.error(LOG_TAG, "The --manifests-format arg or " + manifest_file_label +
-                        " file format/extension must equal 'yaml', 'yml' or 'json'.")
-                    return (1, None)
-
-                return (0, all_manifests)
-
-            except ValueError as err:
-                logger.error(LOG_TAG, "Loading json from " + manifest_file_label +
-                             " failed with err:\n" + str(err))
-                return (1, None)
+        for (return_value, manifest_label, manifest) in load_manifests(
+                manifest_file_label, io.StringIO(manifest_bytes.decode("utf-8", errors="strict")),
+                manifests_format, yaml_backend):
+            if str(return_value) != "0":
+                yield (return_value, manifest_label, None)
+                return
+
+            all_manifests.append(manifest)
+            yield (0, manifest_label, manifest)
+
+        manifests_cache.write_manifests_to_cache(manifests_cache_dir, manifests_cache_key, all_manifests)
     except Exception as err:
         logger.error(LOG_TAG, "Opening " + manifest_file_label + " failed with err:\n" + str(err))
-        return (1, None)
+        yield (1, manifest_file_label, None)
+
+def is_manifests_format_streamed(manifests_format, yaml_backend):
+    """
+    Check if manifests in manifests_format are loaded incrementally as
+    the manifest file is read, instead of after reading the whole file.
+    """
+
+    if manifests_format == "jsonl":
+        return True
+    elif manifests_format == "yaml":
+        # The `auto` backend only selects streaming backends
+        return not yaml_backend or yaml_backend == yaml_utils.YAML_BACKEND_AUTO or \
+            yaml_backend in yaml_utils.YAML_STREAMING_BACKENDS
+    else:
+        return False
 
-def process_manifest(command_type, manifest_label, manifest):
-    "Process manifest."
+def get_manifest_label(manifest_file_label, manifests_format, manifest_number):
+    """
+    Get the label for a manifest in manifest_file_label. The manifests
+    in yaml and jsonl files are numbered since they may contain multiple
+    manifests and their count is not known until all are read.
+    """
+
+    if manifests_format == "yaml" or manifests_format == "jsonl":
+        return "manifest " + str(manifest_number) + " in " + manifest_file_label
+    else:
+        return "manifest in " + manifest_file_label
+
+def load_manifests(manifest_file_label, manifest_file, manifests_format, yaml_backend):
+    """
+    Load and pre-process manifests from manifest_file in manifests_format.
+
+    @returns Returns an iterator of (return_value, manifest_label, manifest).
+    Iteration stops after the first failure.
+    """
+
+    try:
+        if manifests_format == "yaml":
+            if not yaml_utils.is_yaml_supported():
+                logger.error(LOG_TAG, "Loading yaml from " + manifest_file_label +
+                             " requires ruamel.yaml.\n\n" +
+                             yaml_utils.RUAMEL_YAML_INSTALL_INSTRUCTIONS + "\n")
+                yield (1, manifest_file_label, None)
+                return
+
+            (return_value, yaml_backend) = yaml_utils.get_yaml_backend(yaml_backend)
+            if str(return_value) != "0":
+                yield (return_value, manifest_file_label, None)
+                return
+
+            # Load multiple manifests in same yaml file if they exist separated by `\n...\n---\n`
+            # https://yaml.readthedocs.io/en/latest/api/#dumping-a-multi-document-yaml-stream
+            # https://yaml.org/spec/1.2.2/#912-document-markers
+            logger.verbose(LOG_TAG, "Loading manifest(s) from " + manifest_file_label +
+                           " with the '" + yaml_backend + "' yaml backend")
+            manifest_number = 1
+            for manifest in yaml_utils.load_all(yaml_backend, manifest_file):
+                manifest_label = get_manifest_label(manifest_file_label, manifests_format, manifest_number)
+                if not isinstance(manifest, dict):
+                    logger.error(LOG_TAG, "The " + manifest_label + " is not a dict")
+                    yield (1, manifest_label, None)
+                    return
+
+                yield (0, manifest_label, pre_process_manifest(manifest_label, collections.OrderedDict(manifest)))
+                manifest_number += 1
+
+        elif manifests_format == "json":
+            # Load json data from manifest file as a python dict
+            manifest_label = get_manifest_label(manifest_file_label, manifests_format, 1)
+            yield (0, manifest_label, pre_process_manifest(manifest_label,
+                json.load(manifest_file, object_pairs_hook=collections.OrderedDict)))
+
+        elif manifests_format == "jsonl":
+            yield from load_jsonl_manifests(manifest_file_label, manifest_file)
+        else:
+            logger.error(LOG_TAG, "The manifests format \"" + str(manifests_format) + "\" is not supported")
+            yield (1, manifest_file_label, None)
+
+    except ValueError as err:
+        logger.error(LOG_TAG, "Loading json from " + manifest_file_label +
+                     " failed with err:\n" + str(err))
+        yield (1, manifest_file_label, None)
+
+def load_jsonl_manifests(manifest_file_label, manifest_file):
+    """
+    Load and pre-process manifests from manifest_file in jsonl format,
+    where each non-empty line is a manifest. Each line is read, decoded
+    and pre-processed only when the previous manifest has been consumed.
+
+    @returns Returns an iterator of (return_value, manifest_label, manifest).
+    Iteration stops after the first failure.
+    """
+
+    line_number = 0
+    manifest_number = 1
+    for line in iter(manifest_file.readline, ""):
+        line_number += 1
+        if not line.strip():
+            continue
+
+        manifest_label = get_manifest_label(manifest_file_label, "jsonl", manifest_number)
+        try:
+            manifest = JSONL_DECODER.decode(line)
+        except ValueError as err:
+            logger.error(LOG_TAG, "Loading json from line " + str(line_number) + " of " + manifest_file_label +
+                         " failed with err:\n" + str(err))
+            yield (1, manifest_label, None)
+            return
+
+        if not isinstance(manifest, dict):
+            logger.error(LOG_TAG, "The " + manifest_label + " on line " + str(line_number) + " is not a dict")
+            yield (1, manifest_label, None)
+            return
+
+        yield (0, manifest_label, pre_process_manifest(manifest_label, manifest))
+        manifest_number += 1
+
+def validate_manifests(manifest_file_label, manifest_file, manifests_format, yaml_backend=None,
+                       manifests_cache_dir=None):
+    """
+    Validate all manifests in manifest file by creating their configs,
+    without processing them. Each manifest is released after it is validated.
+    """
+
+    logger.info(LOG_TAG, "Validating manifest(s) in " + manifest_file_label)
+
+    manifests_count = 0
+    for (return_value, manifest_label, manifest) in read_manifests_from_file(
+            manifest_file_label, manifest_file, manifests_format, yaml_backend, manifests_cache_dir):
+        if str(return_value) != "0":
+            return return_value
+
+        (return_value, _, _, _) = create_manifest_configs(manifest_label, manifest)
+        if str(return_value) != "0":
+            logger.error(LOG_TAG, "Validating " + manifest_label + " failed with exit code \"" + str(return_value) + "\"")
+            return return_value
+
+        manifests_count += 1
+
+    logger.info(LOG_TAG, "Validated " + str(manifests_count) + " manifest(s) in " + manifest_file_label)
+
+    return 0
+
+def create_manifest_configs(manifest_label, manifest, report_all_errors=False):
+    """
+    Create the project, modules and module configs for manifest.
+
+    If report_all_errors is `True`, then modules whose configs failed
+    to be created are skipped instead of returning on the first failure,
+    so that errors for all modules are reported, and the return_value
+    will be the number of modules that failed.
+
+    @returns (return_value, project_config, modules_config, module_configs)
+    """
 
     if not manifest or not isinstance(manifest, dict):
         logger.error(LOG_TAG, "The manifest object created for " + manifest_label + " is not a dict")
-        return 1
+        return (1, None, None, None)
 
-    safe_manifest = data_utils.delete_keys_from_dict(manifest, PRIVATE_FIELDS_LIST, [None, "***"])
-    logger.vverbose(LOG_TAG, manifest_label + ":\n" + json.dumps(safe_manifest, sort_keys=False, indent=4, default=str))
+    if logger.is_log_level_enabled(logger.LOG_LEVEL_VVERBOSE):
+        safe_manifest = data_utils.delete_keys_from_dict(manifest, PRIVATE_FIELDS_LIST, [None, "***"])
+        logger.vverbose(LOG_TAG, manifest_label + ":\n" + json.dumps(safe_manifest, sort_keys=False, indent=4, default=str))
 
     project_config_dict = data_utils.get_ordered_dict_from_dict(manifest, "project", None)
     if not project_config_dict:
         logger.error(LOG_TAG, "The 'project' value is not set or not a dict")
-        return 1
+        return (1, None, None, None)
 
     (return_value, project_config) = ProjectConfig.create(project_config_dict, manifest_label)
     if str(return_value) != "0":
-        return return_value
+        return (return_value, None, None, None)
     if not project_config or not isinstance(project_config, ProjectConfig):
         logger.error(LOG_TAG, "Failed to create project_config")
-        return 1
+        return (1, None, None, None)
 
     project_root_dir = project_config.project_root_dir
     logger.debug(LOG_TAG, "project_root_dir: \"" + str(project_root_dir) + "\"")
 
 
 
+    modules_config = None
     module_configs = []
     if project_config.modules_dict:
         logger.log_debug_no_format("")
 
         (return_value, modules_config) = ModulesConfig.create(project_config.modules_dict)
         if str(return_value) != "0":
-            return return_value
+            return (return_value, None, None, None)
         if not modules_config or not isinstance(modules_config, ModulesConfig):
             logger.error(LOG_TAG, "Failed to create all_modules_config")
-            return 1
+            return (1, None, None, None)
 
+        failed_modules_count = 0
         i = 1
         # For all module_name, module_config in all_modules_config.module_list
         for module_name, module_config_dict in modules_config.module_list.items():
@@ -465,18 +1071,64 @@ def process_manifest(command_type, manifest_label, manifest):
             logger.debug(LOG_TAG, "Creating module_config for module " + str(i) + " \"" + module_name + "\"")
 
             (return_value, module_config) = ModuleConfig.create(
-                project_config, module_name, module_config_dict, module_configs)
-            if str(return_value) != "0":
-                return return_value
-            if not module_config or not isinstance(module_config, ModuleConfig):
+                project_config, module_name, module_config_dict)
+            if str(return_value) == "0" and (not module_config or not isinstance(module_config, ModuleConfig)):
                 logger.error(LOG_TAG, "Failed to create module_config for module " + str(i) + " \"" + module_name + "\"")
-                return 1
+                return_value = 1
+            if str(return_value) != "0":
+                if not report_all_errors:
+                    return (return_value, None, None, None)
+
+                failed_modules_count += 1
+                i += 1
+                continue
 
             module_configs.append(module_config)
             i += 1
 
+        # Release the raw modules dicts since they are not needed
+        # anymore after all the module_configs have been created.
+        modules_config.module_list = data_utils.EMPTY_DICT_VIEW
+        project_config.modules_dict = data_utils.EMPTY_DICT_VIEW
+
         logger.log_debug_no_format("")
 
+        if failed_modules_count > 0:
+            return (failed_modules_count, project_config, modules_config, module_configs)
+
+    return (0, project_config, modules_config, module_configs)
+
+def process_manifest(command_type, manifest_label, manifest):
+    "Process manifest."
+
+    (return_value, project_config, modules_config, module_configs) = create_manifest_configs(manifest_label, manifest)
+    if str(return_value) != "0":
+        return return_value
+
+    (return_value, project_config.state_index) = ProjectStateIndex.load(project_config.project_root_dir)
+    if str(return_value) != "0":
+        return return_value
+
+    return_value = 1
+    try:
+        with span_timer.span(command_type + "_manifest", project=project_config.project_root_dir):
+            return_value = process_manifest_configs(command_type, project_config, modules_config, module_configs)
+    finally:
+        # The state of the artifacts applied before any failure must
+        # also be recorded.
+        error = project_config.state_index.write()
+        if error is not None:
+            logger.error(LOG_TAG, error)
+            if str(return_value) == "0":
+                return_value = 1
+
+    return return_value
+
+def process_manifest_configs(command_type, project_config, modules_config, module_configs):
+    "Process the project and modules of a manifest."
+
+    project_root_dir = project_config.project_root_dir
+
 
 
     # The project must be setup before setting up modules
@@ -485,6 +1137,16 @@ def process_manifest(command_type, manifest_label, manifest):
         if str(return_value) != "0":
             logger.error(LOG_TAG, command_type + " project failed")
             return return_value
+
+        # The symlinks of the versions not in the manifest anymore must
+        # be removed before setting up modules, since they may have the
+        # same destinations as the symlinks of the versions in it. Their
+        # root directories are only removed if `--prune-orphans` is passed.
+        with span_timer.span("remove_orphaned_versions"):
+            return_value = remove_orphaned_versions(project_config, module_configs, PRUNE_ORPHANS)
+        if str(return_value) != "0":
+            logger.error(LOG_TAG, command_type + " orphaned versions failed")
+            return return_value
     elif command_type == "remove":
         # If project_root_dir does not exist
         if not os.path.isdir(project_root_dir):
@@ -492,6 +1154,14 @@ def process_manifest(command_type, manifest_label, manifest):
                 " does not exist at \"" + project_root_dir + "\"")
             return 0
 
+        # The versions not in the manifest anymore must be removed
+        # before their modules are removed
+        with span_timer.span("remove_orphaned_versions"):
+            return_value = remove_orphaned_versions(project_config, module_configs)
+        if str(return_value) != "0":
+            logger.error(LOG_TAG, command_type + " orphaned versions failed")
+            return return_value
+
 
 
     if module_configs:
@@ -520,7 +1190,7 @@ def process_manifest(command_type, manifest_label, manifest):
 
     # The project must be removed after removing modules
     if command_type == "remove":
-        if project_config.modules_dict:
+        if module_configs:
             logger.log_debug_no_format("\n\n")
         return_value = process_project(command_type, project_config)
         if str(return_value) != "0":
@@ -531,6 +1201,460 @@ def process_manifest(command_type, manifest_label, manifest):
 
 
 
+def check_manifest(command_type, manifest_label, manifest, remote_checks):
+    """
+    Check manifest by creating all its configs, including the symlink
+    and checkout configs, without making any changes to the filesystem
+    or connecting to any remotes. All errors found are reported instead
+    of returning on the first error.
+
+    The src_url of git checkouts are added to remote_checks so that they
+    can be checked later with {@link #check_remotes()} if required.
+
+    @returns Returns the number of errors found.
+    """
+
+    (return_value, project_config, modules_config, module_configs) = create_manifest_configs(
+        manifest_label, manifest, report_all_errors=True)
+    if not project_config:
+        return 1
+
+    errors_count = 0
+    if str(return_value) != "0":
+        errors_count += int(return_value) if str(return_value).isdigit() else 1
+
+    if project_config.src_checkout_dict:
+        (return_value, src_provider) = get_project_src_provider(command_type, project_config)
+        if str(return_value) != "0" or not src_provider:
+            logger.error(LOG_TAG, "Failed to create src_provider for project")
+            errors_count += 1
+        else:
+            add_remote_check(remote_checks, manifest_label + " project", src_provider)
+
+    if project_config.symlinks_dict:
+        (return_value, symlinks_manager) = SymlinksManager.create(project_config, None)
+        if str(return_value) != "0" or not symlinks_manager:
+            logger.error(LOG_TAG, "Failed to create symlinks_manager for project")
+            errors_count += 1
+
+    module_num = 1
+    # For all version_config in version_configs of all module_configs
+    for module_config in module_configs:
+        version_num = 1
+        for version_config in module_config.version_configs:
+            version_label = "module " + str(module_num) + " \"" + module_config.module_name + "\"" + \
+                            " version " + str(version_num) + " \"" + version_config.version_name + "\""
+
+            (return_value, src_provider) = get_version_src_provider(command_type, modules_config, version_config)
+            if str(return_value) != "0" or not src_provider:
+                logger.error(LOG_TAG, "Failed to create src_provider for " + version_label)
+                errors_count += 1
+            else:
+                add_remote_check(remote_checks, manifest_label + " " + version_label, src_provider)
+
+            (return_value, symlinks_manager) = SymlinksManager.create(project_config, version_config)
+            if str(return_value) != "0" or not symlinks_manager:
+                logger.error(LOG_TAG, "Failed to create symlinks_manager for " + version_label)
+                errors_count += 1
+
+            version_num += 1
+
+        module_num += 1
+
+    return errors_count
+
+def add_remote_check(remote_checks, label, src_provider):
+    """
+    Add the src_url of src_provider to remote_checks if its a git
+    checkout. Each src_url is only checked once for all the labels
+    that use it.
+    """
+
+    if not isinstance(src_provider, GitSrcProvider):
+        return
+
+    src_url = src_provider.checkout_config.src_url
+    remote_check_key = (src_url, src_provider.git.ssh_strict)
+    if remote_check_key in remote_checks:
+        remote_checks[remote_check_key][1].append(label)
+    else:
+        remote_checks[remote_check_key] = (src_provider.git, [label])
+
+def check_remotes(remote_checks, jobs):
+    """
+    Check that the src_url of all remote_checks are valid and exist
+    by connecting to them concurrently with jobs number of threads.
+
+    @returns Returns the number of remotes that failed the check.
+    """
+
+    if not remote_checks:
+        return 0
+
+    logger.info(LOG_TAG, "Checking " + str(len(remote_checks)) + " remote(s) with " + str(jobs) + " job(s)")
+
+    failed_remotes_count = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="check_remotes") as executor:
+        futures = {}
+        for remote_check_key, (git, labels) in remote_checks.items():
+            futures[executor.submit(check_remote, git, remote_check_key[0])] = (remote_check_key[0], labels)
+
+        for future in concurrent.futures.as_completed(futures):
+            (src_url, labels) = futures[future]
+            if not future.result():
+                logger.error(LOG_TAG, "The src_url \"" + str(src_url) + "\"" +
+                             " is not valid, does not exist or failed to connect to it, used by:\n" +
+                             "\n".join(labels))
+                failed_remotes_count += 1
+            else:
+                logger.verbose(LOG_TAG, "The src_url \"" + str(src_url) + "\" exists")
+
+    return failed_remotes_count
+
+
+
+def status_manifest(command_type, manifest_label, manifest, executor, status_checks):
+    """
+    Submit the jobs to executor to check the status of the project and
+    all versions of manifest against the state index of the project.
+    The `(label, future)` of the jobs are appended to status_checks.
+
+    @returns Returns the number of errors found.
+    """
+
+    (return_value, project_config, modules_config, module_configs) = create_manifest_configs(
+        manifest_label, manifest, report_all_errors=True)
+    if not project_config:
+        return 1
+
+    errors_count = 0
+    if str(return_value) != "0":
+        errors_count += int(return_value) if str(return_value).isdigit() else 1
+
+    (return_value, state_index) = ProjectStateIndex.load(project_config.project_root_dir)
+    if str(return_value) != "0":
+        return errors_count + 1
+
+    expected_checkout_state = None
+    if project_config.src_checkout_dict:
+        (return_value, src_provider) = get_project_src_provider(command_type, project_config)
+        if str(return_value) != "0" or not src_provider:
+            logger.error(LOG_TAG, "Failed to create src_provider for project")
+            errors_count += 1
+        else:
+            expected_checkout_state = src_provider.get_checkout_state()
+
+    (return_value, expected_symlinks) = get_expected_symlinks(project_config, None)
+    if str(return_value) != "0":
+        logger.error(LOG_TAG, "Failed to create symlinks_manager for project")
+        errors_count += 1
+
+    # The `(label, root_dir, expected_checkout_state, state, expected_symlinks)`
+    # of the project and all versions in the order they are setup
+    status_entries = [("project", project_config.project_root_dir, expected_checkout_state,
+                       state_index.get_project_state(), expected_symlinks)]
+
+    version_names = set()
+    module_num = 1
+    # For all version_config in version_configs of all module_configs
+    for module_config in module_configs:
+        version_num = 1
+        for version_config in module_config.version_configs:
+            version_label = "module " + str(module_num) + " \"" + module_config.module_name + "\"" + \
+                            " version " + str(version_num) + " \"" + version_config.version_name + "\""
+            version_names.add((module_config.module_name, version_config.version_name))
+            version_num += 1
+
+            (return_value, src_provider) = get_version_src_provider(command_type, modules_config, version_config)
+            if str(return_value) != "0" or not src_provider:
+                logger.error(LOG_TAG, "Failed to create src_provider for " + version_label)
+                errors_count += 1
+                continue
+
+            (return_value, expected_symlinks) = get_expected_symlinks(project_config, version_config)
+            if str(return_value) != "0":
+                logger.error(LOG_TAG, "Failed to create symlinks_manager for " + version_label)
+                errors_count += 1
+                continue
+
+            status_entries.append((version_label, version_config.version_root_dir, src_provider.get_checkout_state(),
+                                   state_index.get_version_state(module_config.module_name, version_config.version_name),
+                                   expected_symlinks))
+
+        module_num += 1
+
+    # If multiple symlinks have the same dest, like a `current` symlink
+    # defined for all versions of a module, then the symlink created
+    # last by the setup is the expected one.
+    expected_targets = {}
+    for (_, _, _, _, expected_symlinks) in status_entries:
+        for (dest, target) in expected_symlinks:
+            expected_targets[dest] = target
+
+    for (label, root_dir, expected_checkout_state, state, expected_symlinks) in status_entries:
+        expected_symlinks = [[dest, target] for (dest, target) in expected_symlinks if expected_targets.get(dest) == target]
+        status_checks.append((manifest_label + " " + label, executor.submit(
+            get_status_drifts, root_dir, expected_checkout_state, state, expected_symlinks, expected_targets,
+            project_config.project_root_dir, label)))
+
+    for (module_name, version_name, version_state) in state_index.get_version_states():
+        if (module_name, version_name) not in version_names:
+            status_checks.append((manifest_label + " orphaned module \"" + module_name + "\"" +
+                                  " version \"" + version_name + "\"", executor.submit(
+                                      get_orphaned_status_drifts, version_state)))
+
+    return errors_count
+
+def get_expected_symlinks(project_config, version_config):
+    """
+    Get the `[dest, target]` of the symlinks of the project if
+    version_config is `None`, otherwise of the version.
+
+    @returns (return_value, expected_symlinks)
+    """
+
+    if version_config is None and not project_config.symlinks_dict:
+        return (0, [])
+
+    (return_value, symlinks_manager) = SymlinksManager.create(project_config, version_config)
+    if str(return_value) != "0" or not symlinks_manager:
+        return (return_value if str(return_value) != "0" else 1, [])
+
+    return (0, [[symlink_config.dest_expanded, symlink_config.target_expanded]
+                for symlink_config in symlinks_manager.symlink_configs])
+
+def get_status_drifts(root_dir, expected_checkout_state, state, expected_symlinks, expected_targets,
+                      project_root_dir, label):
+    """
+    Get how the checkout at root_dir and its symlinks drifted from the
+    manifest, as per the checkout state and stat snapshot recorded in
+    the state index. The expected_targets are the targets of all the
+    symlinks in the manifest, so that recorded symlinks not in it are
+    reported as stale. The `HEAD` commit of git checkouts is only read if
+    the stat snapshot of its key paths changed, and `git status` is
+    never run. The logs of the check are written as a single block when
+    it finishes, since checks are run in parallel.
+
+    @returns Returns the `list` of drifts found.
+    """
+
+    with logger.buffered(), span_timer.span("status_check", project=project_root_dir, label=label):
+        return get_status_drifts_for_root_dir(root_dir, expected_checkout_state, state, expected_symlinks,
+                                              expected_targets)
+
+def get_status_drifts_for_root_dir(root_dir, expected_checkout_state, state, expected_symlinks, expected_targets):
+    drifts = []
+
+    root_dir_exists = os.path.isdir(root_dir)
+    if not root_dir_exists and not (expected_checkout_state and
+                                    expected_checkout_state.get("checkout_type") == IgnoreCheckoutConfig.CHECKOUT_TYPE):
+        drifts.append("The root directory \"" + root_dir + "\" is missing")
+
+    if expected_checkout_state is not None:
+        recorded_checkout_state = state.get("checkout") if state else None
+        if not isinstance(recorded_checkout_state, dict):
+            drifts.append("No checkout is recorded in the state index")
+        else:
+            for key, expected_value in expected_checkout_state.items():
+                # The ref and commit are only set in the manifest if they
+                # must be pinned, and are otherwise resolved on checkout.
+                if expected_value is None and key in ["ref", "commit"]:
+                    continue
+                if recorded_checkout_state.get(key) != expected_value:
+                    drifts.append("The " + key + " " + json.dumps(recorded_checkout_state.get(key)) +
+                                  " recorded at setup does not match " + json.dumps(expected_value))
+
+            if root_dir_exists:
+                drifts.extend(get_checkout_drifts(root_dir, recorded_checkout_state, state.get("stat_snapshot")))
+
+    for (dest, target) in expected_symlinks:
+        try:
+            current_target = os.readlink(dest)
+        except OSError:
+            drifts.append("The symlink at \"" + dest + "\" is missing")
+            continue
+        if current_target != target:
+            drifts.append("The symlink at \"" + dest + "\" points to \"" + current_target + "\"" +
+                          " instead of \"" + target + "\"")
+
+    for (dest, target) in ProjectStateIndex.get_symlinks(state):
+        if dest not in expected_targets and get_readlink(dest) == target:
+            drifts.append("The stale symlink at \"" + dest + "\" that is not in the manifest still exists")
+
+    return drifts
+
+def get_checkout_drifts(root_dir, recorded_checkout_state, stat_snapshot):
+    """
+    Get how the checkout at root_dir drifted from its recorded checkout
+    state and stat snapshot.
+
+    @returns Returns the `list` of drifts found.
+    """
+
+    drifts = []
+
+    changed_paths = ProjectStateIndex.get_changed_stat_paths(stat_snapshot)
+    if changed_paths is None:
+        return ["No stat snapshot is recorded in the state index"]
+
+    # Only the inode of the root directory is compared, since its
+    # mtime changes whenever an entry is added or removed under it.
+    if root_dir in changed_paths:
+        changed_paths.remove(root_dir)
+        root_dir_stat = ProjectStateIndex.get_stat_snapshot([root_dir])[root_dir]
+        if not root_dir_stat or not stat_snapshot.get(root_dir) or root_dir_stat[0] != stat_snapshot[root_dir][0]:
+            drifts.append("The root directory \"" + root_dir + "\" was replaced since setup")
+
+    if recorded_checkout_state.get("checkout_type") == GitCheckoutConfig.CHECKOUT_TYPE and changed_paths:
+        (commit, _) = git_ref_utils.read_head_commit(root_dir)
+        if commit != recorded_checkout_state.get("commit"):
+            drifts.append("The HEAD is at commit " + json.dumps(commit) + " instead of commit " +
+                          json.dumps(recorded_checkout_state.get("commit")) + " checked out at setup")
+
+    return drifts
+
+def get_orphaned_status_drifts(version_state):
+    """
+    Get the artifacts of a version recorded in the state index that is
+    not in the manifest anymore that still exist.
+
+    @returns Returns the `list` of drifts found.
+    """
+
+    drifts = []
+
+    version_root_dir = version_state.get("version_root_dir")
+    if isinstance(version_root_dir, str) and os.path.isdir(version_root_dir):
+        drifts.append("The root directory \"" + version_root_dir + "\" of the version that is not in the" +
+                      " manifest still exists")
+
+    for (dest, target) in ProjectStateIndex.get_symlinks(version_state):
+        if get_readlink(dest) == target:
+            drifts.append("The symlink at \"" + dest + "\" of the version that is not in the manifest still exists")
+
+    return drifts
+
+def get_readlink(path):
+    "Get the target of the symlink at path, otherwise `None`."
+
+    try:
+        return os.readlink(path)
+    except OSError:
+        return None
+
+def status_manifest_files(command_type, manifest_file_paths_list, manifests_format, yaml_backend,
+                          manifests_cache_dir, jobs):
+    """
+    Check the status of the projects and versions of all manifests in
+    all manifest files with jobs number of threads, and report the ones
+    that drifted from the manifests.
+
+    @returns Returns `0` if nothing drifted, `STATUS_DRIFTED_EXIT_CODE`
+    if anything drifted, otherwise `1` if any errors were found.
+    """
+
+    errors_count = 0
+    manifests_count = 0
+    status_checks = []
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="status") as executor:
+        manifest_file_number = 1
+        for manifest_file_path in manifest_file_paths_list:
+            if len(manifest_file_paths_list) == 1:
+                manifest_file_label = "manifest file at \"" + str(manifest_file_path or "") + "\""
+            else:
+                manifest_file_label = "manifest file " + str(manifest_file_number) + \
+                " at \"" + str(manifest_file_path or "") + "\""
+            manifest_file_number += 1
+
+            logger.info(LOG_TAG, "Checking status for " + manifest_file_label)
+
+            (return_value, manifests_format_for_file) = get_manifests_format(
+                manifest_file_label, manifest_file_path, manifests_format)
+            if str(return_value) != "0":
+                errors_count += 1
+                continue
+
+            for (return_value, manifest_label, manifest) in read_manifests_from_file(
+                    manifest_file_label, manifest_file_path, manifests_format_for_file, yaml_backend, manifests_cache_dir):
+                if str(return_value) != "0":
+                    errors_count += 1
+                    break
+
+                errors_count += status_manifest(command_type, manifest_label, manifest, executor, status_checks)
+                manifests_count += 1
+
+        # The status is reported in the order of the manifests
+        drifted_count = 0
+        for (label, future) in status_checks:
+            drifts = future.result()
+            if drifts:
+                logger.warn(LOG_TAG, "The " + label + " drifted:\n" + "\n".join(["- " + drift for drift in drifts]))
+                drifted_count += 1
+            else:
+                logger.info(LOG_TAG, "The " + label + " is up to date")
+
+    if errors_count > 0:
+        logger.error(LOG_TAG, "Checked status of " + str(manifests_count) + " manifest(s) and found " +
+                     str(errors_count) + " error(s)")
+        return 1
+
+    logger.info(LOG_TAG, "Checked status of " + str(len(status_checks)) + " project(s) and version(s) in " +
+                str(manifests_count) + " manifest(s) and found " + str(drifted_count) + " drifted")
+    return STATUS_DRIFTED_EXIT_CODE if drifted_count > 0 else 0
+
+
+def check_remote(git, src_url):
+    """
+    Check that src_url is valid and exists. The logs of the check are
+    written as a single block when it finishes, since checks are run in
+    parallel.
+    """
+
+    with logger.buffered(), span_timer.span("git_ls_remote"):
+        return git.is_valid_repo_url(src_url)
+
+
+
+def report_timings(show_timings, timings_json_file_path, trace_file_path, show_subprocess_stats, max_spawns,
+                   metrics_file_path, return_value):
+    """
+    Log the timings summary if show_timings is `True` and the subprocess
+    stats if show_subprocess_stats is `True`, write the timings json,
+    trace and metrics files if their paths are set, and check that the
+    number of commands spawned did not exceed max_spawns if it is set.
+
+    @returns Returns return_value, or `1` if writing any file failed or
+    max_spawns was exceeded and return_value was `0`.
+    """
+
+    if show_timings:
+        logger.info(LOG_TAG, span_timer.get_summary())
+    if show_subprocess_stats:
+        logger.info(LOG_TAG, subprocess_stats.get_summary())
+
+    errors = []
+    if timings_json_file_path:
+        errors.append(span_timer.write_json(timings_json_file_path,
+            {"subprocesses": subprocess_stats.to_dict()} if subprocess_stats.enabled else None))
+    if trace_file_path:
+        errors.append(span_timer.write_trace(trace_file_path))
+    if metrics_file_path:
+        errors.append(run_metrics.write(metrics_file_path, return_value))
+    if max_spawns is not None and subprocess_stats.get_spawn_count() > max_spawns:
+        errors.append("The " + str(subprocess_stats.get_spawn_count()) + " commands spawned exceeded" +
+                      " the --max-spawns budget of " + str(max_spawns))
+
+    for error in errors:
+        if error is not None:
+            logger.error(LOG_TAG, error)
+            if str(return_value) == "0":
+                return_value = 1
+
+    return return_value
+
+
+
 DESCRIPTION = """
 temporal-src-network command is used to build temporal sources network.
 
@@ -541,7 +1665,7 @@ Usage:
 EPILOG = """
 The 'command_type' and 'manifests' arguments must be passed.
 
-The manifests must either be in yaml or json format with the respective file extension,
+The manifests must either be in yaml, json or jsonl format with the respective file extension,
 unless the '--manifests-format' argument is passed. If manifest is a
 fd path, then it will be assumed to be in yaml format unless '--manifests-format'
 argument is passed.
@@ -565,6 +1689,60 @@ class ShowHelpExtraAction(argparse.Action):
         sys.exit(0)
 
 
+def check_manifest_files(command_type, manifest_file_paths_list, manifests_format, yaml_backend,
+                         manifests_cache_dir, check_remotes_enabled, jobs):
+    """
+    Check all manifests in all manifest files and report all errors found.
+
+    @returns Returns `0` if no errors were found, otherwise `1`.
+    """
+
+    errors_count = 0
+    manifests_count = 0
+    remote_checks = collections.OrderedDict()
+
+    manifest_file_number = 1
+    for manifest_file_path in manifest_file_paths_list:
+        if len(manifest_file_paths_list) == 1:
+            manifest_file_label = "manifest file at \"" + str(manifest_file_path or "") + "\""
+        else:
+            manifest_file_label = "manifest file " + str(manifest_file_number) + \
+            " at \"" + str(manifest_file_path or "") + "\""
+        manifest_file_number += 1
+
+        logger.info(LOG_TAG, "Checking " + manifest_file_label)
+
+        (return_value, manifests_format_for_file) = get_manifests_format(
+            manifest_file_label, manifest_file_path, manifests_format)
+        if str(return_value) != "0":
+            errors_count += 1
+            continue
+
+        for (return_value, manifest_label, manifest) in read_manifests_from_file(
+                manifest_file_label, manifest_file_path, manifests_format_for_file, yaml_backend, manifests_cache_dir):
+            if str(return_value) != "0":
+                errors_count += 1
+                break
+
+            manifest_errors_count = check_manifest(command_type, manifest_label, manifest, remote_checks)
+            if manifest_errors_count > 0:
+                logger.error(LOG_TAG, "Found " + str(manifest_errors_count) + " error(s) in " + manifest_label)
+            errors_count += manifest_errors_count
+            manifests_count += 1
+
+    if check_remotes_enabled:
+        errors_count += check_remotes(remote_checks, jobs)
+
+    if errors_count > 0:
+        logger.error(LOG_TAG, "Checked " + str(manifests_count) + " manifest(s) and found " +
+                     str(errors_count) + " error(s)")
+        return 1
+
+    logger.info(LOG_TAG, "Checked " + str(manifests_count) + " manifest(s) and found no errors")
+    return 0
+
+
+
 def main(argv):
     "temporal-src-network main."
     # pylint: disable=unused-variable
@@ -587,12 +1765,105 @@ pass one or more times for 'debug', 'verbose' or `vverbose',
     parser.add_argument("-q", "--quiet", action="store_true", help="""set log level to 'off',
 (default: false)""")
 
+    parser.add_argument("--log-format", help="""the format to log records in, 'json' logs each record
+as a json object on a single line with its timestamp,
+level, tag, project, module and version context and
+phase, and the exit code and duration of commands,
+(default: 'text', values: 'text' or 'json')""")
+
     parser.add_argument("--manifests-format", help="""force consider manifest to be in desired format,
-(default: use file extension, values: 'yaml', 'yml' or 'json')""")
+(default: use file extension, values: 'yaml', 'yml', 'json' or 'jsonl')""")
+
+    parser.add_argument("--yaml-backend", help="""the yaml backend to load yaml manifests with,
+'auto' uses 'ruamel_c' if available, otherwise 'ruamel_pure',
+(default: 'auto', values: 'auto', 'ruamel_c', 'pyyaml_c' or 'ruamel_pure')""")
+
+    parser.add_argument("--manifests-cache-dir", help="""path to directory to cache loaded manifests in,
+manifests are loaded from cache if their content has not changed,
+(default: manifests are not cached)""")
+
+    parser.add_argument("--pre-validate", action="store_true", help="""validate all manifests in a manifest file before
+processing any of them, manifests are processed one at a time
+as they are read otherwise,
+(default: false)""")
+
+    parser.add_argument("--check-remotes", action="store_true", help="""check that the src_url of all checkouts exist
+for the 'check' command, remotes are checked concurrently,
+(default: false)""")
+
+    parser.add_argument("--fast-remove", action="store_true", help="""remove version and module root directories
+by moving them to a trash directory beside them and
+deleting them in background with '--jobs' threads,
+the command waits for all deletions before exiting,
+(default: false)""")
+
+    parser.add_argument("--reconcile-symlinks", action="store_true", help="""only create, retarget or remove the symlinks whose
+current target read with 'readlink' differs from the
+expected target, and report the diff,
+(default: false)""")
+
+    parser.add_argument("--prune-orphans", action="store_true", help="""remove the root directories of the versions and modules
+that are not in the manifest anymore for the 'setup'
+command, otherwise only their symlinks are removed,
+(default: false)""")
+
+    parser.add_argument("--symlinks-only", action="store_true", help="""only process symlinks for the 'setup' and 'remove'
+commands without checking out sources or removing root
+directories, implies '--reconcile-symlinks',
+(default: false)""")
+
+    parser.add_argument("--timings", action="store_true", help="""log a summary table of the time taken by each phase,
+like checking out and fetching sources, deleting root
+directories and creating symlinks, at the end of the run,
+(default: false)""")
+
+    parser.add_argument("--timings-json", help="""path to file to write the time taken by each phase
+and the spans of all phases tagged with their project,
+module and version to in json format at the end of the run,
+(default: not written)""")
+
+    parser.add_argument("--trace", help="""path to file to write the spans of all phases and git
+commands to in Chrome Trace Event Format at the end of
+the run, that can be opened in Perfetto, with the
+spans of each thread shown as a separate track,
+(default: not written)""")
+
+    parser.add_argument("--subprocess-stats", action="store_true", help="""log a summary table of the count, wall time, user and
+system cpu time and peak memory of the commands spawned,
+like 'git fetch', per argv class and per version, at the
+end of the run, and add them to the '--timings-json' file,
+(default: false)""")
+
+    parser.add_argument("--max-spawns", type=int, help="""maximum number of commands that may be spawned in
+the run, the run fails if more are spawned, like to check
+that a benchmark does not regress,
+(default: no limit)""")
+
+    parser.add_argument("--metrics-file", help="""path to file to write the metrics of the run to in the
+Prometheus text format at the end of the run, like for
+the textfile collector of the node exporter, with the
+run duration, phase durations, versions, symlinks,
+commands spawned, bytes fetched and cache requests,
+(default: not written)""")
+
+    parser.add_argument("--metrics-max-label-values", type=int, help="""maximum number of distinct values of each label of
+the metrics, like 'project' and 'module', further values
+are replaced with '__other__',
+(default: 100)""")
+
+    parser.add_argument("--jobs", type=int, help="""number of parallel jobs to run,
+used for checking remotes for the 'check' command,
+for checking status for the 'status' command,
+for copying files of 'local' checkouts
+and for deleting files with '--fast-remove',
+(default: 8)""")
 
     parser.add_argument("command_type", help="""command type to run:
   'setup' - setup project and modules
-  'remove' - remove project and modules""")
+  'remove' - remove project and modules
+  'check' - check manifests without making any changes
+  'status' - check if the project and versions drifted
+             from manifests, exits with '2' if they did""")
 
     #subparsers = parser.add_subparsers(title="command_types", dest="command_type", required=True)
 
@@ -612,6 +1883,22 @@ pass one or more times for 'debug', 'verbose' or `vverbose',
 
     # Set args to local variables
     manifests_format = str(args.manifests_format or "")
+    yaml_backend = str(args.yaml_backend or yaml_utils.YAML_BACKEND_AUTO)
+    manifests_cache_dir = os.path.abspath(args.manifests_cache_dir) if args.manifests_cache_dir else None
+    pre_validate = args.pre_validate
+    check_remotes_enabled = args.check_remotes
+    fast_remove = args.fast_remove
+    reconcile_symlinks = args.reconcile_symlinks or args.symlinks_only
+    symlinks_only = args.symlinks_only
+    prune_orphans = args.prune_orphans
+    show_timings = args.timings
+    timings_json_file_path = os.path.abspath(args.timings_json) if args.timings_json else None
+    trace_file_path = os.path.abspath(args.trace) if args.trace else None
+    show_subprocess_stats = args.subprocess_stats
+    max_spawns = args.max_spawns
+    metrics_file_path = os.path.abspath(args.metrics_file) if args.metrics_file else None
+    metrics_max_label_values = args.metrics_max_label_values
+    jobs = args.jobs if args.jobs is not None else 8
     manifest_file_paths_list = args.manifests
 
 
@@ -628,17 +1915,67 @@ pass one or more times for 'debug', 'verbose' or `vverbose',
 
         log_level = logger.LOG_LEVELS[log_level_index]
 
-    logger.setup_logger(logger_log_level=log_level)
+    log_format = str(args.log_format or logger.DEFAULT_LOG_FORMAT)
+    logger.setup_logger(logger_log_level=log_level, logger_log_format=log_format,
+                        logger_private_fields_list=PRIVATE_FIELDS_LIST)
 
 
 
     logger.info(LOG_TAG, "Starting temporal_src_network")
 
+    # The json log format adds the context of the current span to records
+    if show_timings or timings_json_file_path or trace_file_path or log_format == logger.LOG_FORMAT_JSON:
+        span_timer.enable()
+    if show_subprocess_stats or max_spawns is not None:
+        subprocess_stats.enable()
+    if metrics_file_path:
+        run_metrics.enable(metrics_max_label_values)
+
     command_type = args.command_type
-    if not command_type or command_type not in ["setup", "remove"]:
+    if not command_type or command_type not in ["setup", "remove", "check", "status"]:
         logger.error(LOG_TAG, "The command_type \"" + command_type + "\" passed is not supported")
         return 1
 
+    if log_format not in logger.LOG_FORMATS:
+        logger.error(LOG_TAG, "The --log-format \"" + log_format + "\" passed is not supported")
+        return 1
+
+    if yaml_backend not in yaml_utils.YAML_BACKENDS:
+        logger.error(LOG_TAG, "The --yaml-backend \"" + yaml_backend + "\" passed is not supported")
+        return 1
+
+    if jobs < 1:
+        logger.error(LOG_TAG, "The --jobs \"" + str(jobs) + "\" passed must be greater than 0")
+        return 1
+
+    if metrics_max_label_values is not None and metrics_max_label_values < 1:
+        logger.error(LOG_TAG, "The --metrics-max-label-values \"" + str(metrics_max_label_values) + "\"" +
+                     " passed must be greater than 0")
+        return 1
+
+    if max_spawns is not None and max_spawns < 0:
+        logger.error(LOG_TAG, "The --max-spawns \"" + str(max_spawns) + "\" passed must not be negative")
+        return 1
+
+    if command_type == "check":
+        return_value = check_manifest_files(command_type, manifest_file_paths_list, manifests_format,
+                                            yaml_backend, manifests_cache_dir, check_remotes_enabled, jobs)
+        return report_timings(show_timings, timings_json_file_path, trace_file_path,
+                              show_subprocess_stats, max_spawns, metrics_file_path, return_value)
+
+    if command_type == "status":
+        return_value = status_manifest_files(command_type, manifest_file_paths_list, manifests_format,
+                                             yaml_backend, manifests_cache_dir, jobs)
+        return report_timings(show_timings, timings_json_file_path, trace_file_path,
+                              show_subprocess_stats, max_spawns, metrics_file_path, return_value)
+
+    global BACKGROUND_DELETER, RECONCILE_SYMLINKS, SYMLINKS_ONLY, PRUNE_ORPHANS, JOBS
+    BACKGROUND_DELETER = BackgroundDeleter(jobs) if fast_remove else None
+    RECONCILE_SYMLINKS = reconcile_symlinks
+    SYMLINKS_ONLY = symlinks_only
+    PRUNE_ORPHANS = prune_orphans
+    JOBS = jobs
+
     # For all manifests in manifest_file_paths_list
     return_value = "1"
     manifest_file_number = 1
@@ -653,38 +1990,51 @@ pass one or more times for 'debug', 'verbose' or `vverbose',
             logger.log_debug_no_format("\n\n\n")
         logger.info(LOG_TAG, "Processing " + command_type + " command for " + manifest_file_label)
 
-        # Process manifest
-        (return_value, manifests) = read_manifests_from_file(
+        (return_value, manifests_format_for_file) = get_manifests_format(
             manifest_file_label, manifest_file_path, manifests_format)
         if str(return_value) != "0":
             break
-        if not manifests or not isinstance(manifests, list):
-            logger.error(LOG_TAG, "Failed to read manifest(s) from " + manifest_file_label)
-            return_value = 1
-            break
-
-        manifest_number = 1
-        manifests_count = len(manifests)
-        for manifest in manifests:
-            # Process manifest
-            manifest_label = ("manifest " + (str(manifest_number) + " "
-                if len(manifests) > 1 else "") + "in ") + manifest_file_label
 
-            if manifest_number > 1:
-                logger.log_debug_no_format("\n\n\n")
-            if manifests_count > 1:
+        with contextlib.ExitStack() as exit_stack:
+            manifest_file = manifest_file_path
+            if pre_validate:
+                # Fds can only be read once, so spool them to a temp file
+                # that can be read again after validating the manifests.
+                if is_manifest_file_path_fd(manifest_file_path):
+                    manifest_file = exit_stack.enter_context(tempfile.TemporaryFile())
+                    with open(manifest_file_path, "rb") as manifest_fd_file:
+                        shutil.copyfileobj(manifest_fd_file, manifest_file)
+
+                return_value = validate_manifests(manifest_file_label, manifest_file, manifests_format_for_file,
+                                                  yaml_backend, manifests_cache_dir)
+                if str(return_value) != "0":
+                    break
+
+            # Process manifests one at a time as they are read
+            return_value = 0
+            manifest_number = 1
+            for (return_value, manifest_label, manifest) in read_manifests_from_file(
+                    manifest_file_label, manifest_file, manifests_format_for_file, yaml_backend, manifests_cache_dir):
+                if str(return_value) != "0":
+                    break
+
+                if manifest_number > 1:
+                    logger.log_debug_no_format("\n\n\n")
                 logger.info(LOG_TAG, "Processing " + command_type + " command for " + manifest_label)
 
-            return_value = process_manifest(command_type, manifest_label, manifest)
-            if str(return_value) != "0":
-                logger.error(LOG_TAG, "Processing " + command_type + " command for " +
-                    manifest_label + " failed with exit code \"" + str(return_value) + "\"")
-                break
+                return_value = process_manifest(command_type, manifest_label, manifest)
+                if str(return_value) != "0":
+                    logger.error(LOG_TAG, "Processing " + command_type + " command for " +
+                        manifest_label + " failed with exit code \"" + str(return_value) + "\"")
+                    break
 
-            if manifests_count > 1:
                 logger.info(LOG_TAG, "The " + command_type + " command for " + manifest_label + " complete")
 
-            manifest_number += 1
+                manifest_number += 1
+
+            if str(return_value) == "0" and manifest_number == 1:
+                logger.error(LOG_TAG, "Failed to read manifest(s) from " + manifest_file_label)
+                return_value = 1
 
         if str(return_value) != "0":
             break
@@ -693,6 +2043,13 @@ pass one or more times for 'debug', 'verbose' or `vverbose',
 
         manifest_file_number += 1
 
+    # Deletions must finish even if processing failed
+    if str(wait_for_background_deletions()) != "0" and str(return_value) == "0":
+        return_value = 1
+
+    return_value = report_timings(show_timings, timings_json_file_path, trace_file_path,
+                                  show_subprocess_stats, max_spawns, metrics_file_path, return_value)
+
     if not str(return_value).isdigit() or int(str(return_value)) < 0 or int(str(return_value)) > 255:
         return_value = 255
 
@@ -0,0 +1,238 @@
+import bisect
+import threading
+import time
+
+from .span_timer import span_timer
+from .subprocess_stats import subprocess_stats
+
+class RunMetrics:
+    """
+    Collector of the metrics of a run, like the number of versions
+    checked out, skipped and failed, the symlinks created and the cache
+    requests, that are written to a file in the Prometheus text format
+    at the end of the run, like for the textfile collector of the node
+    exporter.
+
+    Counters are labelled with the `project` and `module` tags of the
+    current span of the `span_timer` when they are incremented. The
+    durations of the phases and the commands spawned are read from the
+    `span_timer` and `subprocess_stats` when the file is written.
+
+    To limit the cardinality of the metrics, the `project` and `module`
+    labels may each only have `max_label_values` distinct values, and
+    further values are replaced with `OTHER_LABEL_VALUE`. The values of
+    the other labels, like `phase` and `result`, are bounded by the tool.
+
+    Metrics are only collected if the collector was enabled with
+    `enable()`, which also enables the `subprocess_stats` and
+    `span_timer`.
+
+    - https://prometheus.io/docs/instrumenting/exposition_formats/#text-based-format
+    - https://github.com/prometheus/node_exporter#textfile-collector
+    """
+
+    METRIC_NAME_PREFIX = "temporal_src_network_"
+    "The prefix for the names of all metrics."
+
+    CONTEXT_LABELS = ["project", "module"]
+    "The span tags added as labels to counters."
+
+    PHASE_DURATION_BUCKETS = [0.001, 0.005, 0.025, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900]
+    "The upper bounds in seconds of the buckets of the phase durations histogram."
+
+    DEFAULT_MAX_LABEL_VALUES = 100
+    "The default maximum number of distinct values of each of the `CONTEXT_LABELS`."
+
+    OTHER_LABEL_VALUE = "__other__"
+    "The value of labels that exceeded the maximum number of distinct values."
+
+    COUNTERS_HELP = {
+        "versions_total": "The number of versions processed by result.",
+        "symlinks_total": "The number of symlinks processed by result.",
+        "fetched_bytes_total": "The number of bytes of packs fetched by git.",
+        "cache_requests_total": "The number of cache requests by result."
+    }
+    "The help of the counters that may be incremented."
+
+    def __init__(self):
+        self.enabled = False
+        self.max_label_values = RunMetrics.DEFAULT_MAX_LABEL_VALUES
+        # The dict of label name to the set of its distinct values
+        self.label_values = {}
+        # The dict of counter name to the dict of labels tuple to value
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def enable(self, max_label_values=None):
+        "Enable collecting of metrics."
+
+        self.enabled = True
+        if max_label_values is not None:
+            self.max_label_values = max_label_values
+        if not subprocess_stats.enabled:
+            subprocess_stats.enable()
+
+    def inc(self, name, value=1, labels=None, context_labels=True):
+        """
+        Increment the counter with `name` by `value`.
+
+        @param labels The optional `dict` of labels of the counter.
+        @param context_labels If `True`, then the `project` and `module`
+                              tags of the current span are added as labels.
+        """
+
+        if not self.enabled:
+            return
+
+        counter_labels = {}
+        if context_labels:
+            tags = span_timer.get_current_tags()
+            for key in RunMetrics.CONTEXT_LABELS:
+                if tags.get(key) is not None:
+                    counter_labels[key] = tags[key]
+        if labels:
+            counter_labels.update(labels)
+
+        with self.lock:
+            labels_key = self.get_labels_key(counter_labels)
+            counter = self.counters.setdefault(name, {})
+            counter[labels_key] = counter.get(labels_key, 0) + value
+
+    def get_labels_key(self, labels):
+        """
+        Get the sorted tuple of `(name, value)` of the labels, with the
+        values of the `CONTEXT_LABELS` that exceeded `max_label_values`
+        replaced. The lock must be held by the caller.
+        """
+
+        labels_key = []
+        for key in sorted(labels):
+            value = str(labels[key])
+            if key not in RunMetrics.CONTEXT_LABELS:
+                labels_key.append((key, value))
+                continue
+
+            values = self.label_values.setdefault(key, set())
+            if value not in values:
+                if len(values) >= self.max_label_values:
+                    value = RunMetrics.OTHER_LABEL_VALUE
+                else:
+                    values.add(value)
+            labels_key.append((key, value))
+
+        return tuple(labels_key)
+
+
+
+    def get_text(self, return_value):
+        "Get the metrics of the run in the Prometheus text format."
+
+        lines = []
+
+        def add_metric(name, metric_type, help_text, samples):
+            lines.append("# HELP " + RunMetrics.METRIC_NAME_PREFIX + name + " " + help_text)
+            lines.append("# TYPE " + RunMetrics.METRIC_NAME_PREFIX + name + " " + metric_type)
+            for (sample_name, labels_key, value) in samples:
+                lines.append(RunMetrics.METRIC_NAME_PREFIX + sample_name + RunMetrics.format_labels(labels_key) +
+                             " " + RunMetrics.format_value(value))
+
+        add_metric("run_timestamp_seconds", "gauge", "The unix time the run ended at.",
+                   [("run_timestamp_seconds", (), time.time())])
+        add_metric("run_duration_seconds", "gauge", "The duration of the run.",
+                   [("run_duration_seconds", (), span_timer.get_total_duration())])
+        add_metric("run_exit_code", "gauge", "The exit code of the run.",
+                   [("run_exit_code", (), int(str(return_value)) if str(return_value).isdigit() else 1)])
+
+        with self.lock:
+            # The phases histogram
+            histograms = {}
+            for span in span_timer.get_spans():
+                labels = {"phase": span.name}
+                for key in RunMetrics.CONTEXT_LABELS:
+                    if span.tags.get(key) is not None:
+                        labels[key] = span.tags[key]
+                labels_key = self.get_labels_key(labels)
+                histogram = histograms.get(labels_key)
+                if histogram is None:
+                    histogram = histograms[labels_key] = [[0] * len(RunMetrics.PHASE_DURATION_BUCKETS), 0, 0.0]
+                bucket_index = bisect.bisect_left(RunMetrics.PHASE_DURATION_BUCKETS, span.duration)
+                if bucket_index < len(RunMetrics.PHASE_DURATION_BUCKETS):
+                    histogram[0][bucket_index] += 1
+                histogram[1] += 1
+                histogram[2] += span.duration
+
+            # The subprocesses counter
+            subprocesses = {}
+            for record in subprocess_stats.get_records():
+                labels = {"argv_class": record.argv_class}
+                for key in RunMetrics.CONTEXT_LABELS:
+                    if record.tags.get(key) is not None:
+                        labels[key] = record.tags[key]
+                labels_key = self.get_labels_key(labels)
+                subprocesses[labels_key] = subprocesses.get(labels_key, 0) + 1
+
+            counters = {name: dict(counter) for name, counter in self.counters.items()}
+
+        samples = []
+        for labels_key in sorted(histograms):
+            (bucket_counts, count, total) = histograms[labels_key]
+            cumulative_count = 0
+            for i, upper_bound in enumerate(RunMetrics.PHASE_DURATION_BUCKETS):
+                cumulative_count += bucket_counts[i]
+                samples.append(("phase_duration_seconds_bucket", labels_key + (("le", RunMetrics.format_value(upper_bound)),),
+                                cumulative_count))
+            samples.append(("phase_duration_seconds_bucket", labels_key + (("le", "+Inf"),), count))
+            samples.append(("phase_duration_seconds_sum", labels_key, total))
+            samples.append(("phase_duration_seconds_count", labels_key, count))
+        add_metric("phase_duration_seconds", "histogram", "The duration of the phases of the run.", samples)
+
+        add_metric("subprocesses_total", "counter", "The number of commands spawned.",
+                   [("subprocesses_total", labels_key, subprocesses[labels_key]) for labels_key in sorted(subprocesses)])
+
+        for name in sorted(counters):
+            add_metric(name, "counter", RunMetrics.COUNTERS_HELP.get(name, name),
+                       [(name, labels_key, counters[name][labels_key]) for labels_key in sorted(counters[name])])
+
+        # The cache hit ratios are derived from the cache requests
+        cache_requests = {}
+        for (labels_key, value) in counters.get("cache_requests_total", {}).items():
+            labels = dict(labels_key)
+            requests = cache_requests.setdefault(labels.get("cache", ""), [0, 0])
+            requests[0 if labels.get("result") == "hit" else 1] += value
+        add_metric("cache_hit_ratio", "gauge", "The ratio of cache requests that were hits.",
+                   [("cache_hit_ratio", (("cache", cache),), hits / (hits + misses))
+                    for cache, (hits, misses) in sorted(cache_requests.items()) if hits + misses > 0])
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def format_labels(labels_key):
+        if not labels_key:
+            return ""
+
+        return "{" + ",".join([key + "=\"" + value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") + "\""
+                               for (key, value) in labels_key]) + "}"
+
+    @staticmethod
+    def format_value(value):
+        if isinstance(value, float):
+            return repr(round(value, 6))
+        return str(value)
+
+    def write(self, metrics_file_path, return_value):
+        """
+        Write the metrics of the run to a file at `metrics_file_path`
+        atomically with {@link file_utils#write_file_atomically()}, so
+        that a partially written file is never collected.
+
+        @returns Returns the error if writing failed, otherwise `None`.
+        """
+
+        # The file_utils module imports this module
+        from ..file import file_utils # pylint: disable=import-outside-toplevel
+
+        return file_utils.write_file_atomically("metrics", metrics_file_path,
+                                                lambda metrics_file: metrics_file.write(self.get_text(return_value)))
+
+
+run_metrics = RunMetrics()
@@ -0,0 +1,259 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+class Span:
+    "A timed span of a phase of a run."
+
+    __slots__ = ("name", "tags", "start_time", "duration", "thread_id", "thread_name")
+
+    def __init__(self, name, tags, start_time, duration, thread_id, thread_name):
+        self.name = name
+        self.tags = tags
+        # The start_time is relative to the time the timer was enabled
+        self.start_time = start_time
+        self.duration = duration
+        self.thread_id = thread_id
+        self.thread_name = thread_name
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "tags": self.tags,
+            "start_ms": round(self.start_time * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            "thread_id": self.thread_id,
+            "thread_name": self.thread_name
+        }
+
+class SpanTimer:
+    """
+    Timer for the spans of the phases of a run, like checking out the
+    source of a version, fetching it with git or creating its symlinks.
+
+    Spans are nested per thread, and the tags of a span, like its
+    `project`, `module` and `version`, are inherited by the spans
+    started under it, so that the phases of a version are tagged with
+    it without the tags having to be passed down to them.
+
+    Spans are only recorded if the timer was enabled with `enable()`,
+    otherwise `span()` only returns a shared no-op context manager.
+    """
+
+    SUMMARY_SLOWEST_SPANS_COUNT = 10
+    "The number of slowest spans to show in the summary."
+
+    NULL_CONTEXT = contextlib.nullcontext()
+    "The context manager returned by `span()` if the timer is not enabled."
+
+    def __init__(self):
+        self.enabled = False
+        self.start_time = None
+        self.spans = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def enable(self):
+        "Enable recording of spans, with their start times relative to now."
+
+        self.enabled = True
+        self.start_time = time.perf_counter()
+
+    def span(self, name, **tags):
+        """
+        Get a context manager that records the span of a phase with
+        `name` while its context is active.
+
+        @param tags The tags of the span, like `module` and `version`,
+                    that are merged with the tags of the parent span. The
+                    tags with `None` values are ignored.
+        """
+
+        if not self.enabled:
+            return SpanTimer.NULL_CONTEXT
+
+        return self.record_span(name, tags)
+
+    @contextlib.contextmanager
+    def record_span(self, name, tags):
+        # The stack of `(name, tags)` of the active spans of the thread
+        spans_stack = getattr(self.local, "spans_stack", None)
+        if spans_stack is None:
+            spans_stack = self.local.spans_stack = []
+
+        span_tags = dict(spans_stack[-1][1]) if spans_stack else {}
+        for key, value in tags.items():
+            if value is not None:
+                span_tags[key] = str(value)
+
+        spans_stack.append((name, span_tags))
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start_time
+            spans_stack.pop()
+            thread = threading.current_thread()
+            with self.lock:
+                self.spans.append(Span(name, span_tags, start_time - self.start_time, duration,
+                                       thread.ident, thread.name))
+
+    def get_current_tags(self):
+        "Get a copy of the tags of the current span of the current thread."
+
+        spans_stack = getattr(self.local, "spans_stack", None)
+        return dict(spans_stack[-1][1]) if spans_stack else {}
+
+    def get_current_span_name(self):
+        "Get the name of the current span of the current thread, otherwise `None`."
+
+        spans_stack = getattr(self.local, "spans_stack", None)
+        return spans_stack[-1][0] if spans_stack else None
+
+    def get_spans(self):
+        "Get a copy of the `list` of spans recorded, sorted by their start time."
+
+        with self.lock:
+            spans = list(self.spans)
+
+        return sorted(spans, key=lambda span: span.start_time)
+
+    def get_total_duration(self):
+        "Get the duration since the timer was enabled in seconds."
+
+        return time.perf_counter() - self.start_time if self.start_time is not None else 0
+
+
+
+    def get_phases(self, spans):
+        """
+        Get the `list` of `(name, count, total_duration, max_duration)` of
+        the phases of spans, sorted by their total duration in descending
+        order.
+        """
+
+        phases = {}
+        for span in spans:
+            phase = phases.get(span.name)
+            if phase is None:
+                phases[span.name] = [span.name, 1, span.duration, span.duration]
+            else:
+                phase[1] += 1
+                phase[2] += span.duration
+                phase[3] = max(phase[3], span.duration)
+
+        return sorted([tuple(phase) for phase in phases.values()], key=lambda phase: phase[2], reverse=True)
+
+    def get_summary(self):
+        """
+        Get the summary table of the phases of the spans recorded, sorted
+        by their total duration, and the slowest spans with their tags.
+        Since spans are nested, the duration of a phase includes the
+        durations of the phases under it.
+        """
+
+        spans = self.get_spans()
+
+        summary = "Timings summary for " + str(len(spans)) + " span(s) in " + \
+            str(round(self.get_total_duration() * 1000, 3)) + "ms:\n"
+        summary += "{:<32} {:>8} {:>14} {:>14}".format("phase", "count", "total_ms", "max_ms")
+        for (name, count, total_duration, max_duration) in self.get_phases(spans):
+            summary += "\n{:<32} {:>8} {:>14.3f} {:>14.3f}".format(name, count, total_duration * 1000, max_duration * 1000)
+
+        slowest_spans = sorted(spans, key=lambda span: span.duration, reverse=True)[:SpanTimer.SUMMARY_SLOWEST_SPANS_COUNT]
+        if slowest_spans:
+            summary += "\n\nSlowest spans:"
+            for span in slowest_spans:
+                summary += "\n{:>14.3f}ms  {}".format(span.duration * 1000, span.name)
+                if span.tags:
+                    summary += " (" + ", ".join([key + "=" + value for key, value in span.tags.items()]) + ")"
+
+        return summary
+
+    def write_json(self, json_file_path, extra=None):
+        """
+        Write the phases and spans recorded to a json file at
+        `json_file_path`.
+
+        @param extra The optional `dict` of extra fields to write.
+
+        @returns Returns the error if writing failed, otherwise `None`.
+        """
+
+        spans = self.get_spans()
+
+        timings = {
+            "total_duration_ms": round(self.get_total_duration() * 1000, 3),
+            "phases": [{
+                "name": name,
+                "count": count,
+                "total_ms": round(total_duration * 1000, 3),
+                "max_ms": round(max_duration * 1000, 3)
+            } for (name, count, total_duration, max_duration) in self.get_phases(spans)],
+            "spans": [span.to_dict() for span in spans]
+        }
+        if extra:
+            timings.update(extra)
+
+        return SpanTimer.write_json_file("timings json", json_file_path, timings, 2)
+
+    def write_trace(self, trace_file_path):
+        """
+        Write the spans recorded to a trace file at `trace_file_path` in
+        the Chrome Trace Event Format, that can be opened in Perfetto or
+        `chrome://tracing`. Each span is written as a complete event with
+        its tags as args, and each thread is shown as a separate track.
+
+        - https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+
+        @returns Returns the error if writing failed, otherwise `None`.
+        """
+
+        spans = self.get_spans()
+        pid = os.getpid()
+
+        trace_events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                         "args": {"name": "temporal-src-network"}}]
+
+        thread_names = {}
+        for span in spans:
+            thread_names.setdefault(span.thread_id, span.thread_name)
+        for thread_id, thread_name in thread_names.items():
+            trace_events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id,
+                                 "args": {"name": thread_name}})
+
+        for span in spans:
+            trace_events.append({
+                "name": span.name,
+                "cat": span.name.split("_", 1)[0],
+                "ph": "X",
+                "ts": round(span.start_time * 1000000, 3),
+                "dur": round(span.duration * 1000000, 3),
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": span.tags
+            })
+
+        trace = {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+        return SpanTimer.write_json_file("trace", trace_file_path, trace, None)
+
+    @staticmethod
+    def write_json_file(label, json_file_path, obj, indent):
+        """
+        Write obj to a json file at `json_file_path` atomically with
+        {@link file_utils#write_file_atomically()}.
+
+        @returns Returns the error if writing failed, otherwise `None`.
+        """
+
+        # The file_utils module imports the run_metrics that imports this module
+        from ..file import file_utils # pylint: disable=import-outside-toplevel
+
+        return file_utils.write_file_atomically(label, json_file_path,
+                                                lambda json_file: json.dump(obj, json_file, indent=indent))
+
+
+span_timer = SpanTimer()
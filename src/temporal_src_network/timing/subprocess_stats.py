@@ -0,0 +1,242 @@
+import os
+import sys
+import threading
+
+from .span_timer import span_timer
+
+class SubprocessRecord:
+    "The resource usage of a command spawned during a run."
+
+    __slots__ = ("argv_class", "tags", "wall_time", "user_time", "sys_time", "max_rss", "return_value")
+
+    def __init__(self, argv_class, tags, wall_time, user_time, sys_time, max_rss, return_value):
+        self.argv_class = argv_class
+        self.tags = tags
+        self.wall_time = wall_time
+        # The user_time, sys_time and max_rss are None if the resource
+        # usage could not be read, like if the command timed out.
+        self.user_time = user_time
+        self.sys_time = sys_time
+        self.max_rss = max_rss
+        self.return_value = return_value
+
+    def to_dict(self):
+        return {
+            "argv_class": self.argv_class,
+            "tags": self.tags,
+            "wall_ms": round(self.wall_time * 1000, 3),
+            "user_ms": round(self.user_time * 1000, 3) if self.user_time is not None else None,
+            "sys_ms": round(self.sys_time * 1000, 3) if self.sys_time is not None else None,
+            "max_rss_kb": self.max_rss // 1024 if self.max_rss is not None else None,
+            "return_value": self.return_value
+        }
+
+class SubprocessStats:
+    """
+    Recorder for the count, wall time, user and system cpu time and peak
+    resident set size of each command spawned during a run, like the
+    `git fetch` and `git checkout` commands run for the versions.
+
+    Commands are classified by their argv class, like `fetch`, `config`
+    or `lfs fetch` for `git` commands, and are tagged with the tags of
+    the current span of the `span_timer`, like the `module` and `version`,
+    so that they can be aggregated per version.
+
+    Commands are only recorded if the recorder was enabled with
+    `enable()`, which also enables the `span_timer`.
+    """
+
+    GIT_GLOBAL_OPTIONS_WITH_VALUE = frozenset(["-c", "-C", "--git-dir", "--work-tree", "--namespace", "--exec-path"])
+    "The `git` global options whose value is passed as the next arg."
+
+    GIT_COMMANDS_WITH_SUBCOMMAND = frozenset(["lfs", "remote", "sparse-checkout", "submodule", "worktree"])
+    "The `git` commands whose subcommand is added to their argv class."
+
+    def __init__(self):
+        self.enabled = False
+        self.records = []
+        self.lock = threading.Lock()
+
+    def enable(self):
+        "Enable recording of spawned commands."
+
+        self.enabled = True
+        if not span_timer.enabled:
+            span_timer.enable()
+
+    def record(self, command_array, wall_time, rusage, return_value):
+        """
+        Record a command that was spawned.
+
+        @param command_array The `list` of args of the command.
+        @param wall_time The wall time of the command in seconds.
+        @param rusage The `resource.struct_rusage` of the command returned
+                      by `os.wait4()`, otherwise `None`.
+        @param return_value The exit code of the command, otherwise `None`.
+        """
+
+        if rusage is not None:
+            # The ru_maxrss is in bytes on macOS and in kilobytes on Linux
+            max_rss = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+            record = SubprocessRecord(SubprocessStats.get_argv_class(command_array), span_timer.get_current_tags(),
+                                      wall_time, rusage.ru_utime, rusage.ru_stime, max_rss, return_value)
+        else:
+            record = SubprocessRecord(SubprocessStats.get_argv_class(command_array), span_timer.get_current_tags(),
+                                      wall_time, None, None, None, return_value)
+
+        with self.lock:
+            self.records.append(record)
+
+    def get_records(self):
+        "Get a copy of the `list` of records of the commands spawned."
+
+        with self.lock:
+            return list(self.records)
+
+    def get_spawn_count(self):
+        "Get the number of commands spawned."
+
+        with self.lock:
+            return len(self.records)
+
+
+
+    @staticmethod
+    def get_argv_class(command_array):
+        """
+        Get the argv class of a command, like `fetch` for `git fetch`, or
+        `lfs fetch` for `git lfs fetch`. The `timeout` command wrapper
+        and the `git` global options are skipped. For commands other than
+        `git`, the basename of the command is returned.
+        """
+
+        args = [str(arg) for arg in command_array]
+
+        # Skip "timeout [options] duration"
+        if args and os.path.basename(args[0]) == "timeout":
+            i = 1
+            while i < len(args) and args[i].startswith("-"):
+                i += 1
+            args = args[i + 1:]
+
+        if not args:
+            return "unknown"
+
+        command = os.path.basename(args[0])
+        if command != "git":
+            return command
+
+        i = 1
+        while i < len(args) and args[i].startswith("-"):
+            if args[i] in SubprocessStats.GIT_GLOBAL_OPTIONS_WITH_VALUE:
+                i += 1
+            elif args[i] in ["--version", "--help"]:
+                return args[i]
+            i += 1
+
+        if i >= len(args):
+            return "git"
+
+        argv_class = args[i]
+        if argv_class in SubprocessStats.GIT_COMMANDS_WITH_SUBCOMMAND and \
+                i + 1 < len(args) and not args[i + 1].startswith("-"):
+            argv_class += " " + args[i + 1]
+
+        return argv_class
+
+    @staticmethod
+    def get_group_label(tags):
+        "Get the label of the version or project the tags of a record belong to."
+
+        if tags.get("version") is not None:
+            return "module=" + tags.get("module", "") + " version=" + tags["version"]
+        if tags.get("project") is not None:
+            return "project=" + tags["project"]
+        return "run"
+
+    @staticmethod
+    def get_aggregates(records, key):
+        """
+        Get the `list` of `(key, count, wall_time, user_time, sys_time, max_rss)`
+        aggregates of the records grouped by `key(record)`, sorted by their
+        total wall time in descending order. The `max_rss` is the peak of
+        the group.
+        """
+
+        aggregates = {}
+        for record in records:
+            group = key(record)
+            aggregate = aggregates.get(group)
+            if aggregate is None:
+                aggregate = aggregates[group] = [group, 0, 0.0, 0.0, 0.0, 0]
+            aggregate[1] += 1
+            aggregate[2] += record.wall_time
+            aggregate[3] += record.user_time or 0.0
+            aggregate[4] += record.sys_time or 0.0
+            aggregate[5] = max(aggregate[5], record.max_rss or 0)
+
+        return sorted([tuple(aggregate) for aggregate in aggregates.values()], key=lambda aggregate: aggregate[2], reverse=True)
+
+
+
+    def get_summary(self):
+        """
+        Get the summary tables of the commands spawned in the run, per
+        argv class and per version.
+        """
+
+        records = self.get_records()
+
+        summary = "Subprocess stats for " + str(len(records)) + " command(s):\n"
+        summary += SubprocessStats.format_aggregates("argv_class", 24,
+            SubprocessStats.get_aggregates(records, lambda record: record.argv_class))
+
+        summary += "\n\nSubprocess stats per version:\n"
+        summary += SubprocessStats.format_aggregates("version", 48,
+            SubprocessStats.get_aggregates(records, lambda record: SubprocessStats.get_group_label(record.tags)))
+
+        return summary
+
+    @staticmethod
+    def format_aggregates(key_name, key_width, aggregates):
+        key_format = "{:<" + str(key_width) + "}"
+        table = (key_format + " {:>6} {:>12} {:>12} {:>12} {:>12}").format(
+            key_name, "count", "wall_ms", "user_ms", "sys_ms", "max_rss_kb")
+        total = [0, 0.0, 0.0, 0.0, 0]
+        for (key, count, wall_time, user_time, sys_time, max_rss) in aggregates:
+            table += ("\n" + key_format + " {:>6} {:>12.3f} {:>12.3f} {:>12.3f} {:>12}").format(
+                key, count, wall_time * 1000, user_time * 1000, sys_time * 1000, max_rss // 1024)
+            total = [total[0] + count, total[1] + wall_time, total[2] + user_time, total[3] + sys_time,
+                     max(total[4], max_rss)]
+
+        table += ("\n" + key_format + " {:>6} {:>12.3f} {:>12.3f} {:>12.3f} {:>12}").format(
+            "total", total[0], total[1] * 1000, total[2] * 1000, total[3] * 1000, total[4] // 1024)
+
+        return table
+
+    def to_dict(self):
+        "Get the aggregates and records of the commands spawned as a `dict` for json."
+
+        records = self.get_records()
+
+        def get_aggregate_dicts(key_name, aggregates):
+            return [{
+                key_name: key,
+                "count": count,
+                "wall_ms": round(wall_time * 1000, 3),
+                "user_ms": round(user_time * 1000, 3),
+                "sys_ms": round(sys_time * 1000, 3),
+                "max_rss_kb": max_rss // 1024
+            } for (key, count, wall_time, user_time, sys_time, max_rss) in aggregates]
+
+        return {
+            "spawn_count": len(records),
+            "argv_classes": get_aggregate_dicts("argv_class",
+                SubprocessStats.get_aggregates(records, lambda record: record.argv_class)),
+            "versions": get_aggregate_dicts("version",
+                SubprocessStats.get_aggregates(records, lambda record: SubprocessStats.get_group_label(record.tags))),
+            "records": [record.to_dict() for record in records]
+        }
+
+
+subprocess_stats = SubprocessStats()